@@ -1,2 +1,60 @@
-from aws_ import *
-from parsers import *
+"""
+Wrappers for the amazon AWS API as well as parsers to parse the responses into python objects.
+
+Nothing is imported until it's first used. ex. `aws.Lookup` imports aws.aws_ (and requests)
+the first time it's accessed and `aws.ItemLookupResponse` only imports the parsers.
+"""
+import imp
+import importlib
+import sys
+import types
+
+# Attributes which are imported from aws.aws_, every other public attribute is imported from aws.parsers.
+_CLIENT_ATTRIBUTES = frozenset([
+    'AWS',
+    'ITEM_LOOKUP_MAX_IDS',
+    'Lookup',
+    'MARKETPLACES',
+    'batch_item_ids',
+    'convert_to_gmtime',
+    'formatted_amazon_datetime_str',
+    'sign',
+    'write_response',
+])
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Replaces this package in sys.modules to import its attributes on first access.
+    """
+
+    def __getattr__(self, name):
+        if name == '__all__':
+            names = sorted(_CLIENT_ATTRIBUTES | set(x for x in dir(importlib.import_module('aws.parsers'))
+                                                    if not x.startswith('_')))
+            self.__all__ = names
+            return names
+        if name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            imp.find_module(name, self.__path__)
+        except ImportError:
+            pass
+        else:
+            # Submodule. ex. aws.throttle
+            return importlib.import_module('{}.{}'.format(self.__name__, name))
+        module = importlib.import_module('aws.aws_' if name in _CLIENT_ATTRIBUTES else 'aws.parsers')
+        try:
+            value = getattr(module, name)
+        except AttributeError:
+            raise AttributeError("'module' object has no attribute '{}'".format(name))
+        setattr(self, name, value)
+        return value
+
+
+_module = sys.modules[__name__]
+_lazy_module = _LazyModule(__name__, __doc__)
+_lazy_module.__dict__.update(_module.__dict__)
+# Keep a reference to the original module so its globals aren't cleared when it's garbage collected.
+_lazy_module._module = _module
+sys.modules[__name__] = _lazy_module
@@ -5,10 +5,17 @@ import urlparse
 import hashlib
 import hmac
 import os
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 import requests
+from lxml import etree
 
 import config
+from parsers import Item, ItemLookupResponse, Offers, combined_parser, parse_item_records, response_groups_for
+from parsers.lookup.base import AWSError
+from identifiers import IdentifierIndex, IdentifierParser
+from singleflight import SingleFlight
 
 MARKETPLACES = {
     'us': 'webservices.amazon.com',
@@ -25,6 +32,15 @@ MARKETPLACES = {
     'uk': 'webservices.amazon.co.uk'
 }
 
+# Maximum number of item ids which can be sent in a single ItemLookup request.
+ITEM_LOOKUP_MAX_IDS = 10
+
+# Returned by Lookup.item_lookup when no item id is left to request.
+_EMPTY_ITEM_LOOKUP_RESPONSE = (
+    '<?xml version="1.0" ?>\n<ItemLookupResponse xmlns="http://webservices.amazon.com/AWSECommerceService/2011-08-01">'
+    '<Items><Request><IsValid>True</IsValid><ItemLookupRequest><IdType>ASIN</IdType></ItemLookupRequest></Request>'
+    '</Items></ItemLookupResponse>')
+
 
 def convert_to_gmtime(dt):
     """
@@ -49,9 +65,40 @@ def formatted_amazon_datetime_str(dt=None):
     return gmtime.strftime('%Y-%m-%dT%H:%M:%S.000Z')
 
 
+def batch_item_ids(item_ids, size=ITEM_LOOKUP_MAX_IDS):
+    """
+    Split item ids into full batches which can each be sent with a single ItemLookup request.
+    :param item_ids: Iterable of item ids.
+    :param size: Number of item ids in each batch.
+    :return: Generator of lists of item ids.
+    """
+    batch = []
+    for item_id in item_ids:
+        batch.append(item_id)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sign(secret_key, endpoint, url_params):
+    """
+    Sign the parameters of a request. (http://docs.aws.amazon.com/AWSECommerceService/latest/DG/rest-signature.html)
+    :param secret_key:
+    :param endpoint: Host the request is sent to. ex. webservices.amazon.com
+    :param url_params: Url encoded parameters of the request, without the Signature.
+    :return: Url encoded signature.
+    """
+    canonical_string = '&'.join(sorted(url_params.split('&')))
+    string_to_sign = "GET\n{endpoint}\n/onca/xml\n{params}".format(endpoint=endpoint, params=canonical_string)
+    signature = base64.b64encode(hmac.new(secret_key, string_to_sign, hashlib.sha256).digest())
+    return urllib.quote(signature)
+
+
 def write_response(content, name):
     if config.WRITE_RESPONSES:
-        with open(os.path.join(config.XML_RESPONSE_DIR, name), 'wb') as f:
+        with open(os.path.join(config.response_dir(), name), 'wb') as f:
             f.write(content)
 
 
@@ -59,7 +106,7 @@ class AWS(object):
 
     version = ''
 
-    def __init__(self, associate_tag, access_key, secret_key, marketplace=None):
+    def __init__(self, associate_tag, access_key, secret_key, marketplace=None, limiter=None, hedger=None):
         """
 
         :param associate_tag: An alphanumeric token that uniquely identifies you as an Associate.
@@ -67,20 +114,20 @@ class AWS(object):
         :param secret_key: A key that is used in conjunction with the Access Key ID
             to cryptographically sign an API request.
         :param marketplace: The locale where you are making the request.
+        :param limiter: (optional) aws.throttle.RateLimiter which every request waits on before being sent.
+            Every response is passed back to the limiter so an aws.throttle.AdaptiveRateLimiter can adjust its rate.
+        :param hedger: (optional) aws.hedge.Hedger which sends a duplicate of requests which are slow to complete.
         """
         self.associate_tag = associate_tag
         self.access_key = access_key
         self.secret_key = secret_key
         self.marketplace = marketplace or MARKETPLACES['us']
+        self.limiter = limiter
+        self.hedger = hedger
         self.session = requests.Session()
 
     def generate_signature(self, url_params):
-        canonical_string = '&'.join(sorted(url_params.split('&')))
-        string_to_sign = "GET\n{endpoint}\n/onca/xml\n{params}".format(endpoint=self.marketplace,
-                                                                       params=canonical_string)
-        signature = base64.b64encode(hmac.new(self.secret_key, string_to_sign, hashlib.sha256).digest())
-        encoded_signature = urllib.quote(signature)
-        return encoded_signature
+        return sign(self.secret_key, self.marketplace, url_params)
 
     def make_request(self, operation, extra=None):
         """
@@ -91,6 +138,28 @@ class AWS(object):
         :return: AWS API Response content. Default XML String.
         """
         extra = extra or {}
+        url = self.request_url(operation, extra)
+        # The limiter is waited on once per request, outside of the hedger, so time spent waiting on the
+        # limiter isn't counted as latency and duplicates don't take up the rate.
+        if self.limiter is not None:
+            self.limiter.acquire()
+        if self.hedger is not None:
+            response = self.hedger.do(lambda: self.session.get(url))
+        else:
+            response = self.session.get(url)
+        if self.limiter is not None:
+            self.limiter.record(response)
+        content = response.content
+        write_response(content, '{}Response.xml'.format(operation))
+        return content
+
+    def request_url(self, operation, extra):
+        """
+        Sign a request. Every call is signed with its own timestamp.
+        :param operation:
+        :param extra:
+        :return: Signed URL of the request.
+        """
         base_params = dict(
             AssociateTag=self.associate_tag,
             AWSAccessKeyId=self.access_key,
@@ -109,23 +178,170 @@ class AWS(object):
             url_params,
             None
         ))
-        response = self.session.get(url)
-        content = response.content
-        write_response(content, '{}Response.xml'.format(operation))
-        return content
+        return url
 
 
 class Lookup(AWS):
 
     version = '2013-08-01'
 
-    def item_lookup(self, item_ids=(), response_groups=(), **kwargs):
+    def __init__(self, associate_tag, access_key, secret_key, marketplace=None, limiter=None, coalesce=False,
+                 hedger=None, family_index=None, identifier_index=None, negative_cache=None):
+        """
+
+        :param coalesce: When True, concurrent lookups with the same parameters whose item ids are all
+            part of a lookup which is already in flight wait on that lookup instead of sending a duplicate request.
+            Note that the returned response may then contain more items than were requested.
+        :param family_index: (optional) aws.family.FamilyIndex which observes every ItemLookup response.
+        :param identifier_index: (optional) aws.identifiers.IdentifierIndex which observes every ItemLookup response
+            and is checked by resolve_identifiers before sending a request.
+        :param negative_cache: (optional) aws.negative.NegativeCache which observes every ItemLookup response by ASIN.
+            The item ids which were rejected before are dropped from every request. see batch_item_ids
+        """
+        AWS.__init__(self, associate_tag, access_key, secret_key, marketplace=marketplace, limiter=limiter,
+                     hedger=hedger)
+        self.single_flight = SingleFlight() if coalesce else None
+        self.family_index = family_index
+        self.identifier_index = identifier_index
+        self.negative_cache = negative_cache
+
+    def batch_item_ids(self, item_ids, size=ITEM_LOOKUP_MAX_IDS):
+        """
+        Split ASINs into full batches (see aws.batch_item_ids) after dropping the ASINs in the negative cache.
+        item_lookup drops them too, batching them here keeps the batches full.
+        :param item_ids: Iterable of ASINs.
+        :param size: Maximum number of item ids in each batch.
+        :return: Generator of lists of item ids.
+        """
+        if self.negative_cache is not None:
+            item_ids = self.negative_cache.filter(item_ids)
+        return batch_item_ids(item_ids, size)
+
+    def item_lookup(self, item_ids=(), response_groups=(), parser=None, **kwargs):
         """
         http://docs.aws.amazon.com/AWSECommerceService/latest/DG/ItemLookup.html
 
         :param item_ids:
+        :param response_groups: Response groups to request.
+        :param parser: (optional) The parser class which will be used to parse the response.
+            When no response_groups are supplied, the minimal response groups are derived from it.
+            see aws.parsers.response_groups_for
+        :return: Response content. When the negative cache drops every ASIN, no request is sent and
+            a response without items is returned.
         """
+        if parser is not None and not response_groups:
+            response_groups = response_groups_for(parser)
+        if self.negative_cache is not None and kwargs.get('IdType', 'ASIN') == 'ASIN':
+            requested = list(item_ids)
+            item_ids = list(self.negative_cache.filter(requested))
+            if requested and not item_ids:
+                return _EMPTY_ITEM_LOOKUP_RESPONSE
         extra = {'ItemId': ','.join(item_ids), 'ResponseGroup': ','.join(response_groups)}
         extra.update(kwargs)
-        r = self.make_request('ItemLookup', extra=extra)
+        if self.single_flight is not None:
+            key = tuple(sorted((k, v) for k, v in extra.items() if k != 'ItemId'))
+            r = self.single_flight.do(key, item_ids, lambda: self.make_request('ItemLookup', extra=extra))
+        else:
+            r = self.make_request('ItemLookup', extra=extra)
+        self._observe(r, item_ids, response_groups, kwargs.get('IdType', 'ASIN'))
         return r
+
+    def _observe(self, content, item_ids, response_groups, id_type):
+        """
+        Parse a response once with the fields every attached index needs and pass the records to each of them.
+        """
+        negative_cache = self.negative_cache if id_type == 'ASIN' else None
+        parsers = []
+        if self.family_index is not None:
+            parsers.append(self.family_index.parser_for(response_groups))
+        if self.identifier_index is not None:
+            parsers.append(IdentifierParser)
+        if negative_cache is not None:
+            parsers.append(Item)
+        if not parsers:
+            return
+        try:
+            records = parse_item_records(content, combined_parser(*parsers))
+        except (AWSError, etree.XMLSyntaxError):
+            return
+        if self.family_index is not None:
+            self.family_index.observe_records(records, response_groups)
+        if self.identifier_index is not None:
+            self.identifier_index.add_items(records)
+        if negative_cache is not None:
+            negative_cache.observe_records(records, item_ids)
+
+    def resolve_identifiers(self, codes, id_type='UPC', search_index='All'):
+        """
+        Find the ASINs of product identifiers. Only the identifiers which aren't in the identifier index are sent.
+
+        :param codes: Iterable of identifiers.
+        :param id_type: UPC or EAN
+        :param search_index: Search index to look the identifiers up in.
+        :return: OrderedDict of code -> asin, or None if no item was found for the code.
+        """
+        codes = list(codes)
+        index = self.identifier_index if self.identifier_index is not None else IdentifierIndex()
+        resolved, unresolved = index.resolve(codes, id_type)
+        for batch in batch_item_ids(unresolved):
+            content = self.item_lookup(batch, IdentifierParser.response_groups, IdType=id_type, SearchIndex=search_index)
+            if index is not self.identifier_index:
+                index.observe(content)
+            resolved.update(index.resolve(batch, id_type)[0])
+        return OrderedDict((code, resolved.get(code)) for code in codes)
+
+    def item_offers(self, item_ids=(), response_groups=('Offers',), workers=4, **kwargs):
+        """
+        Fetch every offer page for the supplied items. see fetch_offer_pages
+
+        :param item_ids: Item ids to fetch offers for. (max 10)
+        :param response_groups: Response groups to send with each page request. Must return the Offers element.
+        :param workers: Maximum number of page requests in flight at once.
+        :return: OrderedDict of asin -> list of Offers.Offer from every page, in page order.
+        """
+        return fetch_offer_pages(self.item_lookup, item_ids, response_groups, workers, **kwargs)
+
+
+def fetch_offer_pages(item_lookup, item_ids=(), response_groups=('Offers',), workers=4, **kwargs):
+    """
+    Fetch every offer page for the supplied items.
+
+    The first page is requested to find the largest `TotalOfferPages` out of all of the items,
+    then the remaining pages are requested in parallel. Each request still waits on the limiter.
+
+    :param item_lookup: Function which sends an ItemLookup request. ex. Lookup.item_lookup
+    :param item_ids: Item ids to fetch offers for. (max 10)
+    :param response_groups: Response groups to send with each page request. Must return the Offers element.
+    :param workers: Maximum number of page requests in flight at once.
+    :return: OrderedDict of asin -> list of Offers.Offer from every page, in page order.
+    """
+    first_page = _OfferPageParser.parse(item_lookup(item_ids, response_groups, OfferPage=1, **kwargs))
+    offers = OrderedDict((item.asin, item.offers) for item in first_page)
+    total_pages = max([item.total_offer_pages or 1 for item in first_page] or [1])
+    if total_pages < 2:
+        return offers
+
+    def fetch_page(page):
+        return _OfferPageParser.parse(item_lookup(item_ids, response_groups, OfferPage=page, **kwargs))
+
+    pool = ThreadPool(min(workers, total_pages - 1))
+    try:
+        pages = pool.map(fetch_page, range(2, total_pages + 1))
+    finally:
+        pool.close()
+    for page in pages:
+        for item in page:
+            offers.setdefault(item.asin, []).extend(item.offers)
+    return offers
+
+
+class _OfferPageParser(Item, Offers):
+
+    @classmethod
+    def parse(cls, content):
+        """
+        Parse an OfferPage response into a list of items. Raises an AWSError if the response is an error.
+        :param content: ItemLookup response content.
+        :return:
+        """
+        return ItemLookupResponse(etree.fromstring(content), cls).items.item_list()
@@ -0,0 +1,354 @@
+"""
+In-memory catalog of parsed items with secondary indexes for interactive queries.
+
+Every field is resolved once when an item is added. Categorical fields (ex. brand, product group, merchant
+name) are kept in hash indexes of value -> positions, numeric fields (ex. prices, sales rank, offer counts)
+in arrays sorted by value which are searched with bisect. A query starts from its most selective lookup
+and only checks the other lookups against the items it selects, so it doesn't scan the catalog.
+Sorted indexes are built by the first query which needs them, adding items drops them, so add every item
+of a snapshot before querying it.
+
+Fields are named by their record field path using the lookup syntax. (see aws.parsers.lookup.query)
+Lookups on a list of records (ex. `offers__merchant_name='Amazon.com'`) match when any of the records match.
+Prices are indexed by their amount in minor units, either compare with an int or with Money.
+
+example:
+    >>> from aws.catalog import Catalog
+    >>>
+    >>> catalog = Catalog()
+    >>> for content in responses:
+    >>>     catalog.add_response(content, MyParser)
+    >>> catalog.query(item_attributes__brand='LEGO', offer_summary__lowest_new_price__lt=2000,
+    >>>               offers__offer_listing__is_eligible_for_prime=True)
+"""
+import bisect
+import threading
+from array import array
+
+from parsers import parse_item_records
+from parsers.lookup.query import LOOKUP_SEP, parse_lookup
+from parsers.money import Money
+
+DEFAULT_CATEGORICAL = (
+    'item_attributes__brand',
+    'item_attributes__product_group',
+    'offers__merchant_name',
+    'offers__offer_listing__is_eligible_for_prime',
+)
+
+DEFAULT_NUMERIC = (
+    'sales_rank',
+    'total_offers',
+    'offer_summary__lowest_new_price',
+    'offer_summary__lowest_used_price',
+    'offer_summary__total_new',
+    'offer_summary__total_used',
+)
+
+_RANGES = ('gt', 'gte', 'lt', 'lte')
+
+
+def _get(value, name):
+    if isinstance(value, dict):
+        return value.get(name)
+    # Price properties of parser items are FormattedPrice floats, their `*_money` counterpart is
+    # parsed the same way as the price fields of a record.
+    if getattr(type(value), name + '_money', None) is not None:
+        return getattr(value, name + '_money')
+    return getattr(value, name, None)
+
+
+def _values(item, path):
+    """
+    Values of a field path of a record or a parser item. Lists along the path are flattened.
+    """
+    values = [item]
+    for name in path:
+        resolved = []
+        for value in values:
+            value = _get(value, name)
+            if isinstance(value, (list, tuple)):
+                resolved.extend(x for x in value if x is not None)
+            elif value is not None:
+                resolved.append(value)
+        values = resolved
+    return [x.amount if isinstance(x, Money) else x for x in values]
+
+
+def _compact(values):
+    # Most fields have a single value, don't keep a tuple for each of them.
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return tuple(values)
+
+
+def _match(stored, op, value):
+    """
+    :param stored: Column value of an item. (None, a value or a tuple of values)
+    """
+    if op == 'isnull':
+        return (stored is None) == bool(value)
+    if op == 'ne':
+        return not _match(stored, 'exact', value)
+    if stored is None:
+        return False
+    for x in (stored if isinstance(stored, tuple) else (stored,)):
+        if op == 'exact':
+            matched = x == value
+        elif op == 'in':
+            matched = x in value
+        elif op == 'gt':
+            matched = x > value
+        elif op == 'gte':
+            matched = x >= value
+        elif op == 'lt':
+            matched = x < value
+        elif op == 'lte':
+            matched = x <= value
+        elif op == 'contains':
+            matched = value in x
+        else:
+            matched = x.startswith(value)
+        if matched:
+            return True
+    return False
+
+
+class _SortedIndex(object):
+    """
+    Values of a numeric field sorted along with the position of their item.
+    """
+
+    def __init__(self, values, positions):
+        order = sorted(xrange(len(values)), key=values.__getitem__)
+        self.values = array('d', (values[i] for i in order))
+        self.positions = array('l', (positions[i] for i in order))
+
+    def range(self, op, value):
+        """
+        :return: (start, end) of the sorted values which match the operator.
+        """
+        if op == 'exact':
+            return bisect.bisect_left(self.values, value), bisect.bisect_right(self.values, value)
+        if op == 'gt':
+            return bisect.bisect_right(self.values, value), len(self.values)
+        if op == 'gte':
+            return bisect.bisect_left(self.values, value), len(self.values)
+        if op == 'lt':
+            return 0, bisect.bisect_left(self.values, value)
+        return 0, bisect.bisect_right(self.values, value)
+
+
+class Catalog(object):
+
+    def __init__(self, categorical=DEFAULT_CATEGORICAL, numeric=DEFAULT_NUMERIC, derived=None):
+        """
+
+        :param categorical: Fields kept in hash indexes. Any hashable value. (ex. text, bool)
+        :param numeric: Fields kept in sorted indexes. Numbers or Money.
+        :param derived: (optional) dict of field name -> function which computes the value (or list of values)
+            of the field from an item. Derived fields must be listed in categorical or numeric.
+        """
+        self.categorical = tuple(categorical)
+        self.numeric = tuple(numeric)
+        self.derived = dict(derived or {})
+        self.items = []
+        self.positions = {}
+        self._paths = dict((name, tuple(name.split(LOOKUP_SEP))) for name in self.categorical + self.numeric)
+        self._columns = dict((name, []) for name in self._paths)
+        self._hashes = dict((name, {}) for name in self.categorical)
+        self._sorted = {}
+        self._removed = 0
+        self._lock = threading.Lock()
+
+    def _resolve(self, item, name):
+        if name in self.derived:
+            value = self.derived[name](item)
+            values = value if isinstance(value, (list, tuple)) else [] if value is None else [value]
+            return [x.amount if isinstance(x, Money) else x for x in values]
+        return _values(item, self._paths[name])
+
+    def add(self, item):
+        """
+        Add an item or replace the item with the same asin.
+        :param item: Item record (see aws.parsers.parse_item_records) or parser item.
+        :return:
+        """
+        asin = item['asin'] if isinstance(item, dict) else item.asin
+        resolved = [(name, self._resolve(item, name)) for name in self._paths]
+        with self._lock:
+            previous = self.positions.get(asin)
+            if previous is not None:
+                # Positions are never reused, the indexes skip removed items.
+                self.items[previous] = None
+                for column in self._columns.values():
+                    column[previous] = None
+                self._removed += 1
+            position = len(self.items)
+            self.items.append(item)
+            self.positions[asin] = position
+            for name, values in resolved:
+                self._columns[name].append(_compact(values))
+                if name in self._hashes:
+                    index = self._hashes[name]
+                    for value in set(values):
+                        if value not in index:
+                            index[value] = array('l')
+                        index[value].append(position)
+            self._sorted.clear()
+
+    def add_items(self, items):
+        """
+        :param items: Iterable of item records or parser items.
+        :return: Number of items added.
+        """
+        added = 0
+        for item in items:
+            self.add(item)
+            added += 1
+        return added
+
+    def add_response(self, content, psr_cls):
+        """
+        Parse an ItemLookup response with the tree-less parser and add its items.
+        :param content: ItemLookup response content.
+        :param psr_cls: The parser class which declares the indexed fields.
+        :return: Number of items added.
+        """
+        return self.add_items(parse_item_records(content, psr_cls))
+
+    def get(self, asin):
+        """
+        :return: The item or None if it isn't in the catalog.
+        """
+        position = self.positions.get(asin)
+        return None if position is None else self.items[position]
+
+    def _sorted_index(self, name):
+        index = self._sorted.get(name)
+        if index is None:
+            values = []
+            positions = []
+            for position, stored in enumerate(self._columns[name]):
+                if stored is None:
+                    continue
+                if isinstance(stored, tuple):
+                    values.extend(stored)
+                    positions.extend([position] * len(stored))
+                else:
+                    values.append(stored)
+                    positions.append(position)
+            index = self._sorted[name] = _SortedIndex(values, positions)
+        return index
+
+    def _candidates(self, name, op, value):
+        """
+        Positions of the items which match a lookup, from the index of the field.
+        :return: (estimated number of positions, function which returns the positions)
+            or None if the index can't select the items of the lookup.
+        """
+        if name in self._hashes:
+            index = self._hashes[name]
+            if op == 'exact':
+                positions = index.get(value, ())
+                return len(positions), lambda: positions
+            if op == 'in':
+                buckets = [index[x] for x in set(value) if x in index]
+                return sum(len(x) for x in buckets), lambda: [p for bucket in buckets for p in bucket]
+        elif op == 'exact' or op in _RANGES:
+            index = self._sorted_index(name)
+            start, end = index.range(op, value)
+            return end - start, lambda: index.positions[start:end]
+        elif op == 'in':
+            index = self._sorted_index(name)
+            ranges = [index.range('exact', x) for x in set(value)]
+            return sum(end - start for start, end in ranges), \
+                lambda: [p for start, end in ranges for p in index.positions[start:end]]
+        return None
+
+    def _compile(self, lookups):
+        compiled = []
+        for key in sorted(lookups):
+            names, op = parse_lookup(key)
+            name = LOOKUP_SEP.join(names)
+            if name not in self._columns:
+                raise ValueError('{} is not indexed'.format(name))
+            value = lookups[key]
+            if name in self.numeric:
+                if op in ('contains', 'startswith'):
+                    raise ValueError('{} is not supported for numbers'.format(op))
+                if isinstance(value, Money):
+                    value = value.amount
+                elif op == 'in':
+                    value = [x.amount if isinstance(x, Money) else x for x in value]
+            elif op in _RANGES:
+                raise ValueError('{} is only supported for numbers, {} is categorical'.format(op, name))
+            if op == 'in':
+                value = frozenset(value)
+            compiled.append((name, op, value))
+        return compiled
+
+    def positions_of(self, **lookups):
+        """
+        :param lookups: Lookups over the indexed fields. ex. sales_rank__lte=1000. Every lookup must match.
+        :return: Sorted list of the positions of the matching items.
+        """
+        compiled = self._compile(lookups)
+        with self._lock:
+            best = None
+            for i, (name, op, value) in enumerate(compiled):
+                candidates = self._candidates(name, op, value)
+                if candidates is not None and (best is None or candidates[0] < best[0]):
+                    best = candidates + (i,)
+            if best is None:
+                positions = xrange(len(self.items))
+                rest = compiled
+            else:
+                positions = set(best[1]())
+                rest = compiled[:best[2]] + compiled[best[2] + 1:]
+            columns = [(self._columns[name], op, value) for name, op, value in rest]
+            items = self.items
+            return sorted(position for position in positions
+                          if items[position] is not None and
+                          all(_match(column[position], op, value) for column, op, value in columns))
+
+    def query(self, **lookups):
+        """
+        Get the items which match every lookup, in the order they were added.
+
+        example:
+            >>> catalog.query(item_attributes__product_group='Toy', sales_rank__lt=5000)
+
+        :param lookups: Lookups over the indexed fields using the operators of aws.parsers.lookup.query.
+            Range operators are only supported for numeric fields.
+        :return: list of items.
+        """
+        return [self.items[position] for position in self.positions_of(**lookups)]
+
+    def count(self, **lookups):
+        """
+        :return: Number of items which match every lookup.
+        """
+        return len(self.positions_of(**lookups))
+
+    def facets(self, name):
+        """
+        Number of items of each value of a categorical field. ex. item counts by brand
+        :param name: Name of a categorical field.
+        :return: dict of value -> number of items.
+        """
+        index = self._hashes[name]
+        with self._lock:
+            if not self._removed:
+                return dict((value, len(positions)) for value, positions in index.iteritems())
+            items = self.items
+            counts = ((value, sum(1 for p in positions if items[p] is not None)) for value, positions in index.iteritems())
+            return dict((value, count) for value, count in counts if count)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __repr__(self):
+        return '<{} items={}>'.format(self.__class__.__name__, len(self.positions))
@@ -0,0 +1,158 @@
+"""
+Used to detect which items of a lookup have changed since the last time they were seen.
+
+Only the fingerprint of each item (and the projected field values when using a field projection)
+is kept so the store stays small even for large catalogs.
+
+example:
+    >>> from aws.changes import ChangeDetector
+    >>>
+    >>> detector = ChangeDetector(fields=('sales_rank', 'offer_summary.lowest_new_price'))
+    >>> for change in detector.changed_items(item_lookup_response.items.item_list()):
+    >>>     print change.asin, change.delta
+"""
+import hashlib
+
+from lxml import etree
+
+from parsers.base import BaseElementWrapper
+
+# Field projection over the OfferSummary, Offers, SalesRank and ItemAttributes response groups.
+DEFAULT_FIELDS = (
+    'sales_rank',
+    'offer_summary.lowest_new_price',
+    'offer_summary.lowest_used_price',
+    'offer_summary.total_new',
+    'offer_summary.total_used',
+    'total_offers',
+    'offers',
+    'item_attributes.title',
+    'item_attributes.list_price',
+)
+
+
+def fingerprint(element):
+    """
+    Create a compact fingerprint of an element and all of its children.
+    :param element: lxml.etree._Element
+    :return: 8 byte digest.
+    """
+    if element is None:
+        return None
+    return hashlib.sha1(etree.tostring(element, method='c14n')).digest()[:8]
+
+
+def _resolve(item, field):
+    """
+    Resolve a dotted attribute path (ex. `offer_summary.lowest_new_price`) on a parser item.
+    :param item:
+    :param field:
+    :return:
+    """
+    value = item
+    for attr in field.split('.'):
+        value = getattr(value, attr)
+    return _plain(value)
+
+
+def _plain(value):
+    """
+    Convert a field value into something which can be stored and compared.
+    Element wrappers are replaced by the fingerprint of the element they wrap.
+    :param value:
+    :return:
+    """
+    if isinstance(value, BaseElementWrapper):
+        return fingerprint(value.element)
+    if isinstance(value, (list, tuple)):
+        return tuple(_plain(x) for x in value)
+    return value
+
+
+class ItemChange(object):
+    """
+    An item which is new or has changed since the last time it was seen.
+    """
+
+    def __init__(self, asin, item, delta, is_new=False):
+        """
+
+        :param asin: ASIN of the item.
+        :param item: The parser item (instance of psr_cls).
+        :param delta: dict of field -> (old value, new value) for each field which changed.
+            When fingerprinting the whole item the fields are the child element names of the item
+            and the values are their fingerprints.
+        :param is_new: True if the item had never been seen before.
+        """
+        self.asin = asin
+        self.item = item
+        self.delta = delta
+        self.is_new = is_new
+
+    def __repr__(self):
+        return '<ItemChange asin={} is_new={} fields={}>'.format(self.asin, self.is_new, sorted(self.delta))
+
+
+class ChangeDetector(object):
+
+    def __init__(self, fields=None, store=None):
+        """
+
+        :param fields: (optional) dotted attribute paths of the parser item to compare. ex. `DEFAULT_FIELDS`.
+            If none are supplied, every child element of the a:Item element is fingerprinted instead.
+        :param store: (optional) dict like object which maps asin -> (fingerprint, values).
+            Use a `shelve` to keep the fingerprints between runs. Defaults to an in memory dict.
+        """
+        self.fields = tuple(fields) if fields else None
+        self.store = store if store is not None else {}
+
+    def _project(self, item):
+        if self.fields:
+            return tuple(_resolve(item, field) for field in self.fields)
+        return tuple((etree.QName(child).localname, fingerprint(child))
+                     for child in item.element if isinstance(child.tag, basestring))
+
+    def _delta(self, old_values, new_values):
+        if self.fields:
+            old_values = old_values or (None,) * len(self.fields)
+            return dict((name, (old, new)) for name, old, new in zip(self.fields, old_values, new_values)
+                        if old != new)
+        old_values = dict(old_values or ())
+        new_values = dict(new_values)
+        return dict((name, (old_values.get(name), new_values.get(name)))
+                    for name in set(old_values) | set(new_values)
+                    if old_values.get(name) != new_values.get(name))
+
+    def check(self, item):
+        """
+        Compare an item against its last fingerprint and remember the new fingerprint.
+        :param item: Parser item (instance of psr_cls) wrapping an a:Item element.
+        :return: ItemChange if the item is new or has changed else None.
+        """
+        asin = str(item.xpath('./a:ASIN/text()')[0])
+        values = self._project(item)
+        digest = hashlib.sha1(repr(values)).digest()[:8]
+        previous = self.store.get(asin)
+        if previous is not None and previous[0] == digest:
+            return None
+        self.store[asin] = (digest, values)
+        return ItemChange(asin, item, self._delta(previous[1] if previous else None, values), is_new=previous is None)
+
+    def changed_items(self, items):
+        """
+        Generator which yields only the items which are new or have changed.
+        :param items: Parser items. ex. `item_lookup_response.items.item_list()`
+        :return:
+        """
+        for item in items:
+            change = self.check(item)
+            if change is not None:
+                yield change
+
+    def forget(self, asin):
+        """
+        Remove the fingerprint of an item so the next time it's seen it's reported as changed.
+        :param asin:
+        :return:
+        """
+        self.store.pop(asin, None)
@@ -0,0 +1,233 @@
+"""
+Command line tools.
+
+Bulk lookup of every ASIN in a file (or stdin) written out as one JSON record per line:
+
+    export AWS_ASSOCIATE_TAG=... AWS_ACCESS_KEY=... AWS_SECRET_KEY=...
+    python -m aws lookup asins.txt --parser Large --concurrency 4 --rate 4 -o items.jsonl
+    cat asins.txt | python -m aws lookup - > items.jsonl
+
+Progress and throughput are written to stderr.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from Queue import Queue
+
+import requests
+from lxml import etree
+
+import config
+from aws_ import ITEM_LOOKUP_MAX_IDS, MARKETPLACES, Lookup
+from negative import NegativeCache
+from parsers import Item, Large, Medium, OfferFull, Small, parse_item_records
+from parsers.lookup.base import AWSError
+from parsers.money import Money
+from throttle import AdaptiveRateLimiter, RateLimiter, is_throttled
+
+PARSER_PRESETS = {
+    'Small': Small,
+    'Medium': Medium,
+    'Large': Large,
+    'OfferFull': OfferFull,
+}
+
+
+def read_item_ids(f):
+    """
+    Generator of item ids read from a file, one per line. Empty lines and lines starting with # are skipped.
+    :param f: File object.
+    :return:
+    """
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def _json_default(value):
+    if isinstance(value, Money):
+        return {'amount': value.amount, 'currency_code': value.currency_code}
+    raise TypeError(repr(value))
+
+
+def run_concurrently(fn, tasks, concurrency):
+    """
+    Call fn for every task using a fixed number of threads, yielding the results as they complete.
+
+    Tasks are read from the iterable as the threads need them, so only a bounded number of tasks
+    and results are held in memory no matter how many tasks there are.
+    :param fn:
+    :param tasks: Iterable of tasks.
+    :param concurrency: Number of threads.
+    :return: Generator of results.
+    """
+    done = object()
+    task_queue = Queue(maxsize=concurrency * 2)
+    result_queue = Queue(maxsize=concurrency * 2)
+
+    def feed():
+        for task in tasks:
+            task_queue.put(task)
+        for _ in range(concurrency):
+            task_queue.put(done)
+
+    def work():
+        try:
+            while True:
+                task = task_queue.get()
+                if task is done:
+                    return
+                result_queue.put(fn(task))
+        except Exception as e:
+            result_queue.put(e)
+        finally:
+            result_queue.put(done)
+
+    threads = [threading.Thread(target=feed)] + [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    remaining = concurrency
+    while remaining:
+        result = result_queue.get()
+        if result is done:
+            remaining -= 1
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            yield result
+
+
+class Stats(object):
+
+    def __init__(self, out=sys.stderr, interval=5):
+        self.out = out
+        self.interval = interval
+        self.started = self.reported = time.time()
+        self.requests = 0
+        self.items = 0
+        self.errors = 0
+        self.throttled = 0
+
+    def report(self, force=False):
+        now = time.time()
+        if not force and now - self.reported < self.interval:
+            return
+        self.reported = now
+        elapsed = max(now - self.started, 1e-9)
+        self.out.write('requests={} items={} errors={} throttled={} elapsed={:.1f}s items/s={:.1f} requests/s={:.2f}\n'.format(
+            self.requests, self.items, self.errors, self.throttled, elapsed, self.items / elapsed, self.requests / elapsed))
+        self.out.flush()
+
+
+def lookup_command(args):
+    config.configure(write_responses=args.write_responses)
+    credentials = [args.associate_tag, args.access_key, args.secret_key]
+    if not all(credentials):
+        sys.stderr.write('credentials are required, set AWS_ASSOCIATE_TAG, AWS_ACCESS_KEY and AWS_SECRET_KEY\n')
+        return 2
+    if args.max_rate:
+        limiter = AdaptiveRateLimiter(args.rate, max_rate=args.max_rate)
+    else:
+        limiter = RateLimiter(args.rate)
+    negative_cache = None
+    if args.negative_cache and args.id_type in (None, 'ASIN'):
+        negative_cache = NegativeCache(args.negative_cache, ttl=args.negative_ttl * 86400)
+    lookup = Lookup(*credentials, marketplace=MARKETPLACES.get(args.marketplace, args.marketplace), limiter=limiter,
+                    negative_cache=negative_cache)
+    psr_cls = type('{}Item'.format(args.parser), (Item, PARSER_PRESETS[args.parser]), {})
+    extra = {}
+    if args.condition:
+        extra['Condition'] = args.condition
+    if args.id_type:
+        extra['IdType'] = args.id_type
+        if args.id_type != 'ASIN':
+            extra['SearchIndex'] = args.search_index
+    stats = Stats(interval=args.progress_interval)
+
+    def fetch(batch):
+        attempts = throttled = 0
+        try:
+            for attempt in range(args.retries + 1):
+                attempts += 1
+                content = lookup.item_lookup(batch, parser=psr_cls, **extra)
+                if not is_throttled(content):
+                    break
+                throttled += 1
+                if attempt < args.retries:
+                    time.sleep(2 ** attempt)
+            return batch, parse_item_records(content, psr_cls), None, attempts, throttled
+        except AWSError as e:
+            return batch, [], (e.code, e.msg), attempts, throttled
+        except (requests.RequestException, etree.XMLSyntaxError) as e:
+            # ex. connection errors or the HTML error page of a proxy, the batch is written as an error line.
+            return batch, [], (e.__class__.__name__, str(e)), attempts, throttled
+
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        batches = lookup.batch_item_ids(read_item_ids(input_file), args.batch_size)
+        for batch, records, error, attempts, throttled in run_concurrently(fetch, batches, args.concurrency):
+            stats.requests += attempts
+            stats.throttled += throttled
+            if error is not None:
+                stats.errors += len(batch)
+                output.write(json.dumps({'item_ids': batch, 'error': error[0], 'message': error[1]}) + '\n')
+            for err in getattr(records, 'errors', ()):
+                stats.errors += 1
+                output.write(json.dumps({'error': err.get('code'), 'message': err.get('message')}) + '\n')
+            for record in records:
+                stats.items += 1
+                output.write(json.dumps(record, default=_json_default) + '\n')
+            stats.report()
+    finally:
+        output.flush()
+        if output is not sys.stdout:
+            output.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if negative_cache is not None:
+            negative_cache.close()
+    stats.report(force=True)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m aws', description='Amazon Product Advertising API tools.')
+    commands = parser.add_subparsers(dest='command')
+
+    lookup = commands.add_parser('lookup', help='Look up every item id of a file and write the items as JSON lines.')
+    lookup.add_argument('input', nargs='?', default='-', help='File with one item id per line. Defaults to stdin.')
+    lookup.add_argument('-o', '--output', default='-', help='JSON lines output file. Defaults to stdout.')
+    lookup.add_argument('--parser', choices=sorted(PARSER_PRESETS), default='Small',
+                        help='Parser preset, the minimal response groups are requested for it.')
+    lookup.add_argument('--concurrency', type=int, default=4, help='Number of requests in flight at once.')
+    lookup.add_argument('--rate', type=float, default=1.0, help='Maximum number of requests per second.')
+    lookup.add_argument('--max-rate', type=float,
+                        help='Adapt the rate to throttling, starting at --rate and never going above this.')
+    lookup.add_argument('--batch-size', type=int, default=ITEM_LOOKUP_MAX_IDS, help='Item ids sent with each request.')
+    lookup.add_argument('--retries', type=int, default=3, help='Number of times a throttled request is sent again.')
+    lookup.add_argument('--condition', help='Offer condition. ex. New, Used, All')
+    lookup.add_argument('--id-type', help='Type of the item ids. ex. ASIN, UPC, EAN')
+    lookup.add_argument('--search-index', default='All', help='Search index used when the id type is not ASIN.')
+    lookup.add_argument('--negative-cache', help='dbm file of the ASINs which were rejected as invalid. '
+                                                 'They are skipped until they expire.')
+    lookup.add_argument('--negative-ttl', type=float, default=30, help='Days a rejected ASIN is skipped for.')
+    lookup.add_argument('--marketplace', default='us',
+                        help='Marketplace ({}) or endpoint host.'.format(', '.join(sorted(MARKETPLACES))))
+    lookup.add_argument('--associate-tag', default=os.getenv('AWS_ASSOCIATE_TAG'))
+    lookup.add_argument('--access-key', default=os.getenv('AWS_ACCESS_KEY'))
+    lookup.add_argument('--secret-key', default=os.getenv('AWS_SECRET_KEY'))
+    lookup.add_argument('--write-responses', action='store_true', help='Also write each response to the XML_RESPONSE_DIR.')
+    lookup.add_argument('--progress-interval', type=float, default=5, help='Seconds between progress reports.')
+    lookup.set_defaults(func=lookup_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -1,9 +1,40 @@
+"""
+Settings used by the AWS client.
+
+Settings are read from the environment when this module is first imported and can be
+changed afterwards by setting the attributes of this module or by calling `configure`.
+Nothing is written to disk until a response is actually written.
+
+AWS_WRITE_RESPONSES: Set to 0 to stop writing responses to disk.
+AWS_XML_RESPONSE_DIR: Directory where the responses are written.
+"""
 import os
 
 # Write responses to the XML_RESPONSE_DIR
-WRITE_RESPONSES = True
+WRITE_RESPONSES = os.getenv('AWS_WRITE_RESPONSES', '1').lower() not in ('0', 'false', 'no', '')
 # Directory where the responses from make_request in AWS are written.
-XML_RESPONSE_DIR = os.path.join(os.path.dirname(__file__), 'xml-responses')
+XML_RESPONSE_DIR = os.getenv('AWS_XML_RESPONSE_DIR') or os.path.join(os.path.dirname(__file__), 'xml-responses')
+
+
+def configure(write_responses=None, xml_response_dir=None):
+    """
+    Change the settings used by the AWS client.
+    :param write_responses: (optional) Write responses to the xml_response_dir.
+    :param xml_response_dir: (optional) Directory where the responses are written.
+    :return:
+    """
+    global WRITE_RESPONSES, XML_RESPONSE_DIR
+    if write_responses is not None:
+        WRITE_RESPONSES = write_responses
+    if xml_response_dir is not None:
+        XML_RESPONSE_DIR = xml_response_dir
+
 
-if not os.path.exists(XML_RESPONSE_DIR):
-    os.mkdir(XML_RESPONSE_DIR)
+def response_dir():
+    """
+    Get the XML_RESPONSE_DIR, creating it the first time it's used.
+    :return:
+    """
+    if not os.path.exists(XML_RESPONSE_DIR):
+        os.makedirs(XML_RESPONSE_DIR)
+    return XML_RESPONSE_DIR
@@ -0,0 +1,344 @@
+"""
+Durable queue of item id batches for crawls which must survive workers dying or being redeployed.
+
+The queue is a SQLite database in WAL mode, so several worker processes can consume the same queue.
+A worker leases batches for a limited time and acknowledges each batch along with its result in a single
+transaction, so a batch is either done with its result stored or it's leased again once the lease expires.
+Restarting a crawl continues with the batches which aren't done.
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.crawl import CrawlQueue, run_worker
+    >>>
+    >>> queue = CrawlQueue('/var/lib/catalog/crawl.db')
+    >>> queue.add(read_asins())  # adding the same item ids again is a no-op, so this is safe on restart.
+    >>> run_worker(queue, Lookup(associate_tag, access_key, secret_key), parser=MyParser)
+    >>> queue.counts()
+    {'done': 2000000, 'failed': 12}
+"""
+import collections
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import requests
+from lxml import etree
+
+from aws_ import ITEM_LOOKUP_MAX_IDS, batch_item_ids
+from parsers import Item, ItemLookupResponse, retry_item_ids
+from parsers.lookup.base import THROTTLED_ERROR_CODE, AWSError
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    item_ids TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS batches_state ON batches (state, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    batch_id INTEGER PRIMARY KEY,
+    content BLOB
+);
+'''
+
+Batch = collections.namedtuple('Batch', 'id item_ids attempts')
+
+
+def default_owner():
+    """
+    :return: Name of the current worker. ex. crawler-1:4242:140231
+    """
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), threading.current_thread().ident)
+
+
+class CrawlQueue(object):
+
+    def __init__(self, path, max_attempts=5):
+        """
+
+        :param path: Path of the SQLite database. Created if it doesn't exist.
+        :param max_attempts: Number of times a batch is leased before it's marked as failed.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    def _transaction(self, fn, *args):
+        # BEGIN IMMEDIATE takes the write lock up front so two workers can't lease the same batch.
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._db, *args)
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def add(self, item_ids, batch_size=ITEM_LOOKUP_MAX_IDS, attempts=0):
+        """
+        Add item ids to the queue in batches. Batches which are already in the queue are skipped,
+        so adding the same item ids again (ex. when a crawl is restarted) doesn't add them twice.
+        :param item_ids: Iterable of item ids.
+        :param batch_size: Number of item ids in each batch.
+        :param attempts: Number of attempts the batches start with.
+        :return: Number of batches added.
+        """
+        def insert(db, batches):
+            now = time.time()
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO batches (item_ids, attempts, updated) VALUES (?, ?, ?)',
+                           ((','.join(batch), attempts, now) for batch in batches))
+            return db.total_changes - before
+
+        added = 0
+        batches = []
+        for batch in batch_item_ids(item_ids, batch_size):
+            batches.append(batch)
+            if len(batches) == 10000:
+                added += self._transaction(insert, batches)
+                batches = []
+        if batches:
+            added += self._transaction(insert, batches)
+        return added
+
+    def lease(self, owner=None, count=1, lease_seconds=300):
+        """
+        Lease batches which are pending or whose lease expired.
+        Batches whose lease expired after max_attempts leases are marked as failed instead.
+        :param owner: (optional) Name of the worker. see default_owner
+        :param count: Maximum number of batches to lease.
+        :param lease_seconds: Seconds until the batches are leased to another worker if they aren't acknowledged.
+        :return: list of Batch
+        """
+        owner = owner or default_owner()
+
+        def lease(db):
+            now = time.time()
+            db.execute("UPDATE batches SET state = ?, lease_owner = NULL, error = 'lease expired', updated = ? "
+                       "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                       (FAILED, now, LEASED, now, self.max_attempts))
+            rows = db.execute('SELECT id, item_ids, attempts FROM batches '
+                              'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT ?',
+                              (PENDING, LEASED, now, count)).fetchall()
+            db.executemany('UPDATE batches SET state = ?, lease_owner = ?, lease_expires = ?, '
+                           'attempts = attempts + 1, updated = ? WHERE id = ?',
+                           ((LEASED, owner, now + lease_seconds, now, row[0]) for row in rows))
+            return [Batch(row[0], row[1].split(','), row[2] + 1) for row in rows]
+
+        return self._transaction(lease)
+
+    def renew(self, batch, owner=None, lease_seconds=300):
+        """
+        Extend the lease of a batch which is taking long to process.
+        :return: True if the batch is still leased by the owner.
+        """
+        owner = owner or default_owner()
+
+        def renew(db):
+            return db.execute('UPDATE batches SET lease_expires = ? WHERE id = ? AND state = ? AND lease_owner = ?',
+                              (time.time() + lease_seconds, batch.id, LEASED, owner)).rowcount == 1
+
+        return self._transaction(renew)
+
+    def ack(self, batch, result=None, retry_item_ids=(), owner=None):
+        """
+        Mark a batch as done and store its result in the same transaction.
+        :param batch: Batch which was leased.
+        :param result: (optional) Result to store with the batch. (ex. the response content)
+        :param retry_item_ids: (optional) Item ids of the batch which should be requested again.
+            (see aws.parsers.retry_item_ids) They're requeued as a batch which keeps the attempts of this batch,
+            so item ids which are still missing after max_attempts end up failed.
+        :param owner: (optional) Name of the worker which leased the batch.
+        :return: True if the batch was acknowledged, False if its lease expired and it was leased to another worker.
+        """
+        owner = owner or default_owner()
+
+        def ack(db):
+            now = time.time()
+            if db.execute('UPDATE batches SET state = ?, lease_owner = NULL, error = NULL, updated = ? '
+                          'WHERE id = ? AND state = ? AND lease_owner = ?',
+                          (DONE, now, batch.id, LEASED, owner)).rowcount != 1:
+                return False
+            if result is not None:
+                db.execute('INSERT OR REPLACE INTO results (batch_id, content) VALUES (?, ?)',
+                           (batch.id, sqlite3.Binary(result)))
+            if retry_item_ids:
+                state = PENDING if batch.attempts < self.max_attempts else FAILED
+                item_ids = ','.join(retry_item_ids)
+                error = 'retry of batch {}'.format(batch.id)
+                # The retry is already a batch when every item id of the batch was missing (it's the batch itself)
+                # or when a retry was missing again. Requeue that batch and carry the attempts forward.
+                # A batch which is leased is left to the worker which leased it.
+                if db.execute('UPDATE batches SET state = ?, attempts = MAX(attempts, ?), error = ?, updated = ? '
+                              'WHERE item_ids = ? AND state != ?',
+                              (state, batch.attempts, error, now, item_ids, LEASED)).rowcount == 0:
+                    db.execute('INSERT OR IGNORE INTO batches (item_ids, state, attempts, error, updated) '
+                               'VALUES (?, ?, ?, ?, ?)', (item_ids, state, batch.attempts, error, now))
+            return True
+
+        return self._transaction(ack)
+
+    def fail(self, batch, error, owner=None):
+        """
+        Release a batch which failed. It's leased again unless it's out of attempts, then it's marked as failed.
+        :param batch: Batch which was leased.
+        :param error: Description of the error.
+        :param owner: (optional) Name of the worker which leased the batch.
+        :return: True if the batch was released.
+        """
+        owner = owner or default_owner()
+        state = PENDING if batch.attempts < self.max_attempts else FAILED
+
+        def fail(db):
+            return db.execute('UPDATE batches SET state = ?, lease_owner = NULL, error = ?, updated = ? '
+                              'WHERE id = ? AND state = ? AND lease_owner = ?',
+                              (state, error, time.time(), batch.id, LEASED, owner)).rowcount == 1
+
+        return self._transaction(fail)
+
+    def release(self, batch, owner=None):
+        """
+        Release a batch without counting the attempt. (ex. the request was throttled)
+        :param batch: Batch which was leased.
+        :param owner: (optional) Name of the worker which leased the batch.
+        :return: True if the batch was released.
+        """
+        owner = owner or default_owner()
+
+        def release(db):
+            return db.execute('UPDATE batches SET state = ?, lease_owner = NULL, attempts = attempts - 1, updated = ? '
+                              'WHERE id = ? AND state = ? AND lease_owner = ?',
+                              (PENDING, time.time(), batch.id, LEASED, owner)).rowcount == 1
+
+        return self._transaction(release)
+
+    def retry_failed(self):
+        """
+        Move the failed batches back to pending with their attempts reset.
+        :return: Number of batches.
+        """
+        def retry(db):
+            return db.execute('UPDATE batches SET state = ?, attempts = 0, updated = ? WHERE state = ?',
+                              (PENDING, time.time(), FAILED)).rowcount
+
+        return self._transaction(retry)
+
+    def counts(self):
+        """
+        :return: dict of state -> number of batches.
+        """
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM batches GROUP BY state').fetchall())
+
+    def remaining(self):
+        """
+        :return: Number of batches which are pending or leased.
+        """
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    def failed(self):
+        """
+        :return: list of (Batch, error) of the failed batches.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT id, item_ids, attempts, error FROM batches WHERE state = ? ORDER BY id',
+                                    (FAILED,)).fetchall()
+        return [(Batch(row[0], row[1].split(','), row[2]), row[3]) for row in rows]
+
+    def results(self):
+        """
+        Generator of (item ids, result) of the done batches with a stored result.
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT batches.item_ids, results.content FROM results '
+                                    'JOIN batches ON batches.id = results.batch_id WHERE batches.state = ? '
+                                    'ORDER BY batches.id', (DONE,)).fetchall()
+        for item_ids, content in rows:
+            yield item_ids.split(','), str(content)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def run_worker(queue, lookup, response_groups=(), parser=None, handle=None, owner=None, lease_seconds=300,
+               poll_interval=5, stop_event=None, **kwargs):
+    """
+    Process batches of the queue until no batch is pending or leased.
+
+    Item ids which were throttled or missing from a response are requeued as a batch. (see CrawlQueue.ack)
+    Batches whose request was throttled are released without counting the attempt and the worker backs off,
+    pass a Lookup with a rate limiter to avoid being throttled in the first place. (see aws.throttle)
+    :param queue: CrawlQueue
+    :param lookup: aws.Lookup used to request each batch.
+    :param response_groups: Response groups to request.
+    :param parser: (optional) Parser class the response groups are derived from. see Lookup.item_lookup
+    :param handle: (optional) Called with (Batch, response content) for each response. Its return value is
+        stored as the result of the batch. By default the response content is stored.
+        An exception raised by it fails the batch.
+    :param owner: (optional) Name of the worker. see default_owner
+    :param lease_seconds: Seconds each batch is leased for.
+    :param poll_interval: Seconds to wait for leases of other workers to expire when no batch is pending.
+    :param stop_event: (optional) threading.Event used to stop the worker after the current batch.
+    :param kwargs: Any extra parameters sent with each item_lookup. ex. Condition='New'
+    :return: Number of batches acknowledged.
+    """
+    logger = logging.getLogger('CrawlWorker')
+    owner = owner or default_owner()
+    acked = 0
+    throttled = 0
+    while not (stop_event is not None and stop_event.is_set()):
+        batches = queue.lease(owner, 1, lease_seconds)
+        if not batches:
+            if not queue.remaining():
+                break
+            time.sleep(poll_interval)
+            continue
+        batch = batches[0]
+        try:
+            content = lookup.item_lookup(batch.item_ids, response_groups, parser=parser, **kwargs)
+            outcomes = ItemLookupResponse(etree.fromstring(content), Item).item_outcomes()
+        except AWSError as e:
+            if e.code == THROTTLED_ERROR_CODE:
+                queue.release(batch, owner)
+                throttled += 1
+                time.sleep(min(poll_interval, 0.1 * 2 ** throttled))
+                continue
+            logger.warning('batch %s failed: %r', batch.id, e)
+            queue.fail(batch, '{}: {}'.format(e.code, e.msg), owner)
+            continue
+        except (requests.RequestException, etree.XMLSyntaxError) as e:
+            logger.warning('batch %s failed: %r', batch.id, e)
+            queue.fail(batch, repr(e), owner)
+            continue
+        throttled = 0
+        try:
+            result = handle(batch, content) if handle is not None else content
+        except Exception as e:
+            logger.exception('handle failed for batch %s', batch.id)
+            queue.fail(batch, repr(e), owner)
+            continue
+        if queue.ack(batch, result, retry_item_ids(outcomes), owner):
+            acked += 1
+        else:
+            logger.warning('lease of batch %s expired before it was acknowledged', batch.id)
+    return acked
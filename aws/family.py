@@ -0,0 +1,195 @@
+"""
+Used to group variation items (ex. every size and color of a shirt) into families by their parent ASIN.
+
+The index is filled from ItemLookup responses (pass it to `Lookup(family_index=...)` and every response is
+observed). Fields which are the same for every item of a family are parsed once per family and shared,
+and item ids can be collapsed to one item per family before batching so family level response groups
+are only requested once per family.
+
+example:
+    >>> from aws import Lookup, batch_item_ids
+    >>> from aws.family import FamilyIndex, FamilyParser
+    >>>
+    >>> families = FamilyIndex()
+    >>> lookup = Lookup(associate_tag, access_key, secret_key, family_index=families)
+    >>> # per item data for every item
+    >>> for batch in batch_item_ids(asins):
+    >>>     lookup.item_lookup(batch, ['Offers'])
+    >>> # family data once per family
+    >>> for batch in batch_item_ids(families.collapse(asins, missing_only=True)):
+    >>>     lookup.item_lookup(batch, parser=FamilyParser)
+    >>> families.family_record('B00FRIQEDW')['browse_node_ids']
+"""
+import threading
+
+from lxml import etree
+
+from parsers import BrowseNodes, Item, ItemAttributes, parse_item_records, response_groups_for
+from parsers.lookup.base import AWSError
+from parsers.lookup.item_plugins import RESPONSE_GROUP_PARENTS
+from parsers.lookup.target import record_fields_for
+
+
+class FamilyParser(Item, ItemAttributes, BrowseNodes):
+    """
+    Default family level fields. Note that some item attributes (ex. size, color, UPC) differ between
+    the items of a family, the attributes of the first item seen are kept.
+    """
+    pass
+
+
+def _returns(response_groups, psr_cls):
+    """
+    :return: True if the response groups return the fields of the parser class.
+    """
+    groups = set(response_groups)
+    return all(group in groups or groups.intersection(RESPONSE_GROUP_PARENTS.get(group, ()))
+               for group in response_groups_for(psr_cls))
+
+
+class FamilyIndex(object):
+
+    def __init__(self, family_parser=FamilyParser):
+        """
+
+        :param family_parser: Parser class which declares the family level fields (see aws.parsers.parse_item_records)
+        """
+        self.family_parser = family_parser
+        self.parents = {}
+        self.children = {}
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def add(self, asin, parent_asin):
+        """
+        Add an item to the index.
+        :param asin:
+        :param parent_asin: Parent ASIN of the item. Items without a parent are a family of their own.
+        :return:
+        """
+        if not parent_asin:
+            return
+        with self._lock:
+            if parent_asin != asin:
+                self.parents[asin] = parent_asin
+                self.children.setdefault(parent_asin, set()).add(asin)
+            else:
+                self.children.setdefault(parent_asin, set())
+
+    def parser_for(self, response_groups=None):
+        """
+        :param response_groups: (optional) Response groups which were requested.
+        :return: Parser class of the fields observe_records needs from a response of the response groups.
+        """
+        if response_groups is None or _returns(response_groups, self.family_parser):
+            return self.family_parser
+        return Item
+
+    def observe(self, content, response_groups=None):
+        """
+        Add every item of an ItemLookup response to the index. see observe_records
+        :param content: ItemLookup response content.
+        :param response_groups: see observe_records
+        :return: list of (asin, parent asin) of the items.
+        """
+        try:
+            records = parse_item_records(content, self.parser_for(response_groups))
+        except (AWSError, etree.XMLSyntaxError):
+            return []
+        return self.observe_records(records, response_groups)
+
+    def observe_records(self, records, response_groups=None):
+        """
+        Add every item record of an ItemLookup response to the index.
+
+        The family level fields are stored for the families whose fields aren't known yet.
+        :param records: Item records parsed with the fields of `parser_for(response_groups)` (or more).
+        :param response_groups: (optional) Response groups which were requested. Family level fields aren't
+            stored when they don't return the fields of the family parser.
+        :return: list of (asin, parent asin) of the items.
+        """
+        store = response_groups is None or _returns(response_groups, self.family_parser)
+        names = set(field.name for field in record_fields_for(self.family_parser))
+        for record in records:
+            self.add(record['asin'], record.get('parent_asin'))
+            family = self.family_of(record['asin'])
+            if not store or family in self.records:
+                continue
+            family_record = dict((name, value) for name, value in record.items() if name in names)
+            # Skip items which were returned without the family level fields.
+            if len(family_record) > len([x for x in ('asin', 'parent_asin') if x in family_record]):
+                with self._lock:
+                    self.records.setdefault(family, family_record)
+        return [(record['asin'], record.get('parent_asin')) for record in records]
+
+    def parent(self, asin):
+        """
+        :return: Parent ASIN of the item or None if the item has no known parent.
+        """
+        return self.parents.get(asin)
+
+    def family_of(self, asin):
+        """
+        :return: The parent ASIN of the item, or the item itself if it has no known parent.
+        """
+        return self.parents.get(asin, asin)
+
+    def family(self, asin):
+        """
+        :return: Sorted list of the known items of the family of an item. (excluding the parent)
+        """
+        with self._lock:
+            return sorted(self.children.get(self.family_of(asin), ()) or [asin])
+
+    def family_record(self, asin):
+        """
+        :return: The family level fields shared by the family of an item or None if they aren't known yet.
+        """
+        return self.records.get(self.family_of(asin))
+
+    def expand(self, asins):
+        """
+        Add every known item of the families of the asins.
+        :param asins: Iterable of asins.
+        :return: list of asins, each followed by the rest of its family. Duplicates are removed.
+        """
+        expanded = []
+        seen = set()
+        for asin in asins:
+            for x in [asin] + self.family(asin):
+                if x not in seen:
+                    seen.add(x)
+                    expanded.append(x)
+        return expanded
+
+    def collapse(self, asins, missing_only=False):
+        """
+        Keep only the first asin of each family.
+        :param asins: Iterable of asins.
+        :param missing_only: Also drop the families whose family level fields are already known.
+        :return: list of asins.
+        """
+        collapsed = []
+        seen = set()
+        for asin in asins:
+            family = self.family_of(asin)
+            if family in seen or (missing_only and family in self.records):
+                continue
+            seen.add(family)
+            collapsed.append(asin)
+        return collapsed
+
+    def forget(self, asin):
+        """
+        Remove the family level fields of the family of an item so they're parsed again from the next response.
+        :param asin:
+        :return:
+        """
+        with self._lock:
+            self.records.pop(self.family_of(asin), None)
+
+    def __len__(self):
+        return len(self.children)
+
+    def __repr__(self):
+        return '<{} families={} items={}>'.format(self.__class__.__name__, len(self.children), len(self.parents))
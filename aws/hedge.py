@@ -0,0 +1,144 @@
+"""
+Used to cut the tail latency of requests by hedging.
+
+When a request hasn't completed after a percentile of the recent latencies, a duplicate request is sent
+and whichever response completes first is used. The duplicates are capped by a budget, a fraction of the
+requests sent, so hedging never spends more than that fraction of extra quota.
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.hedge import Hedger
+    >>>
+    >>> # hedge requests slower than the p95 latency, spending at most 5% extra requests.
+    >>> lookup = Lookup(associate_tag, access_key, secret_key, hedger=Hedger(percentile=95, budget=0.05))
+"""
+import threading
+import time
+from collections import deque
+from Queue import Queue
+
+
+class Hedger(object):
+
+    def __init__(self, percentile=95, budget=0.05, window=200, min_samples=20, min_delay=0.05, max_tokens=10):
+        """
+
+        :param percentile: Latency percentile (of the recent requests) after which a duplicate request is sent.
+        :param budget: Fraction of the requests which may be duplicated. ex. 0.05 allows 1 duplicate every 20 requests
+        :param window: Number of recent latencies the percentile is computed from.
+        :param min_samples: Requests aren't hedged until this many latencies have been recorded.
+        :param min_delay: Shortest number of seconds to wait before sending a duplicate.
+        :param max_tokens: Most duplicates which can be saved up while requests are fast.
+        """
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_tokens = max_tokens
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def delay(self):
+        """
+        :return: Number of seconds to wait before sending a duplicate or None if there isn't enough history yet.
+        """
+        with self._lock:
+            if not self.latencies or len(self.latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.latencies)
+        i = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        return max(self.min_delay, latencies[i])
+
+    def _take_token(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self.hedges += 1
+            return True
+
+    def _timed(self, send):
+        start = time.time()
+        response = send()
+        self.record(time.time() - start)
+        return response
+
+    def do(self, send):
+        """
+        Send a request, sending a duplicate if it's slower than the hedging delay.
+        :param send: Function which sends the request and returns its response. It's called again for the
+            duplicate. Only the time spent in it is recorded as latency, so it shouldn't wait on a rate limiter.
+        :return: The first response which completed.
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.max_tokens, self._tokens + self.budget)
+        delay = self.delay()
+        if delay is None:
+            return self._timed(send)
+
+        results = Queue()
+
+        def attempt(hedge):
+            try:
+                results.put((hedge, self._timed(send), None))
+            except Exception as e:
+                results.put((hedge, None, e))
+
+        def timer():
+            time.sleep(delay)
+            results.put(None)
+
+        # Waiting on the queue without a timeout, a timeout would poll.
+        self._start(attempt, False)
+        self._start(timer)
+        pending = 1
+        result = results.get()
+        if result is None:
+            # The request is slower than the delay.
+            if self._take_token():
+                self._start(attempt, True)
+                pending += 1
+            result = results.get()
+        first_error = None
+        while True:
+            if result is not None:
+                pending -= 1
+                hedge, response, error = result
+                if error is None:
+                    break
+                # A failed attempt only loses if the other one succeeds.
+                first_error = first_error or error
+                if not pending:
+                    raise first_error
+            result = results.get()
+        if hedge:
+            with self._lock:
+                self.hedge_wins += 1
+        return response
+
+    def _start(self, target, *args):
+        # The losing request is left to complete in the background, its response is dropped.
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def state(self):
+        """
+        :return: dict of the current hedging delay and the number of requests, duplicates and duplicates which won.
+        """
+        delay = self.delay()
+        with self._lock:
+            return dict(delay=delay, requests=self.requests, hedges=self.hedges, hedge_wins=self.hedge_wins)
+
+    def __repr__(self):
+        return '<{} percentile={} budget={} hedges={}/{}>'.format(
+            self.__class__.__name__, self.percentile, self.budget, self.hedges, self.requests)
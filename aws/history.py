@@ -0,0 +1,429 @@
+"""
+Append-only store of the history of item fields over time. (ex. sales rank, lowest prices and offer counts)
+
+Every (asin, series) pair is a time series of integer values. Points are collected in arrays in memory
+and written out in blocks: the timestamps and the values of a block are each delta encoded and written
+as zigzag varints, so a point which didn't change much since the previous one takes 2-4 bytes. An index
+of the blocks (series, time range, offset) is kept in memory, so a range query only reads the blocks
+which overlap the range.
+
+The asin and the name of a series are written once, in a series record which gives the series an id.
+Blocks refer to their series by id and their header is a few varints, so a block of a single point
+takes ~15 bytes. That keeps the tail blocks written by frequent flushes cheap, `compact` merges them
+into full blocks.
+
+Points reach the file when a series has `block_size` points, when `add_records` runs more than
+`flush_interval` seconds after the last flush, or on an explicit `flush`. Call `flush(sync=True)` at
+the end of each snapshot if a crash mustn't lose any points.
+
+Series are named by their record field path using the lookup syntax. (see aws.parsers.lookup.query)
+Prices are stored as their amount in minor units. (ex. 1999 for $19.99)
+
+example:
+    >>> from aws.history import HistoryStore
+    >>>
+    >>> history = HistoryStore('/var/lib/catalog/history.bin')
+    >>> history.add_response(response_content, MyParser)
+    >>> history.flush(sync=True)
+    >>> timestamps, ranks = history.series('B00FRIQEDW', 'sales_rank', start=time.time() - 86400 * 30)
+    >>> numpy.frombuffer(ranks, dtype=numpy.int64)
+"""
+import bisect
+import os
+import threading
+import time
+
+from parsers import parse_item_records
+from parsers.lookup.query import LOOKUP_SEP
+from parsers.money import Money, int64_array
+
+DEFAULT_SERIES = (
+    'sales_rank',
+    'offer_summary__lowest_new_price',
+    'offer_summary__lowest_used_price',
+    'offer_summary__lowest_collectible_price',
+    'offer_summary__lowest_refurbished_price',
+    'offer_summary__total_new',
+    'offer_summary__total_used',
+    'offer_summary__total_collectible',
+    'offer_summary__total_refurbished',
+)
+
+_MAGIC = 'AWSHIST2'
+
+# Series record: kind, size of the asin, asin, size of the name, name. Series ids are given in file order.
+_SERIES = 'S'
+# Block record: kind, varints of the series id, number of points, first timestamp (zigzag),
+# last - first timestamp and payload size, then the payload.
+_BLOCK = 'B'
+
+# Largest record header: a series record with an asin and a name of 255 bytes.
+_MAX_HEADER = 3 + 255 * 2
+_CHUNK = 1 << 20
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _append_varint(n, out):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, offset):
+    n = shift = 0
+    while True:
+        b = buf[offset]
+        offset += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, offset
+        shift += 7
+
+
+def encode_deltas(values, out, start=0):
+    """
+    Append the deltas between consecutive values to out as zigzag varints.
+    :param values: Iterable of integers.
+    :param out: bytearray
+    :param start: (optional) Value the first delta is taken from.
+    :return:
+    """
+    previous = start
+    for value in values:
+        _append_varint(_zigzag(value - previous), out)
+        previous = value
+
+
+def decode_deltas(buf, offset, count, out, start=0):
+    """
+    Decode count values encoded by encode_deltas.
+    :param buf: bytearray
+    :param offset: Offset of the first varint.
+    :param count: Number of values to decode.
+    :param out: array the values are appended to.
+    :param start: (optional) Value the values were encoded from.
+    :return: Offset after the last varint.
+    """
+    value = start
+    for _ in xrange(count):
+        n, offset = _read_varint(buf, offset)
+        value += _unzigzag(n)
+        out.append(value)
+    return offset
+
+
+def _take(buf, offset, size):
+    if offset + size > len(buf):
+        raise IndexError('record is truncated')
+    return str(buf[offset:offset + size])
+
+
+def _series_record(asin, name):
+    if len(asin) > 0xff or len(name) > 0xff:
+        raise ValueError('{} {}: asin and series name must be at most 255 bytes'.format(asin, name))
+    return bytearray(_SERIES + chr(len(asin)) + asin + chr(len(name)) + name)
+
+
+def _block_record(series_id, timestamps, values):
+    payload = bytearray()
+    encode_deltas(timestamps, payload, timestamps[0])
+    encode_deltas(values, payload)
+    header = bytearray(_BLOCK)
+    for n in (series_id, len(timestamps), _zigzag(timestamps[0]), timestamps[-1] - timestamps[0], len(payload)):
+        _append_varint(n, header)
+    return header, payload
+
+
+def _resolve(record, path):
+    value = record
+    for name in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    if isinstance(value, Money):
+        return value.amount
+    if isinstance(value, bool) or not isinstance(value, (int, long)):
+        return None
+    return value
+
+
+class _Series(object):
+    """
+    Blocks of a series which were written along with the points which weren't written yet.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.blocks = []
+        self.timestamps = int64_array()
+        self.values = int64_array()
+        self.last_timestamp = None
+
+
+class HistoryStore(object):
+
+    def __init__(self, path, series=DEFAULT_SERIES, block_size=256, flush_interval=3600):
+        """
+
+        :param path: Path of the data file. Created if it doesn't exist.
+        :param series: Names of the series collected by add_records. (record field paths separated by `__`)
+        :param block_size: Number of points of a series kept in memory before they're written as a block.
+        :param flush_interval: (optional) Seconds after which add_records writes the points kept in memory.
+            None to only write them in blocks of block_size points or on flush.
+        """
+        self.path = path
+        self.series_names = tuple(series)
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self._paths = [(name, tuple(name.split(LOOKUP_SEP))) for name in self.series_names]
+        self._series = {}
+        # (asin, name) of each series id.
+        self._keys = []
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._file = open(path, 'ab+')
+        self._load_index()
+
+    def _load_index(self):
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            f.write(_MAGIC)
+            f.flush()
+            return
+        f.seek(0)
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError('{} is not a history file'.format(self.path))
+        offset = buf_offset = len(_MAGIC)
+        buf = bytearray()
+        while offset < size:
+            i = offset - buf_offset
+            if len(buf) - i < _MAX_HEADER and buf_offset + len(buf) < size:
+                f.seek(offset)
+                buf, buf_offset, i = bytearray(f.read(_CHUNK)), offset, 0
+            try:
+                end = offset + self._index_record(buf, i, offset)
+            except IndexError:
+                # the header of a record always fits in buf unless it reaches the end of the file.
+                if buf_offset + len(buf) < size:
+                    raise ValueError('{} is corrupt at offset {}: record is truncated'.format(self.path, offset))
+                break
+            except ValueError as e:
+                raise ValueError('{} is corrupt at offset {}: {}'.format(self.path, offset, e))
+            if end > size:
+                break
+            offset = end
+        if offset < size:
+            # Drop the last record if it was only partially written. (ex. crash while writing)
+            # Records are only ever cut off at the end of the file, anything else is corruption and raises above.
+            f.truncate(offset)
+
+    def _index_record(self, buf, i, offset):
+        """
+        Add the record at buf[i] to the index.
+        :return: Size of the record.
+        """
+        start = i
+        kind = _take(buf, i, 1)
+        if kind == _SERIES:
+            asin = _take(buf, i + 2, buf[i + 1])
+            i += 2 + len(asin)
+            name = _take(buf, i + 1, buf[i])
+            series = self._series.setdefault((asin, name), _Series())
+            series.id = len(self._keys)
+            self._keys.append((asin, name))
+            return i + 1 + len(name) - start
+        if kind != _BLOCK:
+            raise ValueError('unknown record {!r}'.format(kind))
+        series_id, i = _read_varint(buf, i + 1)
+        count, i = _read_varint(buf, i)
+        first, i = _read_varint(buf, i)
+        span, i = _read_varint(buf, i)
+        payload_size, i = _read_varint(buf, i)
+        if series_id >= len(self._keys):
+            raise ValueError('block of unknown series {}'.format(series_id))
+        first = _unzigzag(first)
+        series = self._series[self._keys[series_id]]
+        series.blocks.append((first, first + span, offset + i - start, count, payload_size))
+        series.last_timestamp = first + span
+        return i - start + payload_size
+
+    def add(self, asin, name, timestamp, value):
+        """
+        Append a point to a series. Points of a series must be added in time order.
+        :param asin:
+        :param name: Name of the series.
+        :param timestamp: Integer timestamp. ex. int(time.time())
+        :param value: Integer value.
+        :return:
+        """
+        with self._lock:
+            series = self._series.setdefault((asin, name), _Series())
+            if series.last_timestamp is not None and timestamp < series.last_timestamp:
+                raise ValueError('{} {}: point at {} is older than the last point at {}'.format(
+                    asin, name, timestamp, series.last_timestamp))
+            series.timestamps.append(timestamp)
+            series.values.append(value)
+            series.last_timestamp = timestamp
+            if len(series.timestamps) >= self.block_size:
+                self._write_block(asin, name, series)
+
+    def add_records(self, records, timestamp=None):
+        """
+        Append a point to every series of each item record. Fields which are missing aren't added.
+        The points kept in memory are written if the last flush is older than flush_interval.
+        :param records: Iterable of item records. (see aws.parsers.parse_item_records)
+        :param timestamp: (optional) Timestamp of the points. Defaults to now.
+        :return: Number of points added.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        added = 0
+        for record in records:
+            for name, path in self._paths:
+                value = _resolve(record, path)
+                if value is not None:
+                    self.add(record['asin'], name, timestamp, value)
+                    added += 1
+        if self.flush_interval is not None and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return added
+
+    def add_response(self, content, psr_cls, timestamp=None):
+        """
+        Parse an ItemLookup response with the tree-less parser and add a point for each of its items.
+        :param content: ItemLookup response content.
+        :param psr_cls: The parser class which declares the fields of the series. (ex. Item, SalesRank, OfferSummary)
+        :param timestamp: see add_records
+        :return: Number of points added.
+        """
+        return self.add_records(parse_item_records(content, psr_cls), timestamp)
+
+    def _write_block(self, asin, name, series):
+        record = bytearray()
+        if series.id is None:
+            record += _series_record(asin, name)
+            series.id = len(self._keys)
+            self._keys.append((asin, name))
+        header, payload = _block_record(series.id, series.timestamps, series.values)
+        record += header
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell() + len(record)
+        self._file.write(str(record + payload))
+        first, last, count = series.timestamps[0], series.timestamps[-1], len(series.timestamps)
+        series.blocks.append((first, last, offset, count, len(payload)))
+        series.timestamps = int64_array()
+        series.values = int64_array()
+
+    def _write_pending(self):
+        for asin, name in sorted(self._series):
+            series = self._series[asin, name]
+            if series.timestamps:
+                self._write_block(asin, name, series)
+        self._file.flush()
+        self._last_flush = time.time()
+
+    def flush(self, sync=False):
+        """
+        Write the points which are still in memory as blocks.
+        :param sync: (optional) fsync the file, so the points survive a power loss.
+        :return:
+        """
+        with self._lock:
+            self._write_pending()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def compact(self):
+        """
+        Rewrite the file with the points of each series merged into blocks of block_size points.
+        The small tail blocks written by frequent flushes take more space and are slower to read.
+        The file is replaced once the rewritten copy is synced.
+        :return:
+        """
+        path = self.path + '.compact'
+        if os.path.exists(path):
+            os.remove(path)
+        with self._lock:
+            self._write_pending()
+            copy = HistoryStore(path, self.series_names, self.block_size, flush_interval=None)
+            for asin, name in self._keys:
+                series = self._series[asin, name]
+                timestamps, values = self._read(series)
+                target = copy._series[asin, name] = _Series()
+                for i in xrange(0, len(timestamps), self.block_size):
+                    target.timestamps = timestamps[i:i + self.block_size]
+                    target.values = values[i:i + self.block_size]
+                    copy._write_block(asin, name, target)
+                target.last_timestamp = series.last_timestamp
+            copy._file.flush()
+            os.fsync(copy._file.fileno())
+            copy._file.close()
+            self._file.close()
+            os.rename(path, self.path)
+            self._file = open(self.path, 'ab+')
+            self._series, self._keys = copy._series, copy._keys
+
+    def _read(self, series, start=None, end=None):
+        timestamps = int64_array()
+        values = int64_array()
+        self._file.flush()
+        for first, last, offset, count, payload_size in series.blocks:
+            if (start is not None and last < start) or (end is not None and first > end):
+                continue
+            self._file.seek(offset)
+            payload = bytearray(self._file.read(payload_size))
+            decode_deltas(payload, decode_deltas(payload, 0, count, timestamps, first), count, values)
+        timestamps.extend(series.timestamps)
+        values.extend(series.values)
+        return timestamps, values
+
+    def series(self, asin, name, start=None, end=None):
+        """
+        Get the points of a series within a time range.
+        :param asin:
+        :param name: Name of the series. ex. offer_summary__lowest_new_price
+        :param start: (optional) Earliest timestamp, inclusive.
+        :param end: (optional) Latest timestamp, inclusive.
+        :return: (array of timestamps, array of values) of 64 bit integers.
+            Arrays support the buffer protocol. (ex. `numpy.frombuffer(values, dtype=numpy.int64)`)
+        """
+        with self._lock:
+            series = self._series.get((asin, name))
+            if series is None:
+                return int64_array(), int64_array()
+            timestamps, values = self._read(series, start, end)
+        i = 0 if start is None else bisect.bisect_left(timestamps, start)
+        j = len(timestamps) if end is None else bisect.bisect_right(timestamps, end)
+        if i == 0 and j == len(timestamps):
+            return timestamps, values
+        return timestamps[i:j], values[i:j]
+
+    def latest(self, asin, name):
+        """
+        :return: (timestamp, value) of the last point of a series or None if there are no points.
+        """
+        with self._lock:
+            series = self._series.get((asin, name))
+            if series is None or series.last_timestamp is None:
+                return None
+            if series.values:
+                return series.timestamps[-1], series.values[-1]
+        timestamps, values = self.series(asin, name, start=series.last_timestamp)
+        return timestamps[-1], values[-1]
+
+    def asins(self):
+        return sorted(set(asin for asin, _ in self._series))
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._file.close()
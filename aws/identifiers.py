@@ -0,0 +1,175 @@
+"""
+Persistent index of product identifiers (UPC, EAN) to ASINs.
+
+The index is filled from the UPC, EAN, UPCList and EANList of every item it observes, so identifiers
+of items which were looked up by ASIN are resolved too. Pass it to `Lookup(identifier_index=...)` to
+observe every ItemLookup response, and use `Lookup.resolve_identifiers` to only send the identifiers
+which aren't in the index yet.
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.identifiers import IdentifierIndex
+    >>>
+    >>> index = IdentifierIndex('/var/lib/catalog/identifiers.db')
+    >>> lookup = Lookup(associate_tag, access_key, secret_key, identifier_index=index)
+    >>> lookup.resolve_identifiers(['012345678905', '4006381333931'], id_type='UPC')
+    OrderedDict([('012345678905', 'B00FRIQEDW'), ('4006381333931', None)])
+"""
+import anydbm
+import threading
+
+from lxml import etree
+
+from parsers import Item, parse_item_records
+from parsers.lookup.base import AWSError
+from parsers.lookup.target import Field, ListField, Record
+
+
+class IdentifierParser(Item):
+    """
+    Parses only the identifiers out of the ItemAttributes.
+    """
+
+    response_groups = ('ItemAttributes',)
+
+    record_fields = (
+        Record('ItemAttributes', 'item_attributes', (
+            Field('EAN', 'ean'),
+            ListField('EANList/EANListElement', 'ean_list'),
+            Field('UPC', 'upc'),
+            ListField('UPCList//UPCListElement', 'upc_list'),
+        )),
+    )
+
+
+def normalize(code):
+    """
+    Remove the spaces and dashes of an identifier. ex. '0 12345-67890 5' -> '012345678905'
+    """
+    return ''.join(code.split()).replace('-', '')
+
+
+def _keys(id_type, code):
+    """
+    Keys of an identifier. A UPC is also an EAN with a leading 0, so both forms are indexed.
+    """
+    code = normalize(code)
+    keys = ['{}:{}'.format(id_type, code)]
+    if id_type == 'UPC' and len(code) == 12:
+        keys.append('EAN:0' + code)
+    elif id_type == 'EAN' and len(code) == 13 and code.startswith('0'):
+        keys.append('UPC:' + code[1:])
+    return keys
+
+
+def item_identifiers(item):
+    """
+    Identifiers of an item.
+    :param item: Parser item (which includes aws.parsers.ItemAttributes) or an item record.
+    :return: list of (id type, code)
+    """
+    if isinstance(item, dict):
+        attributes = item.get('item_attributes') or {}
+        get = attributes.get
+    else:
+        attributes = getattr(item, 'item_attributes', None)
+        get = lambda name: getattr(attributes, name, None)
+        if not attributes:
+            return []
+    identifiers = []
+    for id_type, single, many in (('UPC', 'upc', 'upc_list'), ('EAN', 'ean', 'ean_list')):
+        codes = set(get(many) or ())
+        if get(single):
+            codes.add(get(single))
+        identifiers.extend((id_type, code) for code in sorted(codes))
+    return identifiers
+
+
+class IdentifierIndex(object):
+
+    def __init__(self, path=None):
+        """
+
+        :param path: (optional) Path of the dbm file the index is kept in. The index is only kept in memory by default.
+        """
+        self.path = path
+        self._db = anydbm.open(path, 'c') if path is not None else {}
+        self._lock = threading.Lock()
+
+    def add(self, id_type, code, asin):
+        """
+        :param id_type: UPC or EAN
+        :param code:
+        :param asin:
+        :return:
+        """
+        with self._lock:
+            for key in _keys(id_type, code):
+                self._db[key] = asin
+
+    def get(self, id_type, code):
+        """
+        :return: ASIN of the identifier or None if it isn't known.
+        """
+        key = _keys(id_type, code)[0]
+        with self._lock:
+            # Not every dbm module supports get.
+            if key in self._db:
+                return self._db[key]
+        return None
+
+    def add_items(self, items):
+        """
+        Add the identifiers of items.
+        :param items: Iterable of parser items or item records.
+        :return: Number of identifiers added.
+        """
+        added = 0
+        for item in items:
+            asin = item['asin'] if isinstance(item, dict) else item.asin
+            for id_type, code in item_identifiers(item):
+                self.add(id_type, code, asin)
+                added += 1
+        return added
+
+    def observe(self, content):
+        """
+        Add the identifiers of every item of an ItemLookup response.
+        :param content: ItemLookup response content.
+        :return: Number of identifiers added.
+        """
+        try:
+            records = parse_item_records(content, IdentifierParser)
+        except (AWSError, etree.XMLSyntaxError):
+            return 0
+        return self.add_items(records)
+
+    def resolve(self, codes, id_type):
+        """
+        :param codes: Iterable of identifiers.
+        :param id_type: UPC or EAN
+        :return: (dict of code -> asin for the codes in the index, list of the codes which aren't)
+        """
+        resolved = {}
+        unresolved = []
+        for code in codes:
+            asin = self.get(id_type, code)
+            if asin is None:
+                unresolved.append(code)
+            else:
+                resolved[code] = asin
+        return resolved, unresolved
+
+    def sync(self):
+        with self._lock:
+            if hasattr(self._db, 'sync'):
+                self._db.sync()
+
+    def close(self):
+        with self._lock:
+            if hasattr(self._db, 'close'):
+                self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._db)
@@ -0,0 +1,233 @@
+"""
+Used to mirror the images of items returned with the Images response group.
+
+Images are downloaded concurrently over a pooled session and written to content addressed files
+(`<directory>/ab/cd/abcd....jpg` named by the sha1 of the image), so an image shared by several items
+(or several sizes) is only stored once. Every downloaded url is recorded in a manifest next to the
+images and urls which are already in the manifest aren't downloaded again.
+
+example:
+    >>> from aws.images import ImageFetcher
+    >>> from aws.parsers import Images, Item, parse_item_records
+    >>>
+    >>> class MyParser(Item, Images):
+    >>>     pass
+    >>>
+    >>> fetcher = ImageFetcher('/var/lib/catalog/images', workers=8)
+    >>> paths = fetcher.fetch_items(parse_item_records(response_content, MyParser), sizes=('thumbnail_image',))
+    >>> paths['B00FRIQEDW']
+    {'primary.thumbnail_image': '/var/lib/catalog/images/4f/1a/4f1a....jpg'}
+"""
+import errno
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+import threading
+import urlparse
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Names of the images of an Images.ImageSet. The Images element itself only contains the small,
+# medium and large images.
+IMAGE_SIZES = ('swatch_image', 'small_image', 'thumbnail_image', 'tiny_image', 'medium_image', 'large_image')
+
+
+def _image_url(image):
+    if image is None:
+        return None
+    if isinstance(image, dict):
+        return image.get('url')
+    return image.url
+
+
+def image_urls(item, sizes=IMAGE_SIZES, image_sets=True):
+    """
+    Select the image urls of an item.
+    :param item: Parser item (which includes aws.parsers.Images) or an item record. (see aws.parsers.parse_item_records)
+    :param sizes: Names of the image sizes to select. ex. ('thumbnail_image', 'large_image')
+    :param image_sets: Also select the images of every image set. The names of those images are
+        prefixed with the category of the image set. ex. 'variant.large_image'
+    :return: Generator of (name, url)
+    """
+    if isinstance(item, dict):
+        get = item.get
+        sets = [(image_set.get('category'), image_set.get) for image_set in item.get('image_sets', ())]
+    else:
+        get = lambda name: getattr(item, name, None)
+        sets = []
+        if image_sets:
+            for element in item.xpath('./a:ImageSets/a:ImageSet'):
+                image_set = item.ImageSet(element)
+                sets.append((element.get('Category'), lambda name, image_set=image_set: getattr(image_set, name)))
+    for size in sizes:
+        url = _image_url(get(size))
+        if url:
+            yield size, url
+    if image_sets:
+        for category, get in sets:
+            for size in sizes:
+                url = _image_url(get(size))
+                if url:
+                    yield '{}.{}'.format(category, size), url
+
+
+class ImageFetcher(object):
+
+    manifest_name = 'manifest.tsv'
+
+    def __init__(self, directory, workers=8, session=None, chunk_size=64 * 1024, timeout=30):
+        """
+
+        :param directory: Directory the images are written to. Created if it doesn't exist.
+        :param workers: Number of images downloaded at once. Also the size of the connection pool.
+        :param session: (optional) requests.Session used to download the images.
+        :param chunk_size: Images are streamed to disk in chunks of this many bytes,
+            so at most workers * chunk_size bytes of image data are held in memory.
+        :param timeout: Seconds to wait for the image server.
+        """
+        self.directory = directory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.manifest_path = os.path.join(directory, self.manifest_name)
+        self.manifest = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path) as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                # Skip the last line if it was only partially written.
+                if len(parts) == 2 and parts[1]:
+                    self.manifest[parts[0]] = parts[1]
+
+    def path_for(self, digest):
+        """
+        :param digest: Name of the image file. (sha1 hexdigest and extension)
+        :return: Path of the image file.
+        """
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest)
+
+    def cached_path(self, url):
+        """
+        :param url:
+        :return: Path of the image if it was already downloaded, otherwise None.
+        """
+        digest = self.manifest.get(url)
+        if digest is None:
+            return None
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def download(self, url):
+        """
+        Download an image into its content addressed file.
+        :param url:
+        :return: Path of the image or None if the download failed.
+        """
+        extension = posixpath.splitext(urlparse.urlsplit(url).path)[1].lower()
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+            sha1 = hashlib.sha1()
+            with os.fdopen(fd, 'wb') as f:
+                response = self.session.get(url, stream=True, timeout=self.timeout)
+                try:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(self.chunk_size):
+                        sha1.update(chunk)
+                        f.write(chunk)
+                finally:
+                    response.close()
+            digest = sha1.hexdigest() + extension
+            path = self.path_for(digest)
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            if not os.path.exists(path):
+                os.rename(tmp_path, path)
+            with self._lock:
+                self.manifest[url] = digest
+                with open(self.manifest_path, 'a') as f:
+                    f.write('{}\t{}\n'.format(url, digest))
+        except (requests.RequestException, EnvironmentError) as e:
+            # EnvironmentError covers both IOError and OSError. (ex. from os.rename)
+            self.logger.warning('failed to download %s: %r', url, e)
+            return None
+        finally:
+            # Left over when the download failed or the image was already stored.
+            if tmp_path is not None and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        return path
+
+    def fetch(self, urls):
+        """
+        Download every image which isn't on disk yet. Duplicate urls are only downloaded once.
+        :param urls: Iterable of image urls.
+        :return: dict of url -> path. Urls which failed to download are left out.
+        """
+        paths = {}
+        missing = []
+        for url in urls:
+            if url in paths:
+                continue
+            path = self.cached_path(url)
+            if path is None:
+                missing.append(url)
+                paths[url] = None
+            else:
+                paths[url] = path
+        if missing:
+            pool = ThreadPool(min(self.workers, len(missing)))
+            try:
+                for url, path in zip(missing, pool.imap(self.download, missing)):
+                    paths[url] = path
+            finally:
+                pool.close()
+                pool.join()
+        return dict((url, path) for url, path in paths.items() if path is not None)
+
+    def fetch_items(self, items, sizes=IMAGE_SIZES, image_sets=True):
+        """
+        Download the images of items.
+        :param items: Iterable of parser items or item records.
+        :param sizes: see image_urls
+        :param image_sets: see image_urls
+        :return: OrderedDict of asin -> dict of image name -> path.
+        """
+        selected = OrderedDict()
+        for item in items:
+            asin = item['asin'] if isinstance(item, dict) else item.asin
+            selected.setdefault(asin, []).extend(image_urls(item, sizes, image_sets))
+        paths = self.fetch(url for names in selected.values() for _, url in names)
+        result = OrderedDict()
+        for asin, names in selected.items():
+            result[asin] = dict((name, paths[url]) for name, url in names if url in paths)
+        return result
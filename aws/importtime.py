@@ -0,0 +1,50 @@
+"""
+Used to measure how long importing the package takes in a fresh interpreter.
+
+Short lived workers pay for the import on every run, so `import aws` must stay within the budget.
+
+    python -m aws.importtime
+    python -m aws.importtime --statement "from aws import Lookup" --budget 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Maximum number of milliseconds `import aws` may take.
+IMPORT_TIME_BUDGET_MS = 10.0
+
+_TIMER = 'import time; t = time.time(); {}; print((time.time() - t) * 1000)'
+
+
+def measure(statement='import aws', runs=5):
+    """
+    Run the statement in a new interpreter several times.
+    :param statement: Import statement to time.
+    :param runs: Number of interpreters to start.
+    :return: Median number of milliseconds the statement took.
+    """
+    env = dict(os.environ)
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(x for x in (package_parent, env.get('PYTHONPATH')) if x)
+    timings = sorted(float(subprocess.check_output([sys.executable, '-c', _TIMER.format(statement)], env=env))
+                     for _ in range(runs))
+    return timings[len(timings) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the time it takes to import the package.')
+    parser.add_argument('--statement', default='import aws', help='Import statement to time.')
+    parser.add_argument('--budget', type=float, default=IMPORT_TIME_BUDGET_MS, help='Budget in milliseconds.')
+    parser.add_argument('--runs', type=int, default=5, help='Number of interpreters to start.')
+    args = parser.parse_args(argv)
+    elapsed = measure(args.statement, args.runs)
+    print('{}: {:.2f}ms (budget {:.2f}ms)'.format(args.statement, elapsed, args.budget))
+    if elapsed > args.budget:
+        print('over budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,553 @@
+"""
+Local stand-in for the Product Advertising API, used to load test the client without sending requests to Amazon.
+
+The server accepts signed ItemLookup requests on `/onca/xml`, checks the signature the same way Amazon does
+(see aws.sign) and returns synthetic items for the requested response groups. Items are generated from
+their item id so the same item always has the same data. Latency, throttling and invalid item ids can be
+simulated, as can non-XML error pages returned by proxies.
+
+    python -m aws.mockserver --port 8080 --latency 0.05 --throttle-rate 0.1
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.mockserver import MockServer
+    >>>
+    >>> with MockServer(latency=0.05, throttle_rate=0.1) as server:
+    >>>     lookup = Lookup('associate-tag', server.access_key, server.secret_key, marketplace=server.marketplace)
+    >>>     lookup.item_lookup(['B00FRIQEDW'], ['Large'])
+    >>>     print server.stats()
+"""
+import argparse
+import hashlib
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from xml.sax.saxutils import escape
+
+from aws_ import ITEM_LOOKUP_MAX_IDS, sign
+from parsers.lookup.base import THROTTLED_ERROR_CODE
+
+DEFAULT_ACCESS_KEY = 'MOCKACCESSKEY'
+DEFAULT_SECRET_KEY = 'mock-secret-key'
+
+RESPONSE_NAMESPACE = 'http://webservices.amazon.com/AWSECommerceService/2011-08-01'
+ERROR_NAMESPACE = 'http://ecs.amazonaws.com/doc/2005-10-05/'
+
+# Returned in place of a response by a proxy in front of the API which failed. (see bad_gateway_rate)
+BAD_GATEWAY_PAGE = ('<html>\r\n<head><title>502 Bad Gateway</title></head>\r\n<body>\r\n'
+                    '<center><h1>502 Bad Gateway</h1></center>\r\n<hr><center>nginx</center>\r\n</body>\r\n</html>\r\n')
+
+REQUIRED_PARAMETERS = ('AWSAccessKeyId', 'AssociateTag', 'Operation', 'Service', 'Timestamp', 'Signature')
+
+# Response groups which are included in another response group, as listed in the API docs. ex. Large includes Offers
+# Small isn't a parent of ItemAttributes, it only returns a few of the item attributes.
+# (http://docs.aws.amazon.com/AWSECommerceService/latest/DG/CHAP_ResponseGroupsList.html)
+_INCLUDED_GROUPS = {
+    'Medium': ('Small', 'ItemAttributes', 'SalesRank', 'Images', 'OfferSummary'),
+    'Large': ('Medium', 'Offers', 'BrowseNodes'),
+    'Offers': ('OfferSummary',),
+    'OfferFull': ('Offers', 'OfferSummary'),
+}
+
+
+def expand_response_groups(response_groups):
+    """
+    :param response_groups: Requested response groups.
+    :return: set of the requested response groups along with every response group they include.
+    """
+    groups = set()
+    pending = list(response_groups)
+    while pending:
+        group = pending.pop()
+        if group not in groups:
+            groups.add(group)
+            pending.extend(_INCLUDED_GROUPS.get(group, ()))
+    return groups
+
+
+def _el(name, value):
+    return '<{0}>{1}</{0}>'.format(name, escape(str(value)))
+
+
+def _price(name, amount, currency_code='USD'):
+    return '<{0}><Amount>{1}</Amount><CurrencyCode>{2}</CurrencyCode><FormattedPrice>${3:.2f}</FormattedPrice></{0}>'.format(
+        name, amount, currency_code, amount / 100.0)
+
+
+def _image(name, url, size):
+    return ('<{0}><URL>{1}</URL><Height Units="pixels">{2}</Height><Width Units="pixels">{2}</Width></{0}>'
+            .format(name, escape(url), size))
+
+
+class SyntheticItem(object):
+    """
+    Deterministic fake item generated from its item id.
+    """
+
+    image_sizes = (
+        ('SwatchImage', '_SL30_', 30),
+        ('SmallImage', '_SL75_', 75),
+        ('ThumbnailImage', '_SL75_', 75),
+        ('TinyImage', '_SL110_', 110),
+        ('MediumImage', '_SL160_', 160),
+        ('LargeImage', '', 500),
+    )
+
+    def __init__(self, item_id, id_type='ASIN', offers_per_page=10):
+        self.item_id = item_id
+        digest = hashlib.md5('{}:{}'.format(id_type, item_id)).hexdigest().upper()
+        self.asin = item_id if id_type == 'ASIN' else 'B0' + digest[:8]
+        # Items whose asins only differ by the last character share a parent.
+        self.parent_asin = 'P' + self.asin[1:-1] + '0'
+        self.rnd = random.Random(digest)
+        self.sales_rank = self.rnd.randint(1, 2000000)
+        self.list_price = self.rnd.randint(500, 50000)
+        self.total_new = self.rnd.randint(0, 30)
+        self.total_used = self.rnd.randint(0, 10)
+        self.offers_per_page = offers_per_page
+        # Items looked up by UPC or EAN are returned with that identifier.
+        self.upc = item_id if id_type == 'UPC' else str(int(digest[:10], 16))[:12].zfill(12)
+        self.ean = item_id if id_type == 'EAN' else '0' + self.upc
+
+    def small(self):
+        return ''.join((
+            _el('DetailPageURL', 'https://www.amazon.com/dp/{}'.format(self.asin)),
+            '<ItemLinks><ItemLink>', _el('Description', 'Technical Details'),
+            _el('URL', 'https://www.amazon.com/tech-data/dp/{}'.format(self.asin)), '</ItemLink></ItemLinks>',
+        ))
+
+    def item_attributes(self, full):
+        parts = [
+            _el('Manufacturer', 'Manufacturer {}'.format(self.asin[-2:])),
+            _el('ProductGroup', 'Toy'),
+            _el('Title', 'Item {}'.format(self.asin)),
+        ]
+        if full:
+            parts += [
+                _el('Binding', 'Toy'),
+                _el('Brand', 'Brand {}'.format(self.asin[-2:])),
+                _el('EAN', self.ean),
+                '<EANList>', _el('EANListElement', self.ean), '</EANList>',
+                _el('Feature', 'Synthetic item'),
+                '<ItemDimensions><Height Units="hundredths-inches">100</Height>'
+                '<Length Units="hundredths-inches">200</Length><Weight Units="pounds">50</Weight>'
+                '<Width Units="hundredths-inches">300</Width></ItemDimensions>',
+                _price('ListPrice', self.list_price),
+                _el('Model', self.asin),
+                _el('PackageQuantity', 1),
+                _el('UPC', self.upc),
+                '<UPCList>', _el('UPCListElement', self.upc), '</UPCList>',
+            ]
+        return '<ItemAttributes>{}</ItemAttributes>'.format(''.join(parts))
+
+    def images(self):
+        url = 'https://images-na.ssl-images-amazon.com/images/I/{}.{}jpg'
+        parts = [_image(name, url.format(self.asin, suffix + '.' if suffix else ''), size)
+                 for name, suffix, size in self.image_sizes if name in ('SmallImage', 'MediumImage', 'LargeImage')]
+        parts.append('<ImageSets><ImageSet Category="primary">')
+        parts.extend(_image(name, url.format(self.asin, suffix + '.' if suffix else ''), size)
+                     for name, suffix, size in self.image_sizes)
+        parts.append('</ImageSet></ImageSets>')
+        return ''.join(parts)
+
+    def offer_summary(self):
+        return '<OfferSummary>{}{}{}{}{}{}</OfferSummary>'.format(
+            _price('LowestNewPrice', self.list_price * 9 // 10) if self.total_new else '',
+            _price('LowestUsedPrice', self.list_price * 6 // 10) if self.total_used else '',
+            _el('TotalNew', self.total_new), _el('TotalUsed', self.total_used),
+            _el('TotalCollectible', 0), _el('TotalRefurbished', 0))
+
+    def offers(self, condition, page):
+        new = 0 if condition == 'Used' else self.total_new
+        used = self.total_used if condition in ('All', 'Used') else 0
+        total = new + used
+        total_pages = (total + self.offers_per_page - 1) // self.offers_per_page
+        parts = [_el('TotalOffers', total), _el('TotalOfferPages', total_pages),
+                 _el('MoreOffersUrl', 'https://www.amazon.com/gp/offer-listing/{}'.format(self.asin))]
+        for i in range((page - 1) * self.offers_per_page, min(page * self.offers_per_page, total)):
+            is_used = i >= new
+            price = self.list_price * (6 if is_used else 9) // 10 + i * 10
+            parts.append(''.join((
+                '<Offer><Merchant>', _el('Name', 'Merchant {}'.format(i % 7)), '</Merchant>',
+                '<OfferAttributes>', _el('Condition', 'Used' if is_used else 'New'), '</OfferAttributes>',
+                '<OfferListing>', _el('OfferListingId', '{}-{}'.format(self.asin, i)),
+                _price('Price', price),
+                _el('IsEligibleForSuperSaverShipping', int(i % 2 == 0)),
+                _el('IsEligibleForPrime', int(i % 3 == 0)),
+                '</OfferListing></Offer>',
+            )))
+        return '<Offers>{}</Offers>'.format(''.join(parts))
+
+    def browse_nodes(self):
+        return ('<BrowseNodes><BrowseNode><BrowseNodeId>{}</BrowseNodeId><Name>Category {}</Name><Ancestors>'
+                '<BrowseNode><BrowseNodeId>165793011</BrowseNodeId><Name>Toys &amp; Games</Name></BrowseNode>'
+                '</Ancestors></BrowseNode></BrowseNodes>').format(1000 + self.sales_rank % 97, self.sales_rank % 97)
+
+    def to_xml(self, groups, condition='New', page=1):
+        """
+        :param groups: Expanded response groups. (see expand_response_groups)
+        :param condition: Condition of the offers.
+        :param page: Offer page.
+        :return: The Item element.
+        """
+        parts = [_el('ASIN', self.asin), _el('ParentASIN', self.parent_asin)]
+        if 'Small' in groups:
+            parts.append(self.small())
+        if 'SalesRank' in groups:
+            parts.append(_el('SalesRank', self.sales_rank))
+        if 'Images' in groups:
+            parts.append(self.images())
+        if 'Small' in groups or 'ItemAttributes' in groups:
+            parts.append(self.item_attributes('ItemAttributes' in groups))
+        if 'OfferSummary' in groups:
+            parts.append(self.offer_summary())
+        if 'Offers' in groups:
+            parts.append(self.offers(condition, page))
+        if 'BrowseNodes' in groups:
+            parts.append(self.browse_nodes())
+        return '<Item>{}</Item>'.format(''.join(parts))
+
+
+def error_response(operation, code, message):
+    """
+    :return: Response content of a request which failed entirely. (ex. RequestThrottled)
+    """
+    return ('<?xml version="1.0"?>\n<{0}ErrorResponse xmlns="{1}"><Error>{2}{3}</Error>'
+            '<RequestID>{4}</RequestID></{0}ErrorResponse>').format(
+        operation, ERROR_NAMESPACE, _el('Code', code), _el('Message', message), hashlib.md5(message).hexdigest())
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = {}
+        self.closing = False
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address))
+        thread.daemon = True
+        self.connections[request] = thread
+        thread.start()
+
+    def shutdown_request(self, request):
+        self.connections.pop(request, None)
+        HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        if self.closing:
+            # Connections which were closed by close_connections.
+            return
+        HTTPServer.handle_error(self, request, client_address)
+
+    def close_connections(self, timeout=1.0):
+        # Clients keep their connections open, so wake up the threads waiting on them.
+        self.closing = True
+        for request, thread in self.connections.items():
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join(timeout)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, content = self.server.mock.handle(self.command, self.headers.get('Host', ''), self.path)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml;charset=UTF-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        self.server.mock.logger.debug(format, *args)
+
+
+class MockServer(object):
+
+    def __init__(self, host='127.0.0.1', port=0, credentials=None, latency=0.0, jitter=0.0, throttle_rate=0.0,
+                 max_rate=None, invalid_rate=0.0, invalid_ids=(), offers_per_page=10, seed=None, bad_gateway_rate=0.0,
+                 throttled_keys=()):
+        """
+
+        :param host: Interface to listen on.
+        :param port: Port to listen on. Defaults to any free port. (see marketplace)
+        :param credentials: (optional) dict of access key -> secret key which are accepted.
+            Defaults to DEFAULT_ACCESS_KEY / DEFAULT_SECRET_KEY.
+        :param latency: Seconds every response is delayed by.
+        :param jitter: Up to this many extra seconds are randomly added to the latency.
+        :param throttle_rate: Fraction of the requests which are randomly throttled. (503 RequestThrottled)
+        :param max_rate: (optional) Requests per second above which every request is throttled.
+        :param invalid_rate: Fraction of the item ids which are randomly returned as invalid.
+        :param invalid_ids: Item ids which are always returned as invalid.
+        :param offers_per_page: Number of offers returned on each offer page.
+        :param seed: (optional) Seed of the random throttling and invalid item ids.
+        :param bad_gateway_rate: Fraction of the requests which are answered with the HTML page of a proxy. (502)
+        :param throttled_keys: Access keys whose requests are always throttled. (ex. an account over its quota)
+        """
+        self.credentials = credentials or {DEFAULT_ACCESS_KEY: DEFAULT_SECRET_KEY}
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.max_rate = max_rate
+        self.invalid_rate = invalid_rate
+        self.bad_gateway_rate = bad_gateway_rate
+        self.throttled_keys = set(throttled_keys)
+        self.invalid_ids = set(invalid_ids)
+        self.offers_per_page = offers_per_page
+        self.random = random.Random(seed)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._window = (0, 0)
+        self._stats = dict(requests=0, throttled=0, rejected=0, items=0, invalid=0, bad_gateway=0)
+        self._bind_address = (host, port)
+        # The socket is only bound once the server is started or its address is needed,
+        # so item_lookup can be used without listening.
+        self._server = None
+        self._thread = None
+
+    def _bind(self):
+        if self._server is None:
+            self._server = _Server(self._bind_address, _Handler)
+            self._server.mock = self
+        return self._server
+
+    @property
+    def address(self):
+        return self._bind().server_address
+
+    @property
+    def marketplace(self):
+        """
+        Host to pass as the marketplace of the client. ex. `Lookup(..., marketplace=server.marketplace)`
+        """
+        return '{}:{}'.format(*self.address)
+
+    @property
+    def access_key(self):
+        return sorted(self.credentials)[0]
+
+    @property
+    def secret_key(self):
+        return self.credentials[self.access_key]
+
+    def stats(self):
+        """
+        :return: dict of the number of requests, throttled requests, rejected requests, items, invalid item ids
+            and bad gateway responses.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _throttle(self):
+        with self._lock:
+            if self.max_rate is not None:
+                second = int(time.time())
+                start, count = self._window
+                count = count + 1 if start == second else 1
+                self._window = (second, count)
+                if count > self.max_rate:
+                    return True
+            return self.random.random() < self.throttle_rate
+
+    def _bad_gateway(self):
+        with self._lock:
+            return self.random.random() < self.bad_gateway_rate
+
+    def _invalid(self, item_id, id_type):
+        if item_id in self.invalid_ids:
+            return True
+        if id_type == 'ASIN' and (len(item_id) != 10 or not item_id.isalnum()):
+            return True
+        with self._lock:
+            return self.random.random() < self.invalid_rate
+
+    def check_signature(self, host, query):
+        """
+        :param host: Host the request was sent to.
+        :param query: Raw query string of the request.
+        :return: Error code or None if the signature is valid.
+        """
+        params = []
+        signature = None
+        for param in query.split('&'):
+            if param.startswith('Signature='):
+                signature = param[len('Signature='):]
+            else:
+                params.append(param)
+        access_key = urlparse.parse_qs(query).get('AWSAccessKeyId', [None])[0]
+        secret_key = self.credentials.get(access_key)
+        if secret_key is None:
+            return 'InvalidClientTokenId'
+        if signature != sign(secret_key, host, '&'.join(params)):
+            return 'SignatureDoesNotMatch'
+
+    def handle(self, method, host, path):
+        """
+        Handle a request.
+        :param method:
+        :param host: Host header of the request.
+        :param path: Path and query of the request.
+        :return: (status code, response content)
+        """
+        self._count('requests')
+        url = urlparse.urlsplit(path)
+        params = dict((k, v[0]) for k, v in urlparse.parse_qs(url.query).items())
+        operation = params.get('Operation', 'ItemLookup')
+        if url.path != '/onca/xml':
+            self._count('rejected')
+            return 404, error_response(operation, 'NotFound', 'Not found: {}'.format(url.path))
+        missing = [name for name in REQUIRED_PARAMETERS if name not in params]
+        if missing:
+            self._count('rejected')
+            return 400, error_response(operation, 'MissingParameter',
+                                       'The request must contain the parameter {}.'.format(missing[0]))
+        error = self.check_signature(host, url.query)
+        if error is not None:
+            self._count('rejected')
+            return 403, error_response(operation, error, 'The request signature does not match.')
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if params['AWSAccessKeyId'] in self.throttled_keys or self._throttle():
+            self._count('throttled')
+            return 503, error_response(operation, THROTTLED_ERROR_CODE,
+                                       'AWS Access Key ID: {}. You are submitting requests too quickly. '
+                                       'Please retry your requests at a slower rate.'.format(params['AWSAccessKeyId']))
+        if self._bad_gateway():
+            self._count('bad_gateway')
+            return 502, BAD_GATEWAY_PAGE
+        if operation != 'ItemLookup':
+            self._count('rejected')
+            return 400, error_response(operation, 'AWS.InvalidOperationParameter',
+                                       'The Operation parameter is invalid. Please modify the Operation parameter and retry.')
+        return 200, self.item_lookup(params)
+
+    def item_lookup(self, params):
+        """
+        :param params: dict of the request parameters.
+        :return: ItemLookup response content.
+        """
+        item_ids = [x for x in params.get('ItemId', '').split(',') if x]
+        id_type = params.get('IdType', 'ASIN')
+        response_groups = [x for x in params.get('ResponseGroup', 'Small').split(',') if x]
+        condition = params.get('Condition', 'New')
+        page = int(params.get('OfferPage', 1))
+        groups = expand_response_groups(response_groups)
+
+        request = ['<IdType>{}</IdType>'.format(escape(id_type))]
+        request += [_el('ItemId', item_id) for item_id in item_ids]
+        request += [_el('ResponseGroup', group) for group in response_groups]
+        errors = []
+        items = []
+        if len(item_ids) > ITEM_LOOKUP_MAX_IDS:
+            errors.append(('AWS.RestrictedParameterValueCombination',
+                           'ItemId may only contain up to {} values.'.format(ITEM_LOOKUP_MAX_IDS)))
+        else:
+            for item_id in item_ids:
+                if self._invalid(item_id, id_type):
+                    errors.append(('AWS.InvalidParameterValue', '{} is not a valid value for ItemId. '
+                                   'Please change this value and retry your request.'.format(item_id)))
+                else:
+                    item = SyntheticItem(item_id, id_type, self.offers_per_page)
+                    items.append(item.to_xml(groups, condition, page))
+        self._count('items', len(items))
+        self._count('invalid', len(errors))
+
+        parts = ['<?xml version="1.0" ?>\n<ItemLookupResponse xmlns="{}">'.format(RESPONSE_NAMESPACE),
+                 '<OperationRequest><RequestProcessingTime>0.01</RequestProcessingTime></OperationRequest>',
+                 '<Items><Request>', _el('IsValid', 'True' if items or not errors else 'False'),
+                 '<ItemLookupRequest>', ''.join(request), '</ItemLookupRequest>']
+        if errors:
+            parts.append('<Errors>')
+            parts.extend('<Error>{}{}</Error>'.format(_el('Code', code), _el('Message', message))
+                         for code, message in errors)
+            parts.append('</Errors>')
+        parts.append('</Request>')
+        parts.extend(items)
+        parts.append('</Items></ItemLookupResponse>')
+        return ''.join(parts)
+
+    def start(self):
+        """
+        Serve requests on a background thread.
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._bind().serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is None:
+            return
+        # shutdown waits for the serving thread, so it would block forever if requests aren't being served.
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._server.close_connections()
+        self._server = None
+
+    def serve_forever(self):
+        """
+        Serve requests on the current thread until stop is called.
+        """
+        self._bind().serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a local stand-in of the Product Advertising API.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on.')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+    parser.add_argument('--access-key', default=DEFAULT_ACCESS_KEY, help='Access key which is accepted.')
+    parser.add_argument('--secret-key', default=DEFAULT_SECRET_KEY, help='Secret key the requests must be signed with.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every response is delayed by.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many seconds are added to the latency.')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests which are throttled.')
+    parser.add_argument('--max-rate', type=float, help='Requests per second above which requests are throttled.')
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help='Fraction of item ids which are invalid.')
+    parser.add_argument('--bad-gateway-rate', type=float, default=0.0,
+                        help='Fraction of requests which are answered with a 502 HTML page.')
+    args = parser.parse_args(argv)
+    server = MockServer(args.host, args.port, {args.access_key: args.secret_key}, latency=args.latency,
+                        jitter=args.jitter, throttle_rate=args.throttle_rate, max_rate=args.max_rate,
+                        invalid_rate=args.invalid_rate, bad_gateway_rate=args.bad_gateway_rate)
+    sys.stderr.write('serving on {} (marketplace={})\n'.format(args.port, server.marketplace))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        sys.stderr.write('{}\n'.format(server.stats()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Persistent cache of item ids which were rejected as invalid, so they stop taking up slots in batches.
+
+Item ids which are named in an error of an ItemLookup response (ex. AWS.InvalidParameterValue) are cached
+with an expiry. Pass the cache to `Lookup(negative_cache=...)` to observe every ItemLookup response by ASIN and
+drop the cached item ids from every request. `Lookup.batch_item_ids` drops them before batching, so batches
+stay full. A small fraction of the cached item ids is still sent to find items which became valid again,
+item ids which are found are removed from the cache.
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.negative import NegativeCache
+    >>>
+    >>> cache = NegativeCache('/var/lib/catalog/invalid.db', ttl=30 * 86400)
+    >>> lookup = Lookup(associate_tag, access_key, secret_key, negative_cache=cache)
+    >>> for batch in lookup.batch_item_ids(asins):
+    >>>     lookup.item_lookup(batch, parser=MyParser)
+    >>> cache.skipped
+    120345
+"""
+import anydbm
+import random
+import threading
+import time
+
+from lxml import etree
+
+from parsers import Item, parse_item_records
+from parsers.lookup.base import ITEM_ID_RE, THROTTLED_ERROR_CODE, AWSError
+
+
+class NegativeCache(object):
+
+    def __init__(self, path=None, ttl=30 * 86400, reprobe_rate=0.01, seed=None):
+        """
+
+        :param path: (optional) Path of the dbm file the cache is kept in. The cache is only kept in memory by default.
+        :param ttl: Seconds an item id stays in the cache after it was last rejected.
+        :param reprobe_rate: Fraction of the cached item ids which are still sent by filter.
+        :param seed: (optional) Seed of the random reprobes.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.reprobe_rate = reprobe_rate
+        self.random = random.Random(seed)
+        self.skipped = 0
+        self.reprobed = 0
+        # Cached item ids picked to be sent again, they're let through by filter until a response is observed.
+        self._probes = set()
+        self._db = anydbm.open(path, 'c') if path is not None else {}
+        self._lock = threading.Lock()
+
+    def add(self, item_id, ttl=None):
+        """
+        Cache an item id which was rejected.
+        :param item_id:
+        :param ttl: (optional) Seconds until it expires. Defaults to the ttl of the cache.
+        :return:
+        """
+        expires = int(time.time() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._db[item_id] = str(expires)
+
+    def remove(self, item_id):
+        with self._lock:
+            if item_id in self._db:
+                del self._db[item_id]
+
+    def expires(self, item_id):
+        """
+        :return: Timestamp the item id expires at or None if it isn't cached.
+        """
+        with self._lock:
+            # Not every dbm module supports get.
+            if item_id in self._db:
+                return int(self._db[item_id])
+        return None
+
+    def __contains__(self, item_id):
+        expires = self.expires(item_id)
+        return expires is not None and expires > time.time()
+
+    def filter(self, item_ids):
+        """
+        Drop the cached item ids, except for a random fraction of them (see reprobe_rate).
+        Expired item ids are removed from the cache and kept. An item id which was picked to be sent again
+        is kept until a response for it is observed, so filtering a batch twice doesn't drop it.
+        :param item_ids: Iterable of item ids.
+        :return: Generator of the item ids which should be requested.
+        """
+        now = time.time()
+        for item_id in item_ids:
+            expires = self.expires(item_id)
+            if expires is not None:
+                if expires <= now:
+                    self.remove(item_id)
+                elif item_id in self._probes:
+                    pass
+                elif self.random.random() < self.reprobe_rate:
+                    self.reprobed += 1
+                    with self._lock:
+                        self._probes.add(item_id)
+                else:
+                    self.skipped += 1
+                    continue
+            yield item_id
+
+    def observe(self, content, item_ids):
+        """
+        Cache the item ids which were rejected by an ItemLookup response and remove the ones which were found.
+        :param content: ItemLookup response content.
+        :param item_ids: Item ids which were requested.
+        :return: list of the item ids which were rejected.
+        """
+        try:
+            records = parse_item_records(content, Item)
+        except (AWSError, etree.XMLSyntaxError):
+            return []
+        return self.observe_records(records, item_ids)
+
+    def observe_records(self, records, item_ids):
+        """
+        Cache the item ids which were rejected and remove the ones which were found.
+        :param records: ItemRecords of an ItemLookup response. (see aws.parsers.parse_item_records)
+        :param item_ids: Item ids which were requested.
+        :return: list of the item ids which were rejected.
+        """
+        requested = set(item_ids)
+        with self._lock:
+            self._probes.difference_update(requested)
+        rejected = []
+        for err in records.errors:
+            if err.get('code') == THROTTLED_ERROR_CODE:
+                continue
+            for word in ITEM_ID_RE.findall(err.get('message') or ''):
+                if word in requested:
+                    self.add(word)
+                    rejected.append(word)
+        for record in records:
+            if record['asin'] in requested:
+                self.remove(record['asin'])
+        return rejected
+
+    def purge(self):
+        """
+        Remove the expired item ids.
+        :return: Number of item ids removed.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [item_id for item_id in self._db.keys() if int(self._db[item_id]) <= now]
+            for item_id in expired:
+                del self._db[item_id]
+        return len(expired)
+
+    def sync(self):
+        with self._lock:
+            if hasattr(self._db, 'sync'):
+                self._db.sync()
+
+    def close(self):
+        with self._lock:
+            if hasattr(self._db, 'close'):
+                self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._db)
+
+    def __repr__(self):
+        return '<{} size={} skipped={} reprobed={}>'.format(self.__class__.__name__, len(self), self.skipped,
+                                                            self.reprobed)
@@ -1 +1,2 @@
 from lookup import *
+from money import Money
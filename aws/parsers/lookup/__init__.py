@@ -1,2 +1,3 @@
-from base import ItemLookupResponse
+from base import ItemLookupResponse, FOUND, INVALID, MISSING, THROTTLED, error_outcomes, retry_item_ids
 from item_plugins import *
+from target import combined_parser, parse_item_records
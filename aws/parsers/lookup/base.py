@@ -1,9 +1,52 @@
 import functools
 import re
+from collections import OrderedDict
 
 from lxml import etree
 
 from ..base import BaseElementWrapper, first_element_or_none
+from ..money import Money
+
+# Matches every character which isn't part of a number in a FormattedPrice. ex. $1,234.56 -> 1234.56
+NON_NUMERIC_RE = re.compile('[^\d^\.]')
+# Matches each word of an error message which could be an item id.
+ITEM_ID_RE = re.compile('[A-Za-z0-9]+')
+
+# Error code returned when requests are being sent too quickly.
+THROTTLED_ERROR_CODE = 'RequestThrottled'
+
+# Outcome of each requested item id. see Items.item_outcomes
+FOUND = 'found'
+INVALID = 'invalid'
+MISSING = 'missing'
+THROTTLED = 'throttled'
+
+
+def to_int(i):
+    if i:
+        return int(i)
+    return
+
+
+def to_float(i):
+    if i:
+        x = NON_NUMERIC_RE.sub('', i).strip('.')
+        if not x:
+            return
+        return float(x)
+    return
+
+
+def to_bool(i):
+    if i:
+        return i == '1' or i.lower() == 'true'
+    return
+
+
+def to_text(i):
+    if i is None:
+        return
+    return i.encode('ascii', errors='ignore')
 
 
 def parse_int(f):
@@ -13,10 +56,7 @@ def parse_int(f):
     :return:
     """
     def inner(*args, **kwargs):
-        i = f(*args, **kwargs)
-        if i:
-            return int(i)
-        return
+        return to_int(f(*args, **kwargs))
     return inner
 
 
@@ -27,12 +67,24 @@ def parse_float(f):
     :return:
     """
     def inner(*args, **kwargs):
-        i = f(*args, **kwargs)
-        if i:
-            x = re.sub('[^\d^\.]', '', i).strip('.')
-            if not x:
-                return
-            return float(x)
+        return to_float(f(*args, **kwargs))
+    return inner
+
+
+def parse_money(f):
+    """
+    Function wrapper to convert the returned price element into Money.
+
+    The wrapped function should return the xpath result of a price element
+    which contains the Amount and CurrencyCode elements. (ex. `./a:ListPrice`)
+    :param f:
+    :return:
+    """
+    def inner(self, *args, **kwargs):
+        i = f(self, *args, **kwargs)
+        if i and isinstance(i[0], etree._Element):
+            return Money.parse(first_element_or_none(i[0].xpath('./a:Amount/text()', namespaces=self.namespaces)),
+                               first_element_or_none(i[0].xpath('./a:CurrencyCode/text()', namespaces=self.namespaces)))
         return
     return inner
 
@@ -44,10 +96,7 @@ def parse_bool(f):
     :return:
     """
     def inner(*args, **kwargs):
-        i = f(*args, **kwargs)
-        if i:
-            return i == '1' or i.lower() == 'true'
-        return
+        return to_bool(f(*args, **kwargs))
     return inner
 
 
@@ -55,7 +104,7 @@ def first_element(f):
     def inner(*args, **kwargs):
         i = f(*args, **kwargs)
         if i:
-            return i[0].encode('ascii', errors='ignore')
+            return to_text(i[0])
         return
     return inner
 
@@ -172,6 +221,38 @@ class ItemLookupRequestErrorWrapper(BaseErrorWrapper):
             return ItemLookupRequestError(self)
 
 
+def full_error(element):
+    """
+    Get the error of a response which is entirely an error. (ex. RequestThrottled)
+    :param element: Root element of the response.
+    :return: FullErrorResponseWrapper which wraps the Error element or None.
+    """
+    error_element = first_element_or_none(element.xpath('./a:Error', namespaces=FullErrorResponseWrapper.namespaces))
+    if error_element is None:
+        return None
+    return FullErrorResponseWrapper(error_element)
+
+
+def error_outcomes(item_ids, err):
+    """
+    Outcome of every item id of a request which failed entirely.
+    :param item_ids: Item ids which were requested.
+    :param err: AWSError raised for the response.
+    :return: OrderedDict of item id -> THROTTLED if the request was throttled else MISSING.
+    """
+    outcome = THROTTLED if err.code == THROTTLED_ERROR_CODE else MISSING
+    return OrderedDict((item_id, outcome) for item_id in item_ids)
+
+
+def retry_item_ids(outcomes):
+    """
+    Item ids which should be requested again. (missing or throttled)
+    :param outcomes: OrderedDict returned by Items.item_outcomes or error_outcomes.
+    :return: list of item ids.
+    """
+    return [item_id for item_id, outcome in outcomes.items() if outcome in (MISSING, THROTTLED)]
+
+
 class ItemLookupResponse(BaseLookupWrapper):
 
     target_element_xpath = '//a:ItemLookupResponse'
@@ -188,10 +269,16 @@ class ItemLookupResponse(BaseLookupWrapper):
         # Check for any errors before continuing
         # else the OperationRequest.__init__ will throw an error.
         BaseErrorWrapper(element).raise_for_error()
+        error = full_error(element)
+        if error is not None:
+            error.raise_for_error()
         operation_request_element = self.xpath(OperationRequest.target_element_xpath)
         self.operation_request = OperationRequest(first_element_or_none(operation_request_element))
         self.items = Items(first_element_or_none(self.xpath(Items.target_element_xpath)), psr_cls)
 
+    def item_outcomes(self):
+        return self.items.item_outcomes()
+
 
 class Items(BaseLookupWrapper):
     """
@@ -254,6 +341,63 @@ class Items(BaseLookupWrapper):
     def item_list(self):
         return [self.psr_cls(x) for x in self.xpath('./a:Item')]
 
+    def select(self, where=None, **lookups):
+        """
+        Filter the items with Django style lookups over the record fields of the parser class.
+
+        The lookups are compiled into a single XPath predicate, so the items are filtered by libxml2
+        and only the matching items are wrapped by the parser class. see aws.parsers.lookup.query
+
+        example:
+            >>> items.select(where={'offer_summary__total_new__gt': 0, 'item_attributes__product_group': 'Toy'})
+            >>> items.select(offers__offer_listing__is_eligible_for_prime=True)
+
+        :param where: (optional) dict of lookup -> value.
+        :param lookups: Lookups can also be passed as keyword arguments. Every lookup must match.
+        :return: Generator of parser items.
+        """
+        # Imported here since the query module depends on the record fields which depend on this module.
+        from query import compile_lookups
+
+        if where:
+            lookups.update(where)
+        if self.element is None:
+            return iter(())
+        xpath, variables = compile_lookups(self.psr_cls, lookups)
+        return (self.psr_cls(x) for x in xpath(self.element, **variables))
+
+    def item_outcomes(self):
+        """
+        Outcome of each requested item id.
+
+        Item ids which are named in an error message are INVALID (or THROTTLED for throttle errors),
+        ASINs which were returned are FOUND and any other item id is MISSING.
+        When the IdType isn't ASIN, item ids without an error are FOUND since the returned
+        items can't be matched back to the requested item ids.
+
+        example re-queuing only the item ids which failed:
+            >>> retry_item_ids(item_lookup_response.items.item_outcomes())
+            ['B00BXTKL1A']
+
+        :return: OrderedDict of item id -> FOUND, INVALID, MISSING or THROTTLED in the order they were requested.
+        """
+        item_ids = self.request.item_ids
+        outcomes = OrderedDict((str(item_id), MISSING) for item_id in item_ids)
+        for err in self.request.errors:
+            outcome = THROTTLED if err.code == THROTTLED_ERROR_CODE else INVALID
+            for word in ITEM_ID_RE.findall(err.message or ''):
+                if word in outcomes:
+                    outcomes[word] = outcome
+        if (self.request.id_type or 'ASIN') == 'ASIN':
+            for asin in self.xpath('./a:Item/a:ASIN/text()'):
+                if asin in outcomes:
+                    outcomes[asin] = FOUND
+        else:
+            for item_id, outcome in outcomes.items():
+                if outcome == MISSING:
+                    outcomes[item_id] = FOUND
+        return outcomes
+
 
 class OperationRequest(BaseLookupWrapper):
 
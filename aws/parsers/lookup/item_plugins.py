@@ -2,11 +2,16 @@
 This module is used for creating a ItemLookup response parser from amazon's AWS API.
 """
 
-from base import BaseLookupWrapper, first_element, parse_bool, parse_float, parse_int
+from base import BaseLookupWrapper, first_element, parse_bool, parse_float, parse_int, parse_money, to_bool, to_int
+from target import Field, ListField, MoneyField, Record, RecordList
 
 
 class Item(BaseLookupWrapper):
 
+    # Response groups which must be requested for the properties of this class to be returned.
+    # ASIN and ParentASIN are returned with every response group.
+    response_groups = ()
+
     @property
     @first_element
     def asin(self):
@@ -17,9 +22,17 @@ class Item(BaseLookupWrapper):
     def parent_asin(self):
         return self.xpath('./a:ParentASIN/text()')
 
+    # Fields parsed by the tree-less backend. see aws.parsers.lookup.target
+    record_fields = (
+        Field('ASIN', 'asin'),
+        Field('ParentASIN', 'parent_asin'),
+    )
+
 
 class Offers(BaseLookupWrapper):
 
+    response_groups = ('Offers',)
+
     class Offer(BaseLookupWrapper):
 
         class Listing(BaseLookupWrapper):
@@ -35,12 +48,22 @@ class Offers(BaseLookupWrapper):
             def price(self):
                 return self.xpath('./a:Price/a:FormattedPrice/text()')
 
+            @property
+            @parse_money
+            def price_money(self):
+                return self.xpath('./a:Price')
+
             @property
             @parse_float
             @first_element
             def amount_saved(self):
                 return self.xpath('./a:AmountSaved/a:FormattedPrice/text()')
 
+            @property
+            @parse_money
+            def amount_saved_money(self):
+                return self.xpath('./a:AmountSaved')
+
             @property
             @parse_int
             @first_element
@@ -64,6 +87,15 @@ class Offers(BaseLookupWrapper):
             def __repr__(self):
                 return '<OfferListing price={} is_eligible_for_prime={}>'.format(self.price, self.is_eligible_for_prime)
 
+            record_fields = (
+                Field('OfferListingId', 'offer_listing_id'),
+                MoneyField('Price', 'price'),
+                MoneyField('AmountSaved', 'amount_saved'),
+                Field('PercentageSaved', 'percentage_saved', to_int),
+                Field('IsEligibleForSuperSaverShipping', 'is_eligible_for_super_saver_shipping', to_bool),
+                Field('IsEligibleForPrime', 'is_eligible_for_prime', to_bool),
+            )
+
         @property
         @first_element
         def condition(self):
@@ -98,6 +130,12 @@ class Offers(BaseLookupWrapper):
         def __repr__(self):
             return '<Offer merchant_name={} condition={} price={} prime={}>'.format(self.merchant_name, self.condition, self.offer_listing.price, self.offer_listing.is_eligible_for_prime)
 
+        record_fields = (
+            Field('OfferAttributes/Condition', 'condition'),
+            Field('Merchant/Name', 'merchant_name'),
+            Record('OfferListing', 'offer_listing', Listing.record_fields),
+        )
+
     @property
     @parse_int
     @first_element
@@ -122,6 +160,13 @@ class Offers(BaseLookupWrapper):
     def __repr__(self):
         return '<Offers total_offers={} offers={}>'.format(self.total_offers, self.offers)
 
+    record_fields = (
+        Field('Offers/TotalOffers', 'total_offers', to_int),
+        Field('Offers/TotalOfferPages', 'total_offer_pages', to_int),
+        Field('Offers/MoreOffersUrl', 'more_offers_url'),
+        RecordList('Offers/Offer', 'offers', Offer.record_fields),
+    )
+
 
 class OfferSummary(BaseLookupWrapper):
     """
@@ -130,6 +175,8 @@ class OfferSummary(BaseLookupWrapper):
     http://docs.aws.amazon.com/AWSECommerceService/latest/DG/RG_OfferSummary.html
     """
 
+    response_groups = ('OfferSummary',)
+
     @property
     def offer_summary(self):
         r = self.xpath('./a:OfferSummary')
@@ -144,24 +191,44 @@ class OfferSummary(BaseLookupWrapper):
         def lowest_new_price(self):
             return self.xpath('./a:LowestNewPrice/a:FormattedPrice/text()')
 
+        @property
+        @parse_money
+        def lowest_new_price_money(self):
+            return self.xpath('./a:LowestNewPrice')
+
         @property
         @parse_float
         @first_element
         def lowest_used_price(self):
             return self.xpath('./a:LowestUsedPrice/a:FormattedPrice/text()')
 
+        @property
+        @parse_money
+        def lowest_used_price_money(self):
+            return self.xpath('./a:LowestUsedPrice')
+
         @property
         @parse_float
         @first_element
         def lowest_collectible_price(self):
             return self.xpath('./a:LowestCollectiblePrice/a:FormattedPrice/text()')
 
+        @property
+        @parse_money
+        def lowest_collectible_price_money(self):
+            return self.xpath('./a:LowestCollectiblePrice')
+
         @property
         @parse_float
         @first_element
         def lowest_refurbished_price(self):
             return self.xpath('./a:LowestRefurbishedPrice/a:FormattedPrice/text()')
 
+        @property
+        @parse_money
+        def lowest_refurbished_price_money(self):
+            return self.xpath('./a:LowestRefurbishedPrice')
+
         @property
         @parse_int
         @first_element
@@ -186,6 +253,21 @@ class OfferSummary(BaseLookupWrapper):
         def total_refurbished(self):
             return self.xpath('./a:TotalRefurbished/text()')
 
+        record_fields = (
+            MoneyField('LowestNewPrice', 'lowest_new_price'),
+            MoneyField('LowestUsedPrice', 'lowest_used_price'),
+            MoneyField('LowestCollectiblePrice', 'lowest_collectible_price'),
+            MoneyField('LowestRefurbishedPrice', 'lowest_refurbished_price'),
+            Field('TotalNew', 'total_new', to_int),
+            Field('TotalUsed', 'total_used', to_int),
+            Field('TotalCollectible', 'total_collectible', to_int),
+            Field('TotalRefurbished', 'total_refurbished', to_int),
+        )
+
+    record_fields = (
+        Record('OfferSummary', 'offer_summary', Summary.record_fields),
+    )
+
 
 class SalesRank(BaseLookupWrapper):
     """
@@ -194,15 +276,23 @@ class SalesRank(BaseLookupWrapper):
     http://docs.aws.amazon.com/AWSECommerceService/latest/DG/RG_SalesRank.html
     """
 
+    response_groups = ('SalesRank',)
+
     @property
     @parse_int
     @first_element
     def sales_rank(self):
         return self.xpath('./a:SalesRank/text()')
 
+    record_fields = (
+        Field('SalesRank', 'sales_rank', to_int),
+    )
+
 
 class ItemLinks(BaseLookupWrapper):
 
+    response_groups = ('Small',)
+
     @property
     @first_element
     def detail_page_url(self):
@@ -214,6 +304,11 @@ class ItemLinks(BaseLookupWrapper):
         item_links = [BaseLookupWrapper(x) for x in self.xpath('./a:ItemLinks//a:ItemLink')]
         return [(x.xpath('./a:Description/text()')[0].strip(), x.xpath('./a:URL/text()')[0].strip()) for x in item_links]
 
+    record_fields = (
+        Field('DetailPageURL', 'detail_page_url'),
+        RecordList('ItemLinks/ItemLink', 'item_links', (Field('Description', 'description'), Field('URL', 'url'))),
+    )
+
 
 class BaseImageWrapper(BaseLookupWrapper):
     """
@@ -254,6 +349,12 @@ class BaseImageWrapper(BaseLookupWrapper):
         def __repr__(self):
             return '<ImageElement url={} height={} width={}>'.format(self.url, self.height, self.width)
 
+        record_fields = (
+            Field('URL', 'url'),
+            Field('Height', 'height', to_int),
+            Field('Width', 'width', to_int),
+        )
+
 
 class Images(BaseImageWrapper):
     """
@@ -262,6 +363,8 @@ class Images(BaseImageWrapper):
     http://docs.aws.amazon.com/AWSECommerceService/latest/DG/RG_Images.html
     """
 
+    response_groups = ('Images',)
+
     class ImageSet(BaseImageWrapper):
         """
         Used to wrap an ImageSet element for parsing.
@@ -301,6 +404,16 @@ class Images(BaseImageWrapper):
                 large_image=self.large_image.url
             )
 
+        record_fields = (
+            Field('@Category', 'category'),
+            Record('SwatchImage', 'swatch_image', BaseImageWrapper.Img.record_fields),
+            Record('SmallImage', 'small_image', BaseImageWrapper.Img.record_fields),
+            Record('ThumbnailImage', 'thumbnail_image', BaseImageWrapper.Img.record_fields),
+            Record('TinyImage', 'tiny_image', BaseImageWrapper.Img.record_fields),
+            Record('MediumImage', 'medium_image', BaseImageWrapper.Img.record_fields),
+            Record('LargeImage', 'large_image', BaseImageWrapper.Img.record_fields),
+        )
+
     @property
     def small_image(self):
         return self.mk_img_from_xpath('./a:SmallImage')
@@ -327,6 +440,13 @@ class Images(BaseImageWrapper):
             return self.ImageSet(None)
         return self.ImageSet(image_set_element_list[0])
 
+    record_fields = (
+        Record('SmallImage', 'small_image', BaseImageWrapper.Img.record_fields),
+        Record('MediumImage', 'medium_image', BaseImageWrapper.Img.record_fields),
+        Record('LargeImage', 'large_image', BaseImageWrapper.Img.record_fields),
+        RecordList('ImageSets/ImageSet', 'image_sets', ImageSet.record_fields),
+    )
+
 
 class BaseDimensionsWrapper(BaseLookupWrapper):
     """
@@ -373,6 +493,13 @@ class BaseDimensionsWrapper(BaseLookupWrapper):
         def __repr__(self):
             return '<DimensionsElement length={} height={} width={}>'.format(self.length, self.height, self.width)
 
+        record_fields = (
+            Field('Height', 'height', to_int),
+            Field('Length', 'length', to_int),
+            Field('Width', 'width', to_int),
+            Field('Weight', 'weight', to_int),
+        )
+
 
 class ItemAttributes(BaseLookupWrapper):
     """
@@ -380,7 +507,9 @@ class ItemAttributes(BaseLookupWrapper):
 
     http://docs.aws.amazon.com/AWSECommerceService/latest/DG/RG_ItemAttributes.html
     """
-    
+
+    response_groups = ('ItemAttributes',)
+
     @property
     def item_attributes(self):
         r = self.xpath('./a:ItemAttributes')
@@ -489,6 +618,11 @@ class ItemAttributes(BaseLookupWrapper):
         def list_price(self):
             return self.xpath('./a:ListPrice/a:FormattedPrice/text()')
     
+        @property
+        @parse_money
+        def list_price_money(self):
+            return self.xpath('./a:ListPrice')
+    
         @property
         @first_element
         def manufacturer(self):
@@ -569,9 +703,54 @@ class ItemAttributes(BaseLookupWrapper):
         def upc_list(self):
             return [x.strip() for x in self.xpath('./a:UPCList//a:UPCListElement/text()') if x.strip()]
 
+        record_fields = (
+            Field('Actor', 'actor'),
+            Field('Artist', 'artist'),
+            Field('AspectRatio', 'aspect_ratio'),
+            Field('AudienceRating', 'audience_rating'),
+            Field('AudioFormat', 'audio_format'),
+            Field('Author', 'author'),
+            Field('Binding', 'binding'),
+            Field('Brand', 'brand'),
+            Field('Category', 'category'),
+            Field('CEROAgeRating', 'cero_age_rating'),
+            Field('ClothingSize', 'clothing_size'),
+            Field('Color', 'color'),
+            ListField('CatalogNumberList//CatalogNumberListElement', 'catalog_number_list'),
+            Field('EAN', 'ean'),
+            ListField('EANList/EANListElement', 'ean_list'),
+            ListField('Feature', 'features'),
+            Field('IsAdultProduct', 'is_adult_product', to_bool),
+            Record('ItemDimensions', 'item_dimensions', BaseDimensionsWrapper.Dimens.record_fields),
+            Field('Label', 'label'),
+            MoneyField('ListPrice', 'list_price'),
+            Field('Manufacturer', 'manufacturer'),
+            Field('Model', 'model'),
+            Field('MPN', 'mpn'),
+            Field('NumberOfItems', 'number_of_items', to_int),
+            Record('PackageDimensions', 'package_dimensions', BaseDimensionsWrapper.Dimens.record_fields),
+            Field('PackageQuantity', 'package_quantity', to_int),
+            Field('PartNumber', 'part_number'),
+            Field('ProductGroup', 'product_group'),
+            Field('ProductTypeName', 'product_type_name'),
+            Field('PublicationDate', 'publication_date'),
+            Field('Publisher', 'publisher'),
+            Field('ReleaseDate', 'release_date'),
+            Field('Studio', 'studio'),
+            Field('Title', 'title'),
+            Field('UPC', 'upc'),
+            ListField('UPCList//UPCListElement', 'upc_list'),
+        )
+
+    record_fields = (
+        Record('ItemAttributes', 'item_attributes', Attributes.record_fields),
+    )
+
 
 class BrowseNodes(BaseLookupWrapper):
 
+    response_groups = ('BrowseNodes',)
+
     class BrowseNode(BaseLookupWrapper):
 
         @property
@@ -619,6 +798,10 @@ class BrowseNodes(BaseLookupWrapper):
     def first_browse_node(self):
         return self.BrowseNode(self._first_browse_node)
 
+    record_fields = (
+        ListField('BrowseNodes//BrowseNodeId', 'browse_node_ids'),
+    )
+
 
 # ToDo: EditorialReview
 
@@ -664,3 +847,43 @@ class OfferFull(Offers, OfferSummary):
     If requesting Large and OfferFull response groups, just use Large.
     """
     pass
+
+
+# Response groups which are also returned when requesting any of the listed parent response groups.
+# Small only returns a few of the item attributes (ex. Title, Manufacturer, ProductGroup), so it isn't a parent
+# of ItemAttributes.
+RESPONSE_GROUP_PARENTS = {
+    'ItemAttributes': ('Medium', 'Large'),
+    'Small': ('Medium', 'Large'),
+    'SalesRank': ('Medium', 'Large'),
+    'Images': ('Medium', 'Large'),
+    'OfferSummary': ('Offers', 'OfferFull', 'Medium', 'Large'),
+    'Offers': ('OfferFull', 'Large'),
+    'BrowseNodes': ('Large',),
+    'Medium': ('Large',),
+}
+
+
+def response_groups_for(psr_cls):
+    """
+    Derive the minimal set of response groups which returns everything the parser class can parse.
+
+    example:
+        >>> class MyParser(Item, SalesRank, OfferSummary):
+        >>>     pass
+        >>>
+        >>> response_groups_for(MyParser)
+        ('OfferSummary', 'SalesRank')
+        >>> response_groups_for(Large)
+        ('BrowseNodes', 'Offers', 'Images', 'SalesRank', 'ItemAttributes', 'Small')
+
+    :param psr_cls: The parser class which is created by you to parse out the required data from the response.
+    :return: tuple of response group names.
+    """
+    groups = []
+    for cls in reversed(psr_cls.__mro__):
+        for group in cls.__dict__.get('response_groups', ()):
+            if group not in groups:
+                groups.append(group)
+    return tuple(group for group in groups
+                 if not any(parent in groups for parent in RESPONSE_GROUP_PARENTS.get(group, ())))
@@ -0,0 +1,153 @@
+"""
+Django style lookups over the record fields of a parser class. (see aws.parsers.lookup.target)
+
+A lookup is made of the record field names separated by `__`, optionally followed by an operator.
+(ex. `offer_summary__total_new__gt=0` or `item_attributes__product_group='Toy'`)
+Lookups on a list of records (ex. `offers__offer_listing__is_eligible_for_prime=True`) match when
+any of the records match. Prices are compared by their amount in minor units, either with an int or with
+Money which also compares the currency code.
+
+Lookups are compiled into a single XPath predicate on the a:Item element, see Items.select
+"""
+from lxml import etree
+
+from base import BaseLookupWrapper, to_bool, to_float, to_int
+from target import MoneyField, Record, record_fields_for
+from ..money import Money
+
+LOOKUP_SEP = '__'
+
+OPERATORS = ('exact', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'contains', 'startswith', 'isnull')
+
+_COMPARISONS = {
+    'exact': '=',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+}
+
+_TRUE = "(. = '1' or . = 'true' or . = 'True')"
+
+
+def parse_lookup(key):
+    """
+    Split a lookup into its field names and operator.
+
+    example:
+        >>> parse_lookup('offer_summary__total_new__gt')
+        (('offer_summary', 'total_new'), 'gt')
+        >>> parse_lookup('sales_rank')
+        (('sales_rank',), 'exact')
+
+    :param key: Lookup. ex. offer_summary__total_new__gt
+    :return: (tuple of field names, operator)
+    """
+    names = key.split(LOOKUP_SEP)
+    op = 'exact'
+    if len(names) > 1 and names[-1] in OPERATORS:
+        op = names.pop()
+    if op not in OPERATORS or not all(names):
+        raise ValueError('invalid lookup: {}'.format(key))
+    return tuple(names), op
+
+
+def resolve_fields(psr_cls, names):
+    """
+    Find the record fields named by a lookup.
+    :param psr_cls: The parser class which declares the record fields.
+    :param names: Field names. ex. ('offer_summary', 'total_new')
+    :return: list of fields, one for each name.
+    """
+    fields = record_fields_for(psr_cls)
+    resolved = []
+    for name in names:
+        for field in fields:
+            if field.name == name:
+                break
+        else:
+            raise ValueError('{} has no field {}'.format(psr_cls.__name__, LOOKUP_SEP.join(names)))
+        resolved.append(field)
+        fields = field.fields if isinstance(field, Record) else ()
+    return resolved
+
+
+def _xpath_step(path):
+    return '/'.join(name if not name or name.startswith('@') else 'a:' + name for name in path)
+
+
+def _predicate(fields, op, value, variables):
+    """
+    Compile a single lookup into an XPath expression relative to the a:Item element.
+    :param variables: dict the XPath variables are added to.
+    """
+    path = '/'.join(_xpath_step(field.path) for field in fields)
+    field = fields[-1]
+
+    def var(x):
+        name = 'v{}'.format(len(variables))
+        variables[name] = x
+        return '$' + name
+
+    if op == 'isnull' or (op == 'exact' and value is None):
+        return 'not({})'.format(path) if value or op == 'exact' else path
+    if op == 'ne':
+        return 'not({})'.format(_predicate(fields, 'exact', value, variables))
+    if op == 'in':
+        values = list(value)
+        if not values:
+            return 'false()'
+        return ' or '.join('({})'.format(_predicate(fields, 'exact', x, variables)) for x in values)
+
+    if isinstance(field, MoneyField):
+        if op not in _COMPARISONS:
+            raise ValueError('{} is not supported for prices'.format(op))
+        if isinstance(value, Money):
+            return '{}[number(a:Amount) {} {} and a:CurrencyCode = {}]'.format(
+                path, _COMPARISONS[op], var(float(value.amount)), var(value.currency_code))
+        return '{}[number(a:Amount) {} {}]'.format(path, _COMPARISONS[op], var(float(value)))
+    if isinstance(field, Record):
+        raise ValueError('{} can only be used with isnull'.format(field.name))
+
+    if field.convert is to_bool:
+        if op != 'exact':
+            raise ValueError('{} is not supported for booleans'.format(op))
+        return '{}[{}]'.format(path, _TRUE if value else 'not({})'.format(_TRUE))
+    if field.convert in (to_int, to_float):
+        if op not in _COMPARISONS:
+            raise ValueError('{} is not supported for numbers'.format(op))
+        return '{}[number(.) {} {}]'.format(path, _COMPARISONS[op], var(float(value)))
+    if op == 'exact':
+        return '{}[. = {}]'.format(path, var(value))
+    if op == 'contains':
+        return '{}[contains(., {})]'.format(path, var(value))
+    if op == 'startswith':
+        return '{}[starts-with(., {})]'.format(path, var(value))
+    raise ValueError('{} is not supported for text'.format(op))
+
+
+_compiled = {}
+
+
+def compile_lookups(psr_cls, lookups):
+    """
+    Compile lookups into an XPath which selects the matching a:Item elements.
+
+    example:
+        >>> xpath, variables = compile_lookups(MyParser, {'offer_summary__total_new__gt': 0})
+        >>> xpath(items_element, **variables)
+
+    :param psr_cls: The parser class which declares the record fields.
+    :param lookups: dict of lookup -> value. Every lookup must match.
+    :return: (compiled lxml.etree.XPath, dict of XPath variables)
+    """
+    variables = {}
+    predicates = []
+    for key in sorted(lookups):
+        names, op = parse_lookup(key)
+        predicates.append('({})'.format(_predicate(resolve_fields(psr_cls, names), op, lookups[key], variables)))
+    expression = './a:Item[{}]'.format(' and '.join(predicates)) if predicates else './a:Item'
+    xpath = _compiled.get(expression)
+    if xpath is None:
+        xpath = _compiled[expression] = etree.XPath(expression, namespaces=BaseLookupWrapper.namespaces)
+    return xpath, variables
@@ -0,0 +1,331 @@
+"""
+Tree-less backend for parsing an ItemLookup response straight into item records (dicts).
+
+Instead of building an element tree and querying it with xpath, lxml sends every start/end/data event
+to an ItemRecordTarget while parsing. Only the elements declared by the `record_fields` of the parser
+class are converted, every other subtree (ex. ImageSets when Images isn't part of the parser) is skipped.
+
+Records mirror the properties of the parser class. (ex. `record['offer_summary']['total_new']` is
+`item.offer_summary.total_new`) Prices are always parsed into Money.
+
+example:
+    >>> from aws.parsers import Item, OfferFull, parse_item_records
+    >>>
+    >>> class MyParser(Item, OfferFull):
+    >>>     pass
+    >>>
+    >>> for record in parse_item_records(response_content, MyParser):
+    >>>     print record['asin'], record['offer_summary'].get('lowest_new_price')
+"""
+import copy
+
+from lxml import etree
+
+from base import AWSError, to_text
+from ..money import Money
+
+
+class Field(object):
+    """
+    Text of the element at path stored under name. Only the first occurrence is kept.
+
+    The path is relative to the a:Item element (or to the enclosing Record) and uses local names
+    separated by `/`. A `//` in the path matches any number of elements in between.
+    (ex. `BrowseNodes//BrowseNodeId`) A path starting with `@` is an attribute of the enclosing Record.
+    """
+
+    def __init__(self, path, name, convert=to_text):
+        self.path = tuple(path.split('/'))
+        self.name = name
+        self.convert = convert
+
+    def add(self, record, text):
+        if self.name not in record:
+            record[self.name] = self.convert(text)
+
+
+class ListField(Field):
+    """
+    Text of every element at path. Values are stripped and empty values are skipped.
+    """
+
+    def add(self, record, text):
+        values = record.setdefault(self.name, [])
+        text = text.strip()
+        if text:
+            values.append(self.convert(text))
+
+
+class Record(Field):
+    """
+    The element at path is parsed into a nested record using its own fields.
+    """
+
+    def __init__(self, path, name, fields):
+        Field.__init__(self, path, name)
+        self.fields = tuple(fields)
+        self.schema = Schema(self.fields)
+
+    def build(self, record):
+        return record
+
+    def add(self, record, sub_record):
+        if self.name not in record:
+            record[self.name] = self.build(sub_record)
+
+
+class RecordList(Record):
+    """
+    Every element at path is parsed into a nested record.
+    """
+
+    def add(self, record, sub_record):
+        record.setdefault(self.name, []).append(self.build(sub_record))
+
+
+class MoneyField(Record):
+    """
+    Price element (which contains the Amount and CurrencyCode elements) parsed into Money.
+    """
+
+    def __init__(self, path, name):
+        Record.__init__(self, path, name, (Field('Amount', 'amount'), Field('CurrencyCode', 'currency_code')))
+
+    def build(self, record):
+        return Money.parse(record.get('amount'), record.get('currency_code'))
+
+
+class Schema(object):
+    """
+    Compiled set of fields used to look up the field of an element by its path.
+    """
+
+    def __init__(self, fields):
+        self.fields = {}
+        self.attributes = []
+        self.descendants = []
+        self.prefixes = set()
+        self.open_prefixes = []
+        for field in fields:
+            path = field.path
+            if path[0].startswith('@'):
+                self.attributes.append(field)
+                continue
+            if '' in path:
+                i = path.index('')
+                prefix, suffix = path[:i], path[i + 1:]
+                self.descendants.append((prefix, suffix, field))
+                self.open_prefixes.append(prefix)
+                path = prefix
+            else:
+                self.fields[path] = field
+            self.prefixes.update(path[:i] for i in range(1, len(path) + 1))
+
+    def match(self, rel):
+        field = self.fields.get(rel)
+        if field is not None:
+            return field
+        for prefix, suffix, field in self.descendants:
+            if len(rel) >= len(prefix) + len(suffix) and rel[:len(prefix)] == prefix and rel[-len(suffix):] == suffix:
+                return field
+
+    def wanted(self, rel):
+        if rel in self.prefixes:
+            return True
+        return any(rel[:len(prefix)] == prefix for prefix in self.open_prefixes)
+
+
+class ItemRecords(list):
+    """
+    List of item records along with the errors returned in the Items.Request element.
+    """
+
+    def __init__(self, records=(), errors=()):
+        list.__init__(self, records)
+        self.errors = list(errors)
+
+
+class _ErrorRecord(object):
+
+    def __init__(self, error):
+        self.code = error.get('code')
+        self.message = error.get('message')
+
+
+_ERROR_FIELDS = {
+    'Code': Field('Code', 'code'),
+    'Message': Field('Message', 'message'),
+}
+
+
+class ItemRecordTarget(object):
+    """
+    lxml parser target which builds item records from the parser events.
+    """
+
+    def __init__(self, schema):
+        """
+
+        :param schema: Schema of the fields to parse from each a:Item element.
+        """
+        self.schema = schema
+        self.records = []
+        self.errors = []
+        self._root = None
+        self._path = []
+        self._skip = 0
+        self._frames = []
+        self._capture = None
+        self._text = []
+
+    def start(self, tag, attrib):
+        if self._skip:
+            self._skip += 1
+            return
+        name = tag[tag.find('}') + 1:]
+        self._path.append(name)
+        depth = len(self._path)
+
+        if not self._frames:
+            if depth == 1:
+                self._root = name
+            elif name == 'Item' and depth > 1 and self._path[-2] == 'Items':
+                record = {}
+                self.records.append(record)
+                self._frames.append((self.schema, record, depth, None))
+            elif name == 'Error':
+                self.errors.append({})
+            elif name in _ERROR_FIELDS and depth > 1 and self._path[-2] == 'Error':
+                self._capture = (_ERROR_FIELDS[name], self.errors[-1], depth)
+                self._text = []
+            elif name == 'OperationRequest':
+                self._path.pop()
+                self._skip = 1
+            return
+
+        schema, record, frame_depth, _ = self._frames[-1]
+        rel = tuple(self._path[frame_depth:])
+        field = schema.match(rel)
+        if isinstance(field, Record):
+            sub_record = {}
+            for attribute in field.schema.attributes:
+                sub_record[attribute.name] = attribute.convert(attrib.get(attribute.path[0][1:]))
+            self._frames.append((field.schema, sub_record, depth, (field, record)))
+        elif field is not None:
+            self._capture = (field, record, depth)
+            self._text = []
+        elif not schema.wanted(rel):
+            self._path.pop()
+            self._skip = 1
+
+    def data(self, text):
+        if self._capture is not None and not self._skip:
+            self._text.append(text)
+
+    def end(self, tag):
+        if self._skip:
+            self._skip -= 1
+            return
+        depth = len(self._path)
+        if self._capture is not None and self._capture[2] == depth:
+            field, record, _ = self._capture
+            field.add(record, ''.join(self._text))
+            self._capture = None
+        if self._frames and self._frames[-1][2] == depth:
+            _, sub_record, _, owner = self._frames.pop()
+            if owner is not None:
+                field, record = owner
+                field.add(record, sub_record)
+        self._path.pop()
+
+    def close(self):
+        """
+        Called by lxml once the whole response has been parsed.
+
+        Raise an AWSError if the whole response is an error. (ex. RequestThrottled)
+        :return: ItemRecords
+        """
+        if self._root and self._root.endswith('ErrorResponse') and self.errors:
+            raise AWSError(_ErrorRecord(self.errors[0]))
+        return ItemRecords(self.records, self.errors)
+
+
+def record_fields_for(psr_cls):
+    """
+    Collect the record fields declared by every class of the parser class.
+    :param psr_cls: The parser class which is created by you to parse out the required data from the response.
+    :return: list of fields.
+    """
+    fields = []
+    names = set()
+    for cls in reversed(psr_cls.__mro__):
+        for field in cls.__dict__.get('record_fields', ()):
+            if field.name not in names:
+                names.add(field.name)
+                fields.append(field)
+    return fields
+
+
+def merge_fields(fields):
+    """
+    Merge fields which are declared more than once. The fields of records of the same name and path
+    are merged into a single record, otherwise the first field of a name is kept.
+    :param fields: Iterable of fields.
+    :return: list of fields.
+    """
+    merged = []
+    index = {}
+    for field in fields:
+        i = index.get(field.name)
+        if i is None:
+            index[field.name] = len(merged)
+            merged.append(field)
+            continue
+        other = merged[i]
+        if type(other) in (Record, RecordList) and type(field) is type(other) and field.path == other.path:
+            record = copy.copy(other)
+            record.fields = tuple(merge_fields(other.fields + field.fields))
+            record.schema = Schema(record.fields)
+            merged[i] = record
+    return merged
+
+
+_combined = {}
+
+
+def combined_parser(*psr_classes):
+    """
+    Parser class with the record fields of every parser class, so a response can be parsed once
+    by parse_item_records for several consumers. (see merge_fields)
+
+    example:
+        >>> records = parse_item_records(content, combined_parser(MyParser, FamilyParser))
+
+    :param psr_classes: Parser classes.
+    :return: Parser class which only declares record fields.
+    """
+    psr_cls = _combined.get(psr_classes)
+    if psr_cls is None:
+        fields = merge_fields(field for cls in psr_classes for field in record_fields_for(cls))
+        name = 'Combined' + ''.join(cls.__name__ for cls in psr_classes)
+        psr_cls = _combined[psr_classes] = type(name, (object,), {'record_fields': tuple(fields)})
+    return psr_cls
+
+
+_schemas = {}
+
+
+def parse_item_records(content, psr_cls):
+    """
+    Parse an ItemLookup response into item records without building an element tree.
+
+    :param content: ItemLookup response content.
+    :param psr_cls: The parser class which declares the fields to parse.
+        (~~~ Note that this must NOT be an instance of the parser class. ~~~)
+    :return: ItemRecords (list of dicts) with the request errors available as `errors`.
+    """
+    schema = _schemas.get(psr_cls)
+    if schema is None:
+        schema = _schemas[psr_cls] = Schema(record_fields_for(psr_cls))
+    parser = etree.XMLParser(target=ItemRecordTarget(schema))
+    return etree.fromstring(content, parser)
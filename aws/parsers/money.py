@@ -0,0 +1,157 @@
+"""
+Used to represent prices as integer minor units (cents) along with their currency code.
+
+Prices are parsed from the Amount and CurrencyCode elements which are returned with every
+price element, so there's no need to parse FormattedPrice which is formatted differently
+for each marketplace. (ex. `$1,234.56` vs `EUR 1.234,56`)
+"""
+from array import array
+from functools import total_ordering
+
+# Number of digits after the decimal point for currencies which don't use 2.
+CURRENCY_EXPONENTS = {
+    'JPY': 0,
+    'KRW': 0,
+    'CLP': 0,
+    'BHD': 3,
+    'KWD': 3,
+}
+
+
+def _int64_typecode():
+    """
+    'l' is only 64 bit where a C long is (not on Windows or 32 bit builds) and 'q' needs Python 3.3+.
+    :return: Typecode of 64 bit integer arrays or None if the platform has none.
+    """
+    for typecode in ('q', 'l'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+
+INT64_TYPECODE = _int64_typecode()
+
+
+def int64_array(values=()):
+    """
+    :param values: Iterable of integers.
+    :return: array of 64 bit integers.
+    """
+    if INT64_TYPECODE is None:
+        raise NotImplementedError('array has no 64 bit integer typecode on this platform')
+    return array(INT64_TYPECODE, values)
+
+
+@total_ordering
+class Money(object):
+
+    __slots__ = ('amount', 'currency_code')
+
+    def __init__(self, amount, currency_code):
+        """
+
+        :param amount: Integer amount in minor units. ex. 1999 for $19.99
+        :param currency_code: ISO 4217 currency code. ex. USD
+        """
+        self.amount = amount
+        self.currency_code = currency_code
+
+    @property
+    def exponent(self):
+        return CURRENCY_EXPONENTS.get(self.currency_code, 2)
+
+    def to_float(self):
+        return self.amount / float(10 ** self.exponent)
+
+    def __float__(self):
+        return self.to_float()
+
+    def _check_currency(self, other):
+        if self.currency_code != other.currency_code:
+            raise ValueError('currency mismatch: {} != {}'.format(self.currency_code, other.currency_code))
+
+    def __add__(self, other):
+        self._check_currency(other)
+        return Money(self.amount + other.amount, self.currency_code)
+
+    def __sub__(self, other):
+        self._check_currency(other)
+        return Money(self.amount - other.amount, self.currency_code)
+
+    def __mul__(self, other):
+        """
+        Multiply by a number. The amount is rounded to whole minor units, so it stays an integer.
+        """
+        if isinstance(other, float):
+            return Money(int(round(self.amount * other)), self.currency_code)
+        if isinstance(other, (int, long)):
+            return Money(self.amount * other, self.currency_code)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.amount, self.currency_code)
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.amount == other.amount and self.currency_code == other.currency_code
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        self._check_currency(other)
+        return self.amount < other.amount
+
+    def __hash__(self):
+        return hash((self.amount, self.currency_code))
+
+    def __str__(self):
+        return '{:.{}f} {}'.format(self.to_float(), self.exponent, self.currency_code)
+
+    def __repr__(self):
+        return '<Money amount={} currency_code={}>'.format(self.amount, self.currency_code)
+
+    @classmethod
+    def parse(cls, amount, currency_code):
+        """
+        Create an instance from the text of the Amount and CurrencyCode elements.
+        :param amount: Text of the Amount element. ex. '1999'
+        :param currency_code: Text of the CurrencyCode element. ex. 'USD'
+        :return: Money or None if there's no amount.
+        """
+        if not amount:
+            return None
+        return cls(int(amount), currency_code)
+
+
+def amounts(prices):
+    """
+    Pack the amounts of a list of prices into an array of 64 bit integers for bulk arithmetic.
+    The array supports the buffer protocol so it can be used by numpy without copying.
+    (ex. `numpy.frombuffer(amounts(prices), dtype=numpy.int64)`)
+
+    :param prices: Iterable of Money with the same currency code. None values are skipped.
+    :return: (array of amounts, currency code)
+    """
+    currency_code = None
+    packed = int64_array()
+    for price in prices:
+        if price is None:
+            continue
+        if currency_code is None:
+            currency_code = price.currency_code
+        elif price.currency_code != currency_code:
+            raise ValueError('currency mismatch: {} != {}'.format(currency_code, price.currency_code))
+        packed.append(price.amount)
+    return packed, currency_code
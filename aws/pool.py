@@ -0,0 +1,126 @@
+"""
+Used to spread lookups across several associate accounts to get past the throttle of a single access key.
+
+example:
+    >>> from aws.pool import LookupPool
+    >>>
+    >>> lookup = LookupPool([
+    >>>     ('tag-1', 'access-key-1', 'secret-key-1'),
+    >>>     ('tag-2', 'access-key-2', 'secret-key-2', 2.0),  # this key is allowed 2 requests per second
+    >>> ])
+    >>> response_content = lookup.item_lookup(item_ids=('TEST_ASIN',), parser=MyParser)
+"""
+import collections
+import logging
+import threading
+import time
+
+from aws_ import Lookup, fetch_offer_pages
+from throttle import RateLimiter, is_throttled
+
+
+class _Member(object):
+    """
+    A single set of credentials in the pool.
+    """
+
+    def __init__(self, lookup, rate):
+        self.lookup = lookup
+        self.rate = float(rate)
+        self.current_weight = 0.0
+        self.throttles = collections.deque()
+        self.sick_until = 0
+
+    def weight(self, now, window):
+        while self.throttles and self.throttles[0] < now - window:
+            self.throttles.popleft()
+        return self.rate / (1 + len(self.throttles))
+
+    def __repr__(self):
+        return '<Member access_key={} rate={} recent_throttles={} sick={}>'.format(
+            self.lookup.access_key, self.rate, len(self.throttles), self.sick_until > time.time())
+
+
+class LookupPool(object):
+
+    def __init__(self, credentials, marketplace=None, rate=1.0, window=60, sick_after=3, sick_for=60, coalesce=False):
+        """
+
+        :param credentials: list of (associate_tag, access_key, secret_key) or
+            (associate_tag, access_key, secret_key, rate) tuples.
+        :param marketplace: The locale where you are making the request.
+        :param rate: Requests per second allowed for credentials which don't have their own rate.
+        :param window: Number of seconds a throttle error counts against the weight of its credentials.
+        :param sick_after: Number of throttle errors within the window after which credentials are taken out of rotation.
+        :param sick_for: Number of seconds sick credentials are taken out of rotation for.
+        :param coalesce: see aws.Lookup
+        """
+        self.members = []
+        for credential in credentials:
+            associate_tag, access_key, secret_key = credential[:3]
+            member_rate = credential[3] if len(credential) > 3 else rate
+            lookup = Lookup(associate_tag, access_key, secret_key, marketplace=marketplace,
+                            limiter=RateLimiter(member_rate), coalesce=coalesce)
+            self.members.append(_Member(lookup, member_rate))
+        if not self.members:
+            raise ValueError('at least one set of credentials is required')
+        self.window = window
+        self.sick_after = sick_after
+        self.sick_for = sick_for
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def _choose(self, exclude=()):
+        """
+        Smooth weighted round robin over the healthy members.
+        :param exclude: Members which were already tried for this request.
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            members = [x for x in self.members if x not in exclude and x.sick_until <= now]
+            if not members:
+                members = [x for x in self.members if x not in exclude] or self.members
+                return min(members, key=lambda x: x.sick_until)
+            weights = [x.weight(now, self.window) for x in members]
+            total = sum(weights)
+            for member, weight in zip(members, weights):
+                member.current_weight += weight
+            chosen = max(members, key=lambda x: x.current_weight)
+            chosen.current_weight -= total
+            return chosen
+
+    def _record_throttle(self, member):
+        now = time.time()
+        with self._lock:
+            member.throttles.append(now)
+            if len(member.throttles) >= self.sick_after:
+                member.sick_until = now + self.sick_for
+                self.logger.warning('taking %s out of rotation for %s seconds', member.lookup.access_key, self.sick_for)
+
+    @property
+    def healthy(self):
+        now = time.time()
+        return [x for x in self.members if x.sick_until <= now]
+
+    def item_lookup(self, item_ids=(), response_groups=(), parser=None, **kwargs):
+        """
+        Same as aws.Lookup.item_lookup using the next set of credentials in rotation.
+        Throttled requests are sent again using other credentials, up to once per set of credentials.
+        """
+        tried = []
+        while True:
+            member = self._choose(exclude=tried)
+            tried.append(member)
+            content = member.lookup.item_lookup(item_ids, response_groups, parser=parser, **kwargs)
+            if not is_throttled(content):
+                return content
+            self._record_throttle(member)
+            if len(tried) >= len(self.members):
+                return content
+
+    def item_offers(self, item_ids=(), response_groups=('Offers',), workers=4, **kwargs):
+        """
+        Same as aws.Lookup.item_offers, every page request goes through item_lookup of the pool.
+        """
+        return fetch_offer_pages(self.item_lookup, item_ids, response_groups, workers, **kwargs)
@@ -0,0 +1,196 @@
+"""
+Used to keep a catalog of items refreshed while spending the request budget on the items which change the most.
+
+example:
+    >>> from aws import Lookup
+    >>> from aws.parsers import Item, Medium
+    >>> from aws.scheduler import RefreshScheduler
+    >>>
+    >>> class MyParser(Item, Medium):
+    >>>     pass
+    >>>
+    >>> scheduler = RefreshScheduler(Lookup(associate_tag, access_key, secret_key), MyParser, rate=1)
+    >>> scheduler.add(asins)
+    >>> scheduler.run(lambda change: save(change.item))
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+
+import requests
+from lxml import etree
+
+from aws_ import ITEM_LOOKUP_MAX_IDS
+from changes import ChangeDetector
+from parsers import ItemLookupResponse
+from parsers.lookup.base import AWSError
+from throttle import RateLimiter
+
+
+class RefreshScheduler(object):
+
+    def __init__(self, lookup, psr_cls, response_groups=(), rate=1.0, min_interval=300, max_interval=86400,
+                 detector=None, batch_size=ITEM_LOOKUP_MAX_IDS, worst_sales_rank=1000000, **kwargs):
+        """
+
+        :param lookup: aws.Lookup instance used to refresh the items.
+        :param psr_cls: The parser class used to parse each response.
+        :param response_groups: (optional) Response groups requested for each batch. Derived from psr_cls by default.
+        :param rate: Number of batches requested per second. Ignored if the lookup already has a limiter.
+        :param min_interval: Shortest number of seconds between refreshes of an item.
+        :param max_interval: Longest number of seconds between refreshes of an item.
+        :param detector: (optional) aws.changes.ChangeDetector used to decide if an item changed.
+            Defaults to fingerprinting the whole item.
+        :param batch_size: Number of item ids sent with each request.
+        :param worst_sales_rank: Items with a sales rank at or worse than this may wait the full max_interval.
+            Items with a better sales rank have their longest interval reduced proportionally (log scale).
+        :param kwargs: Any extra parameters sent with each item_lookup. ex. Condition='New'
+        """
+        self.lookup = lookup
+        self.psr_cls = psr_cls
+        self.response_groups = response_groups
+        self.limiter = RateLimiter(rate) if lookup.limiter is None else None
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.detector = detector or ChangeDetector()
+        self.batch_size = batch_size
+        self.worst_sales_rank = worst_sales_rank
+        self.extra = kwargs
+        self.increase = 1.5
+        self.decrease = 0.5
+        self.intervals = {}
+        self._due = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def __len__(self):
+        return len(self._due)
+
+    def _push(self, asin, due):
+        self._due[asin] = due
+        heapq.heappush(self._heap, (due, asin))
+
+    def add(self, asins, interval=None):
+        """
+        Schedule items to be refreshed. Items which are already scheduled are left alone.
+        :param asins: Iterable of asins.
+        :param interval: (optional) Starting refresh interval. Defaults to min_interval.
+        :return:
+        """
+        now = time.time()
+        with self._lock:
+            for asin in asins:
+                if asin not in self._due:
+                    self.intervals[asin] = interval or self.min_interval
+                    self._push(asin, now)
+
+    def remove(self, asin):
+        """
+        Stop refreshing an item.
+        :param asin:
+        :return:
+        """
+        with self._lock:
+            self._due.pop(asin, None)
+            self.intervals.pop(asin, None)
+
+    def next_batch(self, wait=True):
+        """
+        Pop the next batch of items to refresh.
+
+        The batch is always filled up to batch_size (as long as enough items are scheduled)
+        by pulling items forward which aren't due yet, so no request is sent with empty slots.
+
+        :param wait: Block until the first item of the batch is due.
+        :return: List of asins.
+        """
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return []
+            delay = self._heap[0][0] - time.time()
+        if wait and delay > 0:
+            time.sleep(delay)
+        batch = []
+        with self._lock:
+            while self._heap and len(batch) < self.batch_size:
+                due, asin = heapq.heappop(self._heap)
+                if self._due.get(asin) == due:
+                    del self._due[asin]
+                    batch.append(asin)
+        return batch
+
+    def _max_interval_for(self, item):
+        sales_rank = getattr(item, 'sales_rank', None)
+        if not sales_rank:
+            return self.max_interval
+        scale = math.log10(min(sales_rank, self.worst_sales_rank) + 1) / math.log10(self.worst_sales_rank + 1)
+        return max(self.min_interval, self.max_interval * scale)
+
+    def reschedule(self, asin, changed, item=None):
+        """
+        Adapt the refresh interval of an item and schedule its next refresh.
+        :param asin:
+        :param changed: True if the item changed since its last refresh.
+        :param item: (optional) Parser item used to cap the interval by sales rank.
+        :return:
+        """
+        with self._lock:
+            if asin not in self.intervals:
+                return
+            interval = self.intervals[asin] * (self.decrease if changed else self.increase)
+            interval = min(max(interval, self.min_interval), self._max_interval_for(item))
+            self.intervals[asin] = interval
+            self._push(asin, time.time() + interval)
+
+    def step(self):
+        """
+        Refresh the next batch of items.
+        :return: List of aws.changes.ItemChange for the items which changed.
+        """
+        batch = self.next_batch()
+        if not batch:
+            return []
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            content = self.lookup.item_lookup(batch, self.response_groups, parser=self.psr_cls, **self.extra)
+            items = ItemLookupResponse(etree.fromstring(content), self.psr_cls).items.item_list()
+        except (AWSError, requests.RequestException, etree.XMLSyntaxError) as e:
+            # The batch was already taken off the schedule, so it must be pushed back or its items are dropped.
+            self.logger.warning('batch failed, rescheduling: %r', e)
+            with self._lock:
+                for asin in batch:
+                    if asin in self.intervals:
+                        self._push(asin, time.time() + self.min_interval)
+            return []
+
+        changes = []
+        seen = set()
+        for item in items:
+            asin = str(item.xpath('./a:ASIN/text()')[0])
+            seen.add(asin)
+            change = self.detector.check(item)
+            self.reschedule(asin, change is not None, item)
+            if change is not None:
+                changes.append(change)
+        for asin in batch:
+            if asin not in seen:
+                # The item wasn't returned (invalid or removed) so treat it as unchanged.
+                self.reschedule(asin, False)
+        return changes
+
+    def run(self, callback, stop_event=None):
+        """
+        Refresh items continuously until stop_event is set or nothing is left to refresh.
+        :param callback: Called with each aws.changes.ItemChange.
+        :param stop_event: (optional) threading.Event used to stop the loop.
+        :return:
+        """
+        while len(self) and not (stop_event is not None and stop_event.is_set()):
+            for change in self.step():
+                callback(change)
@@ -0,0 +1,74 @@
+"""
+Used to coalesce concurrent requests for the same items into a single request.
+"""
+import threading
+
+
+class _Call(object):
+    """
+    A request which is currently in flight.
+    """
+
+    def __init__(self, item_ids):
+        self.item_ids = frozenset(item_ids)
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Thread safe group of in flight requests.
+
+    A request is keyed by its canonical parameters (excluding the item ids). While a request is in flight,
+    any other request with the same key whose item ids are all contained in the in flight request
+    waits for and returns the in flight result instead of being sent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, item_ids, fn):
+        """
+        Call fn unless a matching request is already in flight, in which case wait on its result.
+
+        :param key: Hashable canonical parameters of the request excluding the item ids.
+        :param item_ids: Item ids being requested.
+        :param fn: Function which sends the request and returns its result.
+        :return: Result of fn or the result of the in flight request which covers the item ids.
+        """
+        item_ids = frozenset(item_ids)
+        with self._lock:
+            for call in self._calls.get(key, ()):
+                if item_ids <= call.item_ids:
+                    break
+            else:
+                call = None
+                leader = _Call(item_ids)
+                self._calls.setdefault(key, []).append(leader)
+
+        if call is not None:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            leader.result = fn()
+            return leader.result
+        except Exception as e:
+            leader.error = e
+            raise
+        finally:
+            with self._lock:
+                calls = self._calls[key]
+                calls.remove(leader)
+                if not calls:
+                    del self._calls[key]
+            leader.event.set()
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return sum(len(x) for x in self._calls.values())
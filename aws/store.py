@@ -0,0 +1,368 @@
+"""
+Append-only binary store of item records (see aws.parsers.parse_item_records) with random access by ASIN.
+
+The store is made of two files. The data file holds the encoded records one after another and the
+index file (`<path>.idx`) holds a fixed size (asin, offset) entry for every record written.
+Opening a store only reads the index, the data file is memory mapped and fields are decoded lazily
+out of the mapping when they're accessed. Decoding a field still copies it (ex. a string is a slice
+of the mapping), what's saved is decoding the fields which aren't accessed. When an ASIN is written
+more than once, the latest record wins. Records read from a store can't be used once it's closed,
+call `to_dict` on the ones to keep.
+
+example:
+    >>> from aws.store import ItemStore
+    >>>
+    >>> store = ItemStore('/var/lib/catalog/items.bin')
+    >>> store.append_response(response_content, MyParser)
+    >>> item = store.get('B00FRIQEDW')
+    >>> item['offer_summary']['lowest_new_price']
+    <Money amount=1999 currency_code=USD>
+"""
+import mmap
+import os
+import struct
+import threading
+
+from parsers import parse_item_records
+from parsers.money import Money
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_CONTAINER = struct.Struct('<II')
+_INDEX_ENTRY = struct.Struct('<10sQ')
+
+# Type tags of the encoded values.
+_NONE = 'N'
+_TRUE = 'T'
+_FALSE = 'F'
+_INT = 'i'
+_FLOAT = 'd'
+_STR = 's'
+_MONEY = 'm'
+_LIST = 'l'
+_DICT = 'h'
+
+
+def _encode(value, out):
+    """
+    Encode a value into out (list of strings).
+
+    Every encoded value starts with its type tag and its size can be found without decoding it,
+    containers are prefixed with (number of values, size in bytes) so they can be skipped over.
+    :param value:
+    :param out:
+    :return:
+    """
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, (int, long)):
+        out.append(_INT + _I64.pack(value))
+    elif isinstance(value, float):
+        out.append(_FLOAT + _F64.pack(value))
+    elif isinstance(value, basestring):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        out.append(_STR + _U32.pack(len(value)) + value)
+    elif isinstance(value, Money):
+        # A missing currency code is encoded as an empty one.
+        currency_code = value.currency_code or ''
+        out.append(_MONEY + _I64.pack(value.amount) + _U8.pack(len(currency_code)) + currency_code)
+    elif isinstance(value, (list, tuple)):
+        body = []
+        for x in value:
+            _encode(x, body)
+        body = ''.join(body)
+        out.append(_LIST + _CONTAINER.pack(len(value), len(body)) + body)
+    elif isinstance(value, dict):
+        body = []
+        for key in sorted(value):
+            body.append(_U8.pack(len(key)) + key)
+            _encode(value[key], body)
+        body = ''.join(body)
+        out.append(_DICT + _CONTAINER.pack(len(value), len(body)) + body)
+    else:
+        raise TypeError('cannot store value of type {}'.format(type(value).__name__))
+
+
+def encode_record(record):
+    out = []
+    _encode(record, out)
+    return ''.join(out)
+
+
+def _skip(buf, offset):
+    """
+    :return: Offset of the value after the value at offset.
+    """
+    tag = buf[offset]
+    offset += 1
+    if tag in (_NONE, _TRUE, _FALSE):
+        return offset
+    if tag in (_INT, _FLOAT):
+        return offset + 8
+    if tag == _STR:
+        return offset + 4 + _U32.unpack_from(buf, offset)[0]
+    if tag == _MONEY:
+        return offset + 9 + _U8.unpack_from(buf, offset + 8)[0]
+    return offset + _CONTAINER.size + _CONTAINER.unpack_from(buf, offset)[1]
+
+
+def _decode(buf, offset, store=None):
+    """
+    Decode the value at offset. Lists and dicts aren't decoded, a lazy view of them is returned instead.
+    :param store: (optional) ItemStore buf is a mapping of, views of it can't be used once it's closed.
+    """
+    tag = buf[offset]
+    offset += 1
+    if tag == _NONE:
+        return None
+    if tag == _TRUE:
+        return True
+    if tag == _FALSE:
+        return False
+    if tag == _INT:
+        return _I64.unpack_from(buf, offset)[0]
+    if tag == _FLOAT:
+        return _F64.unpack_from(buf, offset)[0]
+    if tag == _STR:
+        size = _U32.unpack_from(buf, offset)[0]
+        return buf[offset + 4:offset + 4 + size]
+    if tag == _MONEY:
+        size = _U8.unpack_from(buf, offset + 8)[0]
+        return Money(_I64.unpack_from(buf, offset)[0], buf[offset + 9:offset + 9 + size] or None)
+    if tag == _LIST:
+        return StoredList(buf, offset, store)
+    if tag == _DICT:
+        return StoredRecord(buf, offset, store)
+    raise ValueError('corrupt value at offset {}'.format(offset - 1))
+
+
+class _StoredContainer(object):
+
+    def __init__(self, buf, offset, store=None):
+        self._mapping = buf
+        self._store = store
+        self._count, size = _CONTAINER.unpack_from(buf, offset)
+        self._start = offset + _CONTAINER.size
+
+    @property
+    def _buf(self):
+        if self._store is not None and self._store.closed:
+            raise ValueError('{} is closed, records read from it can no longer be used'.format(self._store.path))
+        return self._mapping
+
+    def _decode(self, offset):
+        return _decode(self._buf, offset, self._store)
+
+
+class StoredList(_StoredContainer):
+    """
+    Lazy view of an encoded list.
+    """
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        offset = self._start
+        for _ in xrange(self._count):
+            yield self._decode(offset)
+            offset = _skip(self._buf, offset)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        offset = self._start
+        for _ in xrange(i):
+            offset = _skip(self._buf, offset)
+        return self._decode(offset)
+
+    def to_list(self):
+        return [_materialize(x) for x in self]
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+
+class StoredRecord(_StoredContainer):
+    """
+    Lazy view of an encoded record. Supports the read only dict interface.
+    """
+
+    def __init__(self, buf, offset, store=None):
+        _StoredContainer.__init__(self, buf, offset, store)
+        self._offsets = None
+
+    def _fields(self):
+        # Offsets of the values are found once on first access, values are only decoded when accessed.
+        if self._offsets is None:
+            offsets = {}
+            buf = self._buf
+            offset = self._start
+            for _ in xrange(self._count):
+                size = _U8.unpack_from(buf, offset)[0]
+                key = buf[offset + 1:offset + 1 + size]
+                offset += 1 + size
+                offsets[key] = offset
+                offset = _skip(buf, offset)
+            self._offsets = offsets
+        return self._offsets
+
+    def __getitem__(self, key):
+        return self._decode(self._fields()[key])
+
+    def get(self, key, default=None):
+        offset = self._fields().get(key)
+        if offset is None:
+            return default
+        return self._decode(offset)
+
+    def __contains__(self, key):
+        return key in self._fields()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return sorted(self._fields())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return dict((key, _materialize(value)) for key, value in self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def _materialize(value):
+    if isinstance(value, StoredRecord):
+        return value.to_dict()
+    if isinstance(value, StoredList):
+        return value.to_list()
+    return value
+
+
+class ItemStore(object):
+
+    def __init__(self, path):
+        """
+
+        :param path: Path of the data file. The index is kept next to it in `<path>.idx`.
+            Both files are created if they don't exist.
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+        self._lock = threading.Lock()
+        self._data = open(path, 'ab+')
+        self._index_file = open(self.index_path, 'ab+')
+        self._size = os.fstat(self._data.fileno()).st_size
+        self._mmap = None
+        self._mapped_size = 0
+        self.closed = False
+        self.index = {}
+        self._load_index()
+
+    def _load_index(self):
+        self._index_file.seek(0)
+        data = self._index_file.read()
+        for i in xrange(0, len(data) - len(data) % _INDEX_ENTRY.size, _INDEX_ENTRY.size):
+            asin, offset = _INDEX_ENTRY.unpack_from(data, i)
+            # Skip entries for records which never made it to the data file. (ex. crash while writing)
+            if offset < self._size:
+                self.index[asin.rstrip('\0')] = offset
+
+    def _buffer(self, end):
+        """
+        Get the mapping of the data file, remapping it if records were appended since it was mapped.
+        """
+        if self._mmap is None or end > self._mapped_size:
+            # The previous mapping isn't closed since records which were already read still point into it.
+            # It's unmapped once nothing references it anymore.
+            self._mmap = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._mmap)
+        return self._mmap
+
+    def append(self, record):
+        """
+        Append an item record to the store.
+        :param record: dict which contains at least the `asin` of the item.
+        :return: Offset of the record in the data file.
+        """
+        asin = record['asin']
+        body = encode_record(record)
+        with self._lock:
+            offset = self._size
+            self._data.write(_U32.pack(len(body)) + body)
+            self._data.flush()
+            self._size += _U32.size + len(body)
+            self._index_file.write(_INDEX_ENTRY.pack(asin, offset))
+            self._index_file.flush()
+            self.index[asin] = offset
+        return offset
+
+    def append_response(self, content, psr_cls):
+        """
+        Parse an ItemLookup response with the tree-less parser and append every item of it.
+        :param content: ItemLookup response content.
+        :param psr_cls: The parser class which declares the fields to store.
+        :return: list of asins written.
+        """
+        records = parse_item_records(content, psr_cls)
+        for record in records:
+            self.append(record)
+        return [record['asin'] for record in records]
+
+    def get(self, asin):
+        """
+        Get the latest record of an item.
+        :param asin:
+        :return: StoredRecord or None if the item isn't in the store.
+        """
+        offset = self.index.get(asin)
+        if offset is None:
+            return None
+        with self._lock:
+            buf = self._buffer(offset + _U32.size)
+            size = _U32.unpack_from(buf, offset)[0]
+            buf = self._buffer(offset + _U32.size + size)
+        return StoredRecord(buf, offset + _U32.size + 1, self)
+
+    def __getitem__(self, asin):
+        record = self.get(asin)
+        if record is None:
+            raise KeyError(asin)
+        return record
+
+    def __contains__(self, asin):
+        return asin in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def asins(self):
+        return self.index.keys()
+
+    def close(self):
+        """
+        Close the files of the store. Records read from it raise ValueError once it's closed.
+        """
+        with self._lock:
+            self.closed = True
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.close()
+            self._index_file.close()
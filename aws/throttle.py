@@ -0,0 +1,133 @@
+"""
+Used to limit the rate at which requests are sent to the Product Advertising API.
+"""
+import threading
+import time
+
+from lxml import etree
+
+from parsers.lookup.base import THROTTLED_ERROR_CODE, full_error
+
+
+class RateLimiter(object):
+    """
+    Thread safe token bucket which is shared by every request made from an AWS instance.
+    """
+
+    def __init__(self, rate=1.0, burst=1):
+        """
+
+        :param rate: Number of requests allowed per second.
+        :param burst: Number of requests which may be sent back to back before the rate is enforced.
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+
+        Tokens are reserved while holding the lock so concurrent callers are spaced out
+        in the order they called acquire instead of all waking up at once.
+        :return:
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, response):
+        """
+        Called by the AWS client with every response received. Does nothing for a fixed rate.
+        :param response: requests.Response
+        :return:
+        """
+        pass
+
+    def __repr__(self):
+        return '<{} rate={} burst={}>'.format(self.__class__.__name__, self.rate, self.burst)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Rate limiter which finds the highest rate the API allows by additive increase, multiplicative decrease (AIMD).
+
+    Every successful response raises the rate by `increase / rate`, which adds roughly `increase` requests
+    per second for every second spent at the current rate. Every throttle error (RequestThrottled or a 503)
+    cuts the rate by the `decrease` factor, at most once per `1 / rate` seconds so a burst of throttle errors
+    from requests which were already in flight only counts once.
+    """
+
+    def __init__(self, rate=1.0, min_rate=0.1, max_rate=10.0, increase=0.1, decrease=0.5, burst=1):
+        """
+
+        :param rate: Starting number of requests per second.
+        :param min_rate: The rate is never cut below this.
+        :param max_rate: The rate is never raised above this.
+        :param increase: Requests per second added for every second of successful responses.
+        :param decrease: Factor the rate is multiplied by after a throttle error.
+        :param burst: see RateLimiter
+        """
+        RateLimiter.__init__(self, rate, burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.successes = 0
+        self.throttles = 0
+        self.last_throttle = None
+
+    def record(self, response):
+        if response.status_code == 503 or is_throttled(response.content):
+            self.record_throttle()
+        elif response.status_code < 400:
+            self.record_success()
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def record_throttle(self):
+        now = time.time()
+        with self._lock:
+            self.throttles += 1
+            if self.last_throttle is not None and now - self.last_throttle < 1 / self.rate:
+                return
+            self.last_throttle = now
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+    def state(self):
+        """
+        :return: dict of the current rate and the number of successful and throttled responses seen.
+        """
+        with self._lock:
+            return dict(rate=self.rate, min_rate=self.min_rate, max_rate=self.max_rate,
+                        successes=self.successes, throttles=self.throttles, last_throttle=self.last_throttle)
+
+    def __repr__(self):
+        return '<{} rate={:.3f} successes={} throttles={}>'.format(
+            self.__class__.__name__, self.rate, self.successes, self.throttles)
+
+
+def is_throttled(content):
+    """
+    Check if a response was rejected because requests are being sent too quickly.
+    :param content: Response content.
+    :return:
+    """
+    # Only parse the response when it could possibly be a throttle error.
+    if THROTTLED_ERROR_CODE not in content[:1024]:
+        return False
+    try:
+        error = full_error(etree.fromstring(content))
+    except etree.XMLSyntaxError:
+        return False
+    return error is not None and error.code == THROTTLED_ERROR_CODE
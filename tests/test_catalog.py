@@ -0,0 +1,86 @@
+import unittest
+
+from lxml import etree
+
+from aws.catalog import DEFAULT_CATEGORICAL, DEFAULT_NUMERIC, Catalog
+from aws.mockserver import MockServer
+from aws.parsers import Item, ItemAttributes, ItemLookupResponse, OfferFull, SalesRank, parse_item_records
+from aws.parsers.money import Money
+
+
+class CatalogItem(Item, ItemAttributes, OfferFull, SalesRank):
+    pass
+
+
+def lookup_content(item_ids):
+    server = MockServer()
+    return server.item_lookup({'ItemId': ','.join(item_ids), 'ResponseGroup': 'ItemAttributes,OfferFull,SalesRank'})
+
+
+class CatalogTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.contents = [lookup_content(['B{:09d}'.format(i * 10 + j) for j in range(10)]) for i in range(10)]
+
+    def setUp(self):
+        self.catalog = Catalog()
+        for content in self.contents:
+            self.catalog.add_response(content, CatalogItem)
+        self.records = [record for content in self.contents for record in parse_item_records(content, CatalogItem)]
+
+    def assertQuery(self, expected, **lookups):
+        self.assertEqual([item['asin'] for item in self.catalog.query(**lookups)],
+                         [record['asin'] for record in self.records if expected(record)])
+
+    def test_equality(self):
+        brand = self.records[0]['item_attributes']['brand']
+        self.assertQuery(lambda r: r['item_attributes']['brand'] == brand, item_attributes__brand=brand)
+        self.assertQuery(lambda r: r['item_attributes']['brand'] != brand, item_attributes__brand__ne=brand)
+
+    def test_range(self):
+        self.assertQuery(lambda r: r['sales_rank'] <= 100000, sales_rank__lte=100000)
+        self.assertQuery(lambda r: 2 <= r['total_offers'] < 5, total_offers__gte=2, total_offers__lt=5)
+
+    def test_prices_in_minor_units(self):
+        def cheap(record):
+            price = record['offer_summary'].get('lowest_new_price')
+            return price is not None and price.amount < 5000
+
+        self.assertQuery(cheap, offer_summary__lowest_new_price__lt=5000)
+        self.assertQuery(cheap, offer_summary__lowest_new_price__lt=Money(5000, 'USD'))
+
+    def test_combined_lookups_on_lists(self):
+        def match(record):
+            return (any(offer['offer_listing'].get('is_eligible_for_prime') for offer in record.get('offers', ())) and
+                    any(offer.get('merchant_name') == 'Merchant 1' for offer in record.get('offers', ())) and
+                    record['total_offers'] >= 3)
+
+        self.assertQuery(match, offers__offer_listing__is_eligible_for_prime=True,
+                         offers__merchant_name='Merchant 1', total_offers__gte=3)
+
+    def test_parser_items_match_records(self):
+        items = Catalog()
+        for content in self.contents:
+            items.add_items(ItemLookupResponse(etree.fromstring(content), CatalogItem).items.item_list())
+        for name in DEFAULT_CATEGORICAL + DEFAULT_NUMERIC:
+            self.assertEqual(items._columns[name], self.catalog._columns[name], name)
+        self.assertEqual(items.count(offer_summary__lowest_new_price__lt=10000),
+                         self.catalog.count(offer_summary__lowest_new_price__lt=10000))
+
+    def test_replace(self):
+        record = dict(self.records[0], sales_rank=1)
+        self.catalog.add(record)
+        self.assertEqual(len(self.catalog), len(self.records))
+        self.assertIs(self.catalog.get(record['asin']), record)
+        self.assertEqual(self.catalog.query(sales_rank=1), [record])
+        self.assertEqual(sum(self.catalog.facets('item_attributes__product_group').values()), len(self.records))
+
+    def test_invalid_lookups(self):
+        self.assertRaises(ValueError, self.catalog.query, item_attributes__title='x')
+        self.assertRaises(ValueError, self.catalog.query, item_attributes__brand__gt='a')
+        self.assertRaises(ValueError, self.catalog.query, sales_rank__contains=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from aws.cli import main
+from aws.mockserver import MockServer
+
+
+class LookupCommandTest(unittest.TestCase):
+
+    item_ids = ['B{:09d}'.format(i) for i in range(25)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input = os.path.join(self.directory, 'asins.txt')
+        self.output = os.path.join(self.directory, 'items.jsonl')
+        with open(self.input, 'w') as f:
+            f.write('\n'.join(['# asins'] + self.item_ids) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_lookup(self, server):
+        with server:
+            status = main(['lookup', self.input, '-o', self.output, '--marketplace', server.marketplace,
+                           '--access-key', server.access_key, '--secret-key', server.secret_key,
+                           '--associate-tag', 'tag', '--rate', '1000', '--concurrency', '2',
+                           '--progress-interval', '3600'])
+        self.assertEqual(status, 0)
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    def test_lookup(self):
+        lines = self.run_lookup(MockServer(invalid_ids=self.item_ids[:1]))
+        self.assertEqual(sorted(line['asin'] for line in lines if 'asin' in line), self.item_ids[1:])
+        self.assertEqual([line['error'] for line in lines if 'error' in line], ['AWS.InvalidParameterValue'])
+
+    def test_non_xml_response_is_written_as_an_error(self):
+        server = MockServer(bad_gateway_rate=1.0)
+        lines = self.run_lookup(server)
+        # every batch is written out instead of the first failure stopping the run.
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(sorted(x for line in lines for x in line['item_ids']), self.item_ids)
+        self.assertEqual(set(line['error'] for line in lines), {'XMLSyntaxError'})
+        self.assertEqual(server.stats()['bad_gateway'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
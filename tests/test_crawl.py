@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from aws import Lookup, config
+from aws.crawl import DONE, FAILED, CrawlQueue, run_worker
+from aws.mockserver import MockServer
+from aws.parsers import Item
+
+
+class CrawlQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'crawl.db')
+        self.queue = CrawlQueue(self.path, max_attempts=3)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.directory)
+
+    def test_add_is_idempotent(self):
+        item_ids = ['B{:09d}'.format(i) for i in range(25)]
+        self.assertEqual(self.queue.add(item_ids), 3)
+        self.assertEqual(self.queue.add(item_ids), 0)
+        self.assertEqual(self.queue.counts(), {'pending': 3})
+
+    def test_ack_stores_result(self):
+        self.queue.add(['B1', 'B2'])
+        batch, = self.queue.lease('w')
+        self.assertEqual(batch.item_ids, ['B1', 'B2'])
+        self.assertEqual(batch.attempts, 1)
+        self.assertTrue(self.queue.ack(batch, 'content', owner='w'))
+        self.assertEqual(self.queue.counts(), {DONE: 1})
+        self.assertEqual(list(self.queue.results()), [(['B1', 'B2'], 'content')])
+        self.assertEqual(self.queue.lease('w'), [])
+
+    def test_state_survives_reopen(self):
+        self.queue.add(['B1', 'B2', 'B3'], batch_size=1)
+        batch = self.queue.lease('w')[0]
+        self.queue.ack(batch, 'content', owner='w')
+        self.queue.close()
+        self.queue = CrawlQueue(self.path, max_attempts=3)
+        self.assertEqual(self.queue.counts(), {DONE: 1, 'pending': 2})
+        self.assertEqual([b.item_ids for b in self.queue.lease('w', count=5)], [['B2'], ['B3']])
+
+    def test_expired_lease_is_leased_again(self):
+        self.queue.add(['B1'])
+        first, = self.queue.lease('a', lease_seconds=0.05)
+        self.assertEqual(self.queue.lease('b'), [])
+        time.sleep(0.1)
+        second, = self.queue.lease('b')
+        self.assertEqual(second.attempts, 2)
+        # the first worker lost its lease, so it can't acknowledge the batch anymore.
+        self.assertFalse(self.queue.ack(first, 'stale', owner='a'))
+        self.assertTrue(self.queue.ack(second, 'fresh', owner='b'))
+        self.assertEqual(list(self.queue.results()), [(['B1'], 'fresh')])
+
+    def test_expired_lease_out_of_attempts_fails(self):
+        self.queue.add(['B1'])
+        for _ in range(3):
+            self.queue.lease('a', lease_seconds=0.01)
+            time.sleep(0.02)
+        self.assertEqual(self.queue.lease('a'), [])
+        self.assertEqual(self.queue.counts(), {FAILED: 1})
+
+    def test_partial_retry(self):
+        self.queue.add(['B1', 'B2', 'B3'])
+        batch, = self.queue.lease('w')
+        self.queue.ack(batch, 'content', ['B2'], owner='w')
+        retry, = self.queue.lease('w')
+        self.assertEqual(retry.item_ids, ['B2'])
+        self.assertEqual(retry.attempts, 2)
+
+    def test_retry_of_the_whole_batch_is_requeued_until_failed(self):
+        self.queue.add(['B1', 'B2'])
+        for attempt in range(1, 4):
+            batch, = self.queue.lease('w')
+            self.assertEqual((batch.item_ids, batch.attempts), (['B1', 'B2'], attempt))
+            self.assertTrue(self.queue.ack(batch, 'content', ['B1', 'B2'], owner='w'))
+        self.assertEqual(self.queue.counts(), {FAILED: 1})
+        self.assertEqual(self.queue.remaining(), 0)
+        self.assertEqual([batch.item_ids for batch, _ in self.queue.failed()], [['B1', 'B2']])
+
+    def test_fail_and_release(self):
+        self.queue.add(['B1'])
+        batch, = self.queue.lease('w')
+        self.assertTrue(self.queue.release(batch, owner='w'))
+        batch, = self.queue.lease('w')
+        self.assertEqual(batch.attempts, 1)
+        for _ in range(3):
+            self.queue.fail(batch, 'boom', owner='w')
+            leased = self.queue.lease('w')
+            if leased:
+                batch, = leased
+        self.assertEqual(self.queue.failed()[0][1], 'boom')
+        self.assertEqual(self.queue.retry_failed(), 1)
+        self.assertEqual(self.queue.lease('w')[0].attempts, 1)
+
+
+class RunWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+        self.directory = tempfile.mkdtemp()
+        self.queue = CrawlQueue(os.path.join(self.directory, 'crawl.db'), max_attempts=2)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.directory)
+
+    def test_crawl(self):
+        item_ids = ['B{:09d}'.format(i) for i in range(45)]
+        self.queue.add(item_ids)
+        with MockServer(invalid_ids=item_ids[:3]) as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace)
+            self.assertEqual(run_worker(self.queue, lookup, parser=Item, poll_interval=0.01), 5)
+        self.assertEqual(self.queue.counts(), {DONE: 5})
+        self.assertEqual(sorted(x for ids, _ in self.queue.results() for x in ids), item_ids)
+
+    def test_handle_error_fails_the_batch(self):
+        self.queue.add(['B000000001'])
+
+        def handle(batch, content):
+            raise ValueError('bad content')
+
+        with MockServer() as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace)
+            self.assertEqual(run_worker(self.queue, lookup, parser=Item, handle=handle, poll_interval=0.01), 0)
+        (batch, error), = self.queue.failed()
+        self.assertEqual(batch.attempts, 2)
+        self.assertIn('bad content', error)
+
+
+if __name__ == '__main__':
+    unittest.main()
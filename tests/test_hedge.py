@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+
+from aws import Lookup, config
+from aws.hedge import Hedger
+from aws.mockserver import MockServer
+from aws.parsers import Item
+from aws.throttle import RateLimiter
+
+
+class HedgerTest(unittest.TestCase):
+
+    def hedger(self):
+        hedger = Hedger(percentile=50, budget=1, min_samples=3, min_delay=0.01)
+        for _ in range(3):
+            hedger.record(0.02)
+        return hedger
+
+    def test_duplicate_wins_when_the_request_is_slow(self):
+        hedger = self.hedger()
+        calls = []
+
+        def send():
+            calls.append(None)
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return 'slow'
+            return 'fast'
+
+        self.assertEqual(hedger.do(send), 'fast')
+        self.assertEqual(hedger.state()['hedges'], 1)
+        self.assertEqual(hedger.state()['hedge_wins'], 1)
+
+    def test_no_history_no_duplicate(self):
+        hedger = Hedger(min_samples=3)
+        self.assertIsNone(hedger.delay())
+        self.assertEqual(hedger.do(lambda: 'response'), 'response')
+        self.assertEqual(hedger.state()['hedges'], 0)
+
+    def test_error_raised_when_every_attempt_fails(self):
+        hedger = self.hedger()
+
+        def send():
+            time.sleep(0.05)
+            raise ValueError('boom')
+
+        self.assertRaises(ValueError, hedger.do, send)
+
+
+class LookupHedgingTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def test_limiter_wait_is_not_latency(self):
+        # 4 threads queue on a limiter of 5 requests per second, so most calls wait longer on the limiter
+        # than on the server. Only the server latency may count towards the hedging delay.
+        hedger = Hedger(percentile=95, budget=0.05, min_samples=5)
+        with MockServer(latency=0.1) as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace,
+                            limiter=RateLimiter(5), hedger=hedger)
+
+            def work():
+                for i in range(4):
+                    lookup.item_lookup(['B{:09d}'.format(i)], parser=Item)
+
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            stats = server.stats()
+        self.assertLess(hedger.delay(), 0.3)
+        self.assertEqual(hedger.state()['hedges'], 0)
+        self.assertEqual(stats['requests'], 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
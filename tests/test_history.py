@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from aws.history import HistoryStore, decode_deltas, encode_deltas
+from aws.mockserver import MockServer
+from aws.parsers import Item, OfferSummary, SalesRank
+
+
+class HistoryItem(Item, SalesRank, OfferSummary):
+    pass
+
+
+class DeltaEncodingTest(unittest.TestCase):
+
+    def assertRoundTrip(self, values, start=0):
+        buf = bytearray()
+        encode_deltas(values, buf, start)
+        out = array('l')
+        self.assertEqual(decode_deltas(buf, 0, len(values), out, start), len(buf))
+        self.assertEqual(out.tolist(), values)
+        return buf
+
+    def test_round_trip(self):
+        self.assertRoundTrip([1999, 1999, 2049, 1899, 0, -150, -150, 2 ** 62, -2 ** 62])
+
+    def test_small_deltas_take_one_byte(self):
+        self.assertEqual(len(self.assertRoundTrip([1500000000, 1500000010, 1500000001], start=1500000000)), 3)
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.bin')
+        self.history = HistoryStore(self.path, block_size=4, flush_interval=None)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self, **kwargs):
+        self.history.close()
+        self.history = HistoryStore(self.path, block_size=4, **kwargs)
+        return self.history
+
+    def add(self, points, asin='B1', name='sales_rank'):
+        for timestamp, value in points:
+            self.history.add(asin, name, timestamp, value)
+
+    def assertSeries(self, points, asin='B1', name='sales_rank', **kwargs):
+        timestamps, values = self.history.series(asin, name, **kwargs)
+        self.assertEqual(zip(timestamps, values), points)
+
+    def test_reopen_after_flush(self):
+        points = [(1000 + i * 60, 500 - i * i) for i in range(10)]
+        self.add(points)
+        self.add(points[:3], asin='B2')
+        self.history.flush()
+        self.reopen()
+        self.assertSeries(points)
+        self.assertSeries(points[:3], asin='B2')
+        self.assertSeries(points[2:7], start=points[2][0], end=points[6][0])
+        self.assertEqual(self.history.latest('B1', 'sales_rank'), points[-1])
+        self.assertEqual(self.history.asins(), ['B1', 'B2'])
+        # points of a reopened series continue its blocks.
+        self.add([(5000, 1)])
+        self.assertRaises(ValueError, self.history.add, 'B1', 'sales_rank', 4000, 1)
+        self.assertSeries(points + [(5000, 1)])
+
+    def test_series_name_is_written_once(self):
+        sizes = []
+        for i in range(5):
+            self.add([(1500000000 + i * 3600, 1999 + i)], name='offer_summary__lowest_new_price')
+            self.history.flush()
+            sizes.append(os.path.getsize(self.path))
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        self.assertEqual(content.count('offer_summary__lowest_new_price'), 1)
+        # a tail block of a single point costs a few bytes of header and its point.
+        self.assertTrue(all(b - a <= 14 for a, b in zip(sizes, sizes[1:])), sizes)
+
+    def test_partial_record_is_dropped(self):
+        self.add([(1000, 1), (1001, 2)])
+        self.history.flush()
+        self.history.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write('B\x00\x05\x90')
+        self.history = HistoryStore(self.path, block_size=4)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertSeries([(1000, 1), (1001, 2)])
+
+    def test_corrupt_record_is_not_dropped(self):
+        self.add([(1000, 1), (1001, 2)])
+        self.history.flush()
+        self.add([(1002, 3)])
+        self.history.close()
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        # the block of the first flush, followed by the block of the second one.
+        offset = content.index('B', content.index('sales_rank'))
+        with open(self.path, 'r+b') as f:
+            f.seek(offset)
+            f.write('X')
+        self.assertRaises(ValueError, HistoryStore, self.path, block_size=4)
+        # the records after the corrupt one are kept.
+        self.assertEqual(os.path.getsize(self.path), len(content))
+        with open(self.path, 'r+b') as f:
+            f.seek(offset)
+            f.write('B')
+        self.history = HistoryStore(self.path, block_size=4)
+        self.assertSeries([(1000, 1), (1001, 2), (1002, 3)])
+
+    def test_compact_merges_tail_blocks(self):
+        points = [(1000 + i, i % 3) for i in range(10)]
+        for point in points:
+            self.add([point])
+            self.add([point], asin='B2')
+            self.history.flush()
+        size = os.path.getsize(self.path)
+        self.history.compact()
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertEqual([len(self.history._series[asin, 'sales_rank'].blocks) for asin in ('B1', 'B2')], [3, 3])
+        self.assertSeries(points)
+        self.reopen()
+        self.assertSeries(points)
+        self.assertSeries(points, asin='B2')
+
+    def test_add_records_flushes_after_interval(self):
+        content = MockServer().item_lookup({'ItemId': 'B000000001,B000000002',
+                                            'ResponseGroup': 'SalesRank,OfferSummary'})
+        self.reopen(flush_interval=0)
+        self.assertGreater(self.history.add_response(content, HistoryItem, timestamp=1000), 0)
+        other = HistoryStore(self.path)
+        try:
+            self.assertEqual(other.asins(), ['B000000001', 'B000000002'])
+            self.assertEqual(other.latest('B000000001', 'sales_rank'),
+                             self.history.latest('B000000001', 'sales_rank'))
+        finally:
+            other._file.close()
+
+    def test_not_a_history_file(self):
+        path = os.path.join(self.directory, 'other.bin')
+        with open(path, 'wb') as f:
+            f.write('not a history file')
+        self.assertRaises(ValueError, HistoryStore, path)
+
+
+if __name__ == '__main__':
+    unittest.main()
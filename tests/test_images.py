@@ -0,0 +1,103 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from aws.images import ImageFetcher
+
+
+class FakeResponse(object):
+
+    def __init__(self, url, content, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('{} for {}'.format(self.status_code, self.url))
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """
+    Serves images from a dict of url -> content. Missing urls are 404s, urls mapped to an exception raise it.
+    """
+
+    def __init__(self, images):
+        self.images = images
+        self.requested = []
+
+    def get(self, url, stream=False, timeout=None):
+        self.requested.append(url)
+        content = self.images.get(url)
+        if isinstance(content, Exception):
+            raise content
+        if content is None:
+            return FakeResponse(url, '', 404)
+        return FakeResponse(url, content)
+
+
+class ImageFetcherTest(unittest.TestCase):
+
+    images = {
+        'https://images.example.com/a.jpg': 'a' * 100000,
+        'https://images.example.com/a-copy.jpg': 'a' * 100000,
+        'https://images.example.com/b.jpg': 'b' * 10,
+        'https://images.example.com/refused.jpg': requests.ConnectionError('connection refused'),
+    }
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.session = FakeSession(self.images)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fetcher(self):
+        return ImageFetcher(self.directory, workers=2, session=self.session, chunk_size=4096)
+
+    def part_files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.part')]
+
+    def test_already_downloaded_images_are_skipped(self):
+        urls = ['https://images.example.com/a.jpg', 'https://images.example.com/a-copy.jpg',
+                'https://images.example.com/b.jpg']
+        paths = self.fetcher().fetch(urls + urls[:1])
+        self.assertEqual(sorted(paths), sorted(urls))
+        self.assertEqual(paths[urls[0]], paths[urls[1]])
+        with open(paths[urls[2]]) as f:
+            self.assertEqual(f.read(), 'b' * 10)
+        self.assertEqual(sorted(self.session.requested), sorted(urls))
+        # the manifest is read back, so nothing is downloaded again.
+        self.assertEqual(self.fetcher().fetch(urls), paths)
+        self.assertEqual(len(self.session.requested), 3)
+
+    def test_failed_downloads_are_left_out(self):
+        urls = ['https://images.example.com/refused.jpg', 'https://images.example.com/missing.jpg',
+                'https://images.example.com/b.jpg']
+        self.assertEqual(list(self.fetcher().fetch(urls)), urls[2:])
+        self.assertEqual(self.part_files(), [])
+
+    def test_file_system_error_is_a_failed_download(self):
+        # a file in place of the directory of the image makes os.makedirs raise ENOTDIR.
+        digest = hashlib.sha1('a' * 100000).hexdigest()
+        open(os.path.join(self.directory, digest[:2]), 'w').close()
+        urls = ['https://images.example.com/a.jpg', 'https://images.example.com/b.jpg']
+        fetcher = self.fetcher()
+        self.assertEqual(list(fetcher.fetch(urls)), urls[1:])
+        self.assertEqual(self.part_files(), [])
+        self.assertNotIn(urls[0], fetcher.manifest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_NEW_MODULES = ('import json, sys; before = set(sys.modules); {}; '
+                'print(json.dumps(sorted(set(sys.modules) - before)))')
+
+
+class ImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.response_dir = os.path.join(self.directory, 'xml-responses')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def new_modules(self, statement):
+        """
+        Run the statement in a new interpreter.
+        :return: Names of the modules it imported.
+        """
+        env = dict(os.environ, AWS_XML_RESPONSE_DIR=self.response_dir,
+                   PYTHONPATH=os.pathsep.join(x for x in (PACKAGE_PARENT, os.environ.get('PYTHONPATH')) if x))
+        output = subprocess.check_output([sys.executable, '-c', _NEW_MODULES.format(statement)], env=env)
+        return json.loads(output)
+
+    def assertNotImported(self, modules, *names):
+        imported = [x for x in modules if x.split('.')[0] in names]
+        self.assertEqual(imported, [])
+
+    def test_import_is_lazy(self):
+        modules = self.new_modules('import aws')
+        self.assertNotImported(modules, 'requests', 'lxml')
+        self.assertNotIn('aws.aws_', modules)
+        self.assertFalse(os.path.exists(self.response_dir))
+
+    def test_client_does_not_create_the_response_dir(self):
+        modules = self.new_modules('from aws import Lookup')
+        self.assertIn('aws.aws_', modules)
+        self.assertFalse(os.path.exists(self.response_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from aws import Lookup, config
+from aws.family import FamilyIndex, FamilyParser
+from aws.identifiers import IdentifierIndex
+from aws.mockserver import MockServer
+from aws.negative import NegativeCache
+from aws.parsers import Item, SalesRank, combined_parser
+from aws.parsers.lookup import target
+from aws.parsers.lookup.target import Field, Record, record_fields_for
+
+
+ItemRecordTarget = target.ItemRecordTarget
+
+
+class CountingTarget(ItemRecordTarget):
+
+    count = 0
+
+    def __init__(self, schema):
+        CountingTarget.count += 1
+        ItemRecordTarget.__init__(self, schema)
+
+
+class RankedItem(Item, SalesRank):
+    pass
+
+
+class CodesParser(Item):
+
+    record_fields = (
+        Record('ItemAttributes', 'item_attributes', (Field('Title', 'title'), Field('UPC', 'upc'))),
+    )
+
+
+class CombinedParserTest(unittest.TestCase):
+
+    def test_records_of_the_same_name_are_merged(self):
+        psr_cls = combined_parser(CodesParser, RankedItem)
+        self.assertIs(combined_parser(CodesParser, RankedItem), psr_cls)
+        self.assertEqual(sorted(field.name for field in record_fields_for(psr_cls)),
+                         ['asin', 'item_attributes', 'parent_asin', 'sales_rank'])
+        fields = dict((field.name, field) for field in record_fields_for(combined_parser(CodesParser, FamilyParser)))
+        self.assertEqual(sorted(fields), ['asin', 'browse_node_ids', 'item_attributes', 'parent_asin'])
+        names = [field.name for field in fields['item_attributes'].fields]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertTrue({'upc', 'upc_list', 'title', 'brand'}.issubset(names))
+
+
+class LookupObserversTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+        CountingTarget.count = 0
+        target.ItemRecordTarget = CountingTarget
+
+    def tearDown(self):
+        target.ItemRecordTarget = ItemRecordTarget
+
+    def test_response_is_parsed_once_for_every_index(self):
+        families = FamilyIndex()
+        identifiers = IdentifierIndex()
+        invalid = NegativeCache(reprobe_rate=0)
+        with MockServer(invalid_ids=['B000000009']) as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace,
+                            family_index=families, identifier_index=identifiers, negative_cache=invalid)
+            lookup.item_lookup(['B000000001', 'B000000002', 'B000000009'], parser=FamilyParser)
+        self.assertEqual(CountingTarget.count, 1)
+        self.assertEqual(families.family('B000000001'), ['B000000001', 'B000000002'])
+        self.assertEqual(families.family_record('B000000002')['item_attributes']['brand'], 'Brand 01')
+        self.assertEqual(len(identifiers), 4)
+        self.assertIn('B000000009', invalid)
+
+    def test_family_fields_are_only_stored_when_returned(self):
+        families = FamilyIndex()
+        with MockServer() as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace,
+                            family_index=families)
+            lookup.item_lookup(['B000000001'], parser=RankedItem)
+        self.assertEqual(CountingTarget.count, 1)
+        self.assertEqual(families.parent('B000000001'), 'P000000000')
+        self.assertIsNone(families.family_record('B000000001'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from lxml import etree
+
+from aws import Lookup, config
+from aws.mockserver import MockServer, expand_response_groups
+from aws.parsers import Item, ItemLookupResponse, Small, parse_item_records, response_groups_for
+
+
+class SmallItem(Small, Item):
+    pass
+
+
+def lookup_records(server, item_ids, response_groups, psr_cls=SmallItem):
+    content = server.item_lookup({'ItemId': ','.join(item_ids), 'ResponseGroup': ','.join(response_groups)})
+    return parse_item_records(content, psr_cls)
+
+
+class ResponseGroupsTest(unittest.TestCase):
+
+    def test_small_does_not_include_item_attributes(self):
+        self.assertEqual(expand_response_groups(['Small']), {'Small'})
+        self.assertIn('ItemAttributes', expand_response_groups(['Medium']))
+        self.assertIn('Offers', expand_response_groups(['Large']))
+
+    def test_small_returns_partial_item_attributes(self):
+        record, = lookup_records(MockServer(), ['B00FRIQEDW'], ['Small'])
+        attributes = record['item_attributes']
+        self.assertEqual(attributes['product_group'], 'Toy')
+        self.assertTrue(attributes['title'])
+        self.assertTrue(attributes['manufacturer'])
+        for name in ('brand', 'upc', 'ean', 'list_price'):
+            self.assertNotIn(name, attributes)
+
+    def test_derived_response_groups_return_every_attribute(self):
+        groups = response_groups_for(SmallItem)
+        self.assertEqual(set(groups), {'Small', 'ItemAttributes'})
+        record, = lookup_records(MockServer(), ['B00FRIQEDW'], groups)
+        for name in ('brand', 'upc', 'ean', 'list_price'):
+            self.assertIn(name, record['item_attributes'])
+
+
+class MockServerTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def test_item_lookup_round_trip(self):
+        with MockServer(invalid_ids=['B000000002']) as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace)
+            content = lookup.item_lookup(['B000000001', 'B000000002'], parser=SmallItem)
+            stats = server.stats()
+        response = ItemLookupResponse(etree.fromstring(content), SmallItem)
+        self.assertEqual([item.asin for item in response.items.item_list()], ['B000000001'])
+        self.assertEqual(response.item_outcomes(), {'B000000001': 'found', 'B000000002': 'invalid'})
+        self.assertEqual(stats['requests'], 1)
+
+    def test_rejects_bad_signature(self):
+        with MockServer() as server:
+            lookup = Lookup('tag', server.access_key, 'wrong-secret', marketplace=server.marketplace)
+            content = lookup.item_lookup(['B000000001'], parser=SmallItem)
+            self.assertEqual(server.stats()['rejected'], 1)
+        self.assertIn('SignatureDoesNotMatch', content)
+
+    def test_stop_without_start(self):
+        MockServer().stop()
+
+    def test_item_lookup_does_not_listen(self):
+        server = MockServer()
+        self.assertTrue(server.item_lookup({'ItemId': 'B000000001'}))
+        self.assertIsNone(server._server)
+        with server:
+            self.assertTrue(server.address[1])
+        self.assertIsNone(server._server)
+
+
+if __name__ == '__main__':
+    unittest.main()
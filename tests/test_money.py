@@ -0,0 +1,43 @@
+import unittest
+
+from aws.parsers.money import Money, amounts
+
+
+class MoneyTest(unittest.TestCase):
+
+    def test_multiply_rounds_to_minor_units(self):
+        self.assertEqual(Money(1999, 'USD') * 0.9, Money(1799, 'USD'))
+        self.assertEqual(0.5 * Money(-3, 'USD'), Money(-2, 'USD'))
+        self.assertEqual(Money(1999, 'USD') * 3, Money(5997, 'USD'))
+        self.assertIsInstance((Money(1999, 'USD') * 1.1).amount, int)
+        self.assertRaises(TypeError, lambda: Money(1999, 'USD') * Money(2, 'USD'))
+
+    def test_amounts_of_multiplied_prices(self):
+        prices = [Money(1999, 'USD') * 0.85, None, Money(500, 'USD')]
+        self.assertEqual(amounts(prices), (amounts([Money(1699, 'USD'), Money(500, 'USD')])[0], 'USD'))
+        self.assertRaises(ValueError, amounts, [Money(1, 'USD'), Money(1, 'EUR')])
+
+    def test_amounts_are_64_bit(self):
+        packed, _ = amounts([Money(2 ** 40, 'USD'), Money(-1, 'USD')])
+        self.assertEqual(packed.itemsize, 8)
+        self.assertEqual(list(packed), [2 ** 40, -1])
+
+    def test_compare(self):
+        self.assertLess(Money(1, 'USD'), Money(2, 'USD'))
+        self.assertEqual(sorted([Money(3, 'USD'), Money(1, 'USD')]), [Money(1, 'USD'), Money(3, 'USD')])
+        self.assertRaises(ValueError, lambda: Money(1, 'USD') < Money(2, 'EUR'))
+        # comparing with something else falls back to the default instead of raising AttributeError.
+        self.assertFalse(Money(1, 'USD') == 1)
+        self.assertIsNotNone(max([None, Money(1, 'USD')]))
+
+    def test_zero_amount_is_true(self):
+        # only a missing price (None) is false.
+        self.assertTrue(Money(0, 'USD'))
+
+    def test_str(self):
+        self.assertEqual(str(Money(1999, 'USD')), '19.99 USD')
+        self.assertEqual(str(Money(1999, 'JPY')), '1999 JPY')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import time
+import unittest
+
+from lxml import etree
+
+from aws import Lookup, config
+from aws.mockserver import MockServer, error_response
+from aws.negative import NegativeCache
+from aws.parsers import Item, ItemLookupResponse
+from aws.parsers.lookup.base import THROTTLED_ERROR_CODE
+
+ITEM_ERRORS_RESPONSE = (
+    '<?xml version="1.0" ?>\n<ItemLookupResponse xmlns="http://webservices.amazon.com/AWSECommerceService/2011-08-01">'
+    '<Items><Request><IsValid>True</IsValid><ItemLookupRequest><ItemId>B000000001</ItemId>'
+    '<ItemId>B000000002</ItemId></ItemLookupRequest><Errors>'
+    '<Error><Code>{}</Code><Message>B000000001 was throttled.</Message></Error>'
+    '<Error><Code>AWS.InvalidParameterValue</Code><Message>B000000002 is not a valid value for ItemId.</Message></Error>'
+    '</Errors></Request></Items></ItemLookupResponse>').format(THROTTLED_ERROR_CODE)
+
+
+class NegativeCacheTest(unittest.TestCase):
+
+    def test_invalid_item_ids_are_cached(self):
+        cache = NegativeCache()
+        content = MockServer(invalid_ids=['B000000002']).item_lookup({'ItemId': 'B000000001,B000000002'})
+        self.assertEqual(cache.observe(content, ['B000000001', 'B000000002']), ['B000000002'])
+        self.assertIn('B000000002', cache)
+        self.assertNotIn('B000000001', cache)
+
+    def test_throttled_item_ids_are_never_cached(self):
+        cache = NegativeCache()
+        self.assertEqual(cache.observe(ITEM_ERRORS_RESPONSE, ['B000000001', 'B000000002']), ['B000000002'])
+        self.assertNotIn('B000000001', cache)
+        # a request which was throttled entirely.
+        content = error_response('ItemLookup', THROTTLED_ERROR_CODE, 'B000000003 You are submitting requests too quickly.')
+        self.assertEqual(cache.observe(content, ['B000000003']), [])
+        self.assertEqual(len(cache), 1)
+
+    def test_found_item_ids_are_removed(self):
+        cache = NegativeCache()
+        cache.add('B000000001')
+        cache.observe(MockServer().item_lookup({'ItemId': 'B000000001'}), ['B000000001'])
+        self.assertNotIn('B000000001', cache)
+
+    def test_ttl_expiry(self):
+        cache = NegativeCache(ttl=3600, reprobe_rate=0)
+        cache.add('B000000001')
+        cache.add('B000000002', ttl=-1)
+        self.assertIn('B000000001', cache)
+        self.assertNotIn('B000000002', cache)
+        self.assertGreater(cache.expires('B000000001'), time.time() + 3500)
+        self.assertEqual(list(cache.filter(['B000000001', 'B000000002'])), ['B000000002'])
+        # the expired item id was removed by filter.
+        self.assertIsNone(cache.expires('B000000002'))
+        cache.add('B000000003', ttl=-1)
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_reprobe_rate(self):
+        item_ids = ['B{:09d}'.format(i) for i in range(1000)]
+        for rate in (0, 1):
+            cache = NegativeCache(reprobe_rate=rate)
+            for item_id in item_ids:
+                cache.add(item_id)
+            self.assertEqual(len(list(cache.filter(item_ids))), rate * len(item_ids))
+        cache = NegativeCache(reprobe_rate=0.1, seed=1)
+        for item_id in item_ids:
+            cache.add(item_id)
+        reprobed = list(cache.filter(item_ids))
+        self.assertTrue(50 < len(reprobed) < 150, len(reprobed))
+        self.assertEqual((cache.reprobed, cache.skipped), (len(reprobed), len(item_ids) - len(reprobed)))
+        # reprobed item ids are kept by a second filter until their response is observed.
+        self.assertEqual(list(cache.filter(reprobed)), reprobed)
+        cache.observe(MockServer(invalid_ids=reprobed).item_lookup({'ItemId': ','.join(reprobed[:10])}), reprobed[:10])
+        self.assertEqual(list(cache.filter(reprobed[:10])), [])
+
+
+class LookupNegativeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def test_item_lookup_drops_cached_item_ids(self):
+        cache = NegativeCache(reprobe_rate=0)
+        cache.add('B000000002')
+        cache.add('B000000003')
+        with MockServer() as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace,
+                            negative_cache=cache)
+            content = lookup.item_lookup(['B000000001', 'B000000002'], parser=Item)
+            outcomes = ItemLookupResponse(etree.fromstring(content), Item).items.item_outcomes()
+            self.assertEqual(outcomes.items(), [('B000000001', 'found')])
+            # nothing is sent when every item id is cached.
+            content = lookup.item_lookup(['B000000002', 'B000000003'], parser=Item)
+            self.assertEqual(ItemLookupResponse(etree.fromstring(content), Item).items.item_list(), [])
+            stats = server.stats()
+        self.assertEqual((stats['requests'], stats['items']), (1, 1))
+        self.assertEqual(cache.skipped, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from lxml import etree
+
+from aws.mockserver import MockServer, error_response
+from aws.parsers import FOUND, INVALID, MISSING, THROTTLED, Item, ItemLookupResponse, error_outcomes, retry_item_ids
+from aws.parsers.lookup.base import AWSError, THROTTLED_ERROR_CODE
+
+NAMESPACE = 'http://webservices.amazon.com/AWSECommerceService/2011-08-01'
+
+
+def lookup_response(item_ids, asins=(), errors=(), id_type=None):
+    """
+    ItemLookup response content.
+    :param item_ids: Requested item ids.
+    :param asins: ASINs of the items which are returned.
+    :param errors: list of (code, message) of the Errors element.
+    :param id_type: (optional) IdType of the request.
+    """
+    return ''.join([
+        '<?xml version="1.0" ?>\n<ItemLookupResponse xmlns="{}"><Items><Request><IsValid>True</IsValid>'.format(NAMESPACE),
+        '<ItemLookupRequest>', '<IdType>{}</IdType>'.format(id_type) if id_type else '',
+        ''.join('<ItemId>{}</ItemId>'.format(item_id) for item_id in item_ids), '</ItemLookupRequest>',
+        '<Errors>{}</Errors>'.format(''.join('<Error><Code>{}</Code><Message>{}</Message></Error>'.format(*error)
+                                             for error in errors)) if errors else '',
+        '</Request>', ''.join('<Item><ASIN>{}</ASIN></Item>'.format(asin) for asin in asins),
+        '</Items></ItemLookupResponse>',
+    ])
+
+
+def item_outcomes(content):
+    return ItemLookupResponse(etree.fromstring(content), Item).items.item_outcomes()
+
+
+class ItemOutcomesTest(unittest.TestCase):
+
+    def test_outcomes(self):
+        content = lookup_response(
+            ['B000000001', 'B000000002', 'B000000003', 'B000000004'], asins=['B000000001'],
+            errors=[('AWS.InvalidParameterValue', 'B000000002 is not a valid value for ItemId. Please change this '
+                                                  'value and retry your request.'),
+                    (THROTTLED_ERROR_CODE, 'B000000003 was throttled.')])
+        outcomes = item_outcomes(content)
+        self.assertEqual(outcomes.items(), [('B000000001', FOUND), ('B000000002', INVALID),
+                                            ('B000000003', THROTTLED), ('B000000004', MISSING)])
+        # invalid item ids are never requested again.
+        self.assertEqual(retry_item_ids(outcomes), ['B000000003', 'B000000004'])
+
+    def test_one_error_for_several_item_ids(self):
+        content = lookup_response(['B000000001', 'B000000002', 'B000000003'], asins=['B000000003'],
+                                  errors=[('AWS.InvalidParameterValue',
+                                           'B000000001,B000000002 are not valid values for ItemId.')])
+        self.assertEqual(item_outcomes(content).values(), [INVALID, INVALID, FOUND])
+
+    def test_mock_server_response(self):
+        content = MockServer(invalid_ids=['B000000002']).item_lookup({'ItemId': 'B000000001,B000000002'})
+        outcomes = item_outcomes(content)
+        self.assertEqual(outcomes.items(), [('B000000001', FOUND), ('B000000002', INVALID)])
+        self.assertEqual(retry_item_ids(outcomes), [])
+
+    def test_other_id_types(self):
+        # returned items can't be matched back to UPCs, so every item id without an error is found.
+        content = lookup_response(['012345678905', '012345678912'], asins=['B000000001'], id_type='UPC',
+                                  errors=[('AWS.InvalidParameterValue', '012345678912 is not a valid value.')])
+        self.assertEqual(item_outcomes(content).values(), [FOUND, INVALID])
+
+    def test_error_outcomes(self):
+        item_ids = ['B000000001', 'B000000002']
+        for code, outcome in ((THROTTLED_ERROR_CODE, THROTTLED), ('InternalError', MISSING)):
+            content = error_response('ItemLookup', code, 'Request failed.')
+            with self.assertRaises(AWSError) as error:
+                item_outcomes(content)
+            outcomes = error_outcomes(item_ids, error.exception)
+            self.assertEqual(outcomes.items(), [(item_id, outcome) for item_id in item_ids])
+            self.assertEqual(retry_item_ids(outcomes), item_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from aws import Lookup, config
+from aws.mockserver import MockServer
+from aws.parsers import Item
+from aws.pool import LookupPool
+from aws.throttle import is_throttled
+
+CREDENTIALS = {'KEY1': 'secret-1', 'KEY2': 'secret-2', 'KEY3': 'secret-3'}
+
+
+class LookupPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def pool(self, server, rates, **kwargs):
+        pool = LookupPool([('tag', key, CREDENTIALS[key], rate) for key, rate in rates], marketplace=server.marketplace,
+                          **kwargs)
+        self.sent = []
+        for member in pool.members:
+            member.lookup.item_lookup = self.recording(member.lookup)
+        return pool
+
+    def recording(self, lookup):
+        def item_lookup(*args, **kwargs):
+            self.sent.append(lookup.access_key)
+            return Lookup.item_lookup(lookup, *args, **kwargs)
+        return item_lookup
+
+    def test_smooth_weighted_round_robin(self):
+        with MockServer(credentials=CREDENTIALS) as server:
+            pool = self.pool(server, [('KEY1', 100), ('KEY2', 200)])
+            for _ in range(6):
+                self.assertFalse(is_throttled(pool.item_lookup(['B000000001'], parser=Item)))
+        # twice as many requests for KEY2, interleaved instead of in bursts.
+        self.assertEqual(self.sent, ['KEY2', 'KEY1', 'KEY2'] * 2)
+
+    def test_sick_credentials_fail_over(self):
+        with MockServer(credentials=CREDENTIALS, throttled_keys=['KEY1']) as server:
+            pool = self.pool(server, [('KEY1', 100), ('KEY2', 100)], sick_after=2, sick_for=60)
+            for _ in range(6):
+                self.assertFalse(is_throttled(pool.item_lookup(['B000000001'], parser=Item)))
+            stats = server.stats()
+        # KEY1 is taken out of rotation after its second throttle, each throttled request is sent again with KEY2.
+        self.assertEqual(self.sent.count('KEY1'), 2)
+        self.assertEqual(self.sent.count('KEY2'), 6)
+        self.assertEqual(stats['throttled'], 2)
+        self.assertEqual([member.lookup.access_key for member in pool.healthy], ['KEY2'])
+
+    def test_every_member_throttled(self):
+        with MockServer(credentials=CREDENTIALS, throttled_keys=['KEY1', 'KEY2']) as server:
+            pool = self.pool(server, [('KEY1', 100), ('KEY2', 100)])
+            self.assertTrue(is_throttled(pool.item_lookup(['B000000001'], parser=Item)))
+        self.assertEqual(sorted(self.sent), ['KEY1', 'KEY2'])
+
+    def test_item_offers(self):
+        with MockServer(credentials=CREDENTIALS, offers_per_page=3) as server:
+            pool = self.pool(server, [('KEY1', 100), ('KEY3', 100)])
+            offers = pool.item_offers(['B000000001'])
+            lookup = Lookup('tag', 'KEY3', CREDENTIALS['KEY3'], marketplace=server.marketplace)
+            expected = lookup.item_offers(['B000000001'])
+        self.assertEqual([repr(offer) for offer in offers['B000000001']],
+                         [repr(offer) for offer in expected['B000000001']])
+        self.assertGreater(len(self.sent), 1)
+        self.assertEqual(set(self.sent), {'KEY1', 'KEY3'})
+
+
+if __name__ == '__main__':
+    unittest.main()
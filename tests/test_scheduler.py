@@ -0,0 +1,61 @@
+import unittest
+
+import requests
+
+from aws import Lookup, config
+from aws.mockserver import MockServer
+from aws.parsers import Item, SalesRank
+from aws.scheduler import RefreshScheduler
+
+
+class RankedItem(Item, SalesRank):
+    pass
+
+
+class FailingLookup(object):
+
+    limiter = None
+
+    def __init__(self, error=None, content=None):
+        self.error = error
+        self.content = content
+
+    def item_lookup(self, item_ids, response_groups=(), parser=None, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return self.content
+
+
+class RefreshSchedulerTest(unittest.TestCase):
+
+    asins = ['B{:09d}'.format(i) for i in range(12)]
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def assertRescheduled(self, lookup):
+        scheduler = RefreshScheduler(lookup, RankedItem, rate=1000, min_interval=60)
+        scheduler.add(self.asins)
+        self.assertEqual(scheduler.step(), [])
+        self.assertEqual(len(scheduler), len(self.asins))
+        # the failed batch is pushed back by min_interval, the rest of the items are still due.
+        self.assertEqual(scheduler.next_batch(wait=False), self.asins[10:] + self.asins[:8])
+
+    def test_request_error_reschedules_the_batch(self):
+        self.assertRescheduled(FailingLookup(error=requests.ConnectionError('connection refused')))
+
+    def test_invalid_xml_reschedules_the_batch(self):
+        self.assertRescheduled(FailingLookup(content='<html><body>502 Bad Gateway</body></html'))
+
+    def test_step(self):
+        with MockServer() as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace)
+            scheduler = RefreshScheduler(lookup, RankedItem, rate=1000, min_interval=60)
+            scheduler.add(self.asins)
+            changes = scheduler.step()
+        self.assertEqual(sorted(change.item.asin for change in changes), self.asins[:10])
+        self.assertEqual(len(scheduler), len(self.asins))
+
+
+if __name__ == '__main__':
+    unittest.main()
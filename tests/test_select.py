@@ -0,0 +1,75 @@
+import unittest
+
+from lxml import etree
+
+from aws.mockserver import MockServer
+from aws.parsers import Item, ItemAttributes, ItemLookupResponse, OfferFull, SalesRank
+from aws.parsers.money import Money
+
+
+class SelectItem(Item, ItemAttributes, OfferFull, SalesRank):
+    pass
+
+
+def lookup_items(item_ids):
+    content = MockServer(invalid_ids=item_ids[:1]).item_lookup(
+        {'ItemId': ','.join(item_ids), 'ResponseGroup': 'ItemAttributes,OfferFull,SalesRank'})
+    return ItemLookupResponse(etree.fromstring(content), SelectItem).items
+
+
+class SelectTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.responses = [lookup_items(['B{:09d}'.format(i * 10 + j) for j in range(10)]) for i in range(10)]
+
+    def assertSelect(self, expected, **lookups):
+        selected = [item.asin for items in self.responses for item in items.select(**lookups)]
+        filtered = [item.asin for items in self.responses for item in items.item_list() if expected(item)]
+        self.assertEqual(selected, filtered)
+        return selected
+
+    def test_numbers(self):
+        self.assertTrue(self.assertSelect(lambda i: i.offer_summary.total_new > 20, offer_summary__total_new__gt=20))
+        self.assertSelect(lambda i: 500000 <= i.sales_rank < 1500000, sales_rank__gte=500000, sales_rank__lt=1500000)
+
+    def test_text(self):
+        brand = self.responses[0].item_list()[0].item_attributes.brand
+        self.assertSelect(lambda i: i.item_attributes.brand == brand, item_attributes__brand=brand)
+        self.assertSelect(lambda i: i.item_attributes.brand != brand, item_attributes__brand__ne=brand)
+        self.assertSelect(lambda i: i.item_attributes.brand in ('Brand 01', 'Brand 02'),
+                          item_attributes__brand__in=['Brand 01', 'Brand 02'])
+        self.assertSelect(lambda i: '55' in i.item_attributes.title, item_attributes__title__contains='55')
+        self.assertSelect(lambda i: i.item_attributes.brand.startswith('Brand 0'),
+                          item_attributes__brand__startswith='Brand 0')
+
+    def test_prices(self):
+        def cheap(item):
+            price = item.offer_summary.lowest_new_price_money
+            return price is not None and price.amount <= 20000
+
+        self.assertTrue(self.assertSelect(cheap, offer_summary__lowest_new_price__lte=20000))
+        self.assertSelect(cheap, offer_summary__lowest_new_price__lte=Money(20000, 'USD'))
+        self.assertEqual(self.assertSelect(lambda i: False, offer_summary__lowest_new_price__lte=Money(20000, 'EUR')), [])
+
+    def test_lists_match_any_record(self):
+        def match(item):
+            return (any(offer.offer_listing.is_eligible_for_prime for offer in item.offers) and
+                    any(offer.merchant_name == 'Merchant 1' for offer in item.offers))
+
+        self.assertSelect(match, where={'offers__offer_listing__is_eligible_for_prime': True},
+                          offers__merchant_name='Merchant 1')
+        self.assertSelect(lambda i: not i.offers, offers__isnull=True)
+
+    def test_no_lookups(self):
+        self.assertSelect(lambda i: True)
+
+    def test_invalid_lookups(self):
+        items = self.responses[0]
+        self.assertRaises(ValueError, items.select, item_attributes__colour='red')
+        self.assertRaises(ValueError, items.select, offer_summary__lowest_new_price__contains=1)
+        self.assertRaises(ValueError, items.select, offers__offer_listing__is_eligible_for_prime__gt=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
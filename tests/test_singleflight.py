@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+
+from aws import Lookup, config
+from aws.mockserver import MockServer
+from aws.parsers import Item
+from aws.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.group = SingleFlight()
+        self.release = threading.Event()
+        self.calls = []
+        self.results = {}
+        self.threads = []
+
+    def fn(self, name, error=None):
+        def call():
+            self.calls.append(name)
+            self.release.wait(5)
+            if error is not None:
+                raise error
+            return name
+        return call
+
+    def start(self, name, key, item_ids, error=None):
+        def run():
+            try:
+                self.results[name] = self.group.do(key, item_ids, self.fn(name, error))
+            except Exception as e:
+                self.results[name] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+
+    def start_leader(self, error=None):
+        self.start('leader', 'Offers', ['B1', 'B2', 'B3'], error)
+        while not self.calls:
+            time.sleep(0.001)
+
+    def finish(self):
+        # give the other threads time to reach the group before the leader returns.
+        time.sleep(0.1)
+        self.release.set()
+        for thread in self.threads:
+            thread.join(5)
+
+    def test_covered_item_ids_wait_for_the_leader(self):
+        self.start_leader()
+        for i, item_ids in enumerate((['B1'], ['B2', 'B3'], ['B3', 'B1', 'B2'])):
+            self.start('waiter-{}'.format(i), 'Offers', item_ids)
+        # item ids which aren't all in flight and other parameters send their own request.
+        self.start('superset', 'Offers', ['B1', 'B4'])
+        self.start('other-key', 'SalesRank', ['B1'])
+        self.finish()
+        self.assertEqual(sorted(self.calls), ['leader', 'other-key', 'superset'])
+        self.assertEqual(self.results, {'leader': 'leader', 'waiter-0': 'leader', 'waiter-1': 'leader',
+                                        'waiter-2': 'leader', 'superset': 'superset', 'other-key': 'other-key'})
+        self.assertEqual(self.group.in_flight, 0)
+
+    def test_leader_error_reaches_every_waiter(self):
+        error = ValueError('request failed')
+        self.start_leader(error)
+        for i in range(3):
+            self.start('waiter-{}'.format(i), 'Offers', ['B{}'.format(i + 1)])
+        self.finish()
+        self.assertEqual(self.calls, ['leader'])
+        self.assertEqual(len(self.results), 4)
+        self.assertTrue(all(result is error for result in self.results.values()))
+        # the failed request isn't in flight anymore, the next one is sent.
+        self.assertEqual(self.group.do('Offers', ['B1'], lambda: 'retry'), 'retry')
+
+
+class CoalescedLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        config.configure(write_responses=False)
+
+    def test_concurrent_lookups_send_one_request(self):
+        item_ids = ['B000000001', 'B000000002', 'B000000003']
+        results = []
+        with MockServer(latency=0.3) as server:
+            lookup = Lookup('tag', server.access_key, server.secret_key, marketplace=server.marketplace,
+                            coalesce=True)
+            threads = [threading.Thread(target=lambda: results.append(lookup.item_lookup(item_ids, parser=Item)))]
+            threads[0].start()
+            while not lookup.single_flight.in_flight:
+                time.sleep(0.001)
+            for ids in (item_ids[:1], item_ids[1:], item_ids[::-1]):
+                threads.append(threading.Thread(
+                    target=lambda ids=ids: results.append(lookup.item_lookup(ids, parser=Item))))
+                threads[-1].start()
+            for thread in threads:
+                thread.join(5)
+            stats = server.stats()
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual((stats['requests'], stats['items']), (1, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
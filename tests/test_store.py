@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from aws.mockserver import MockServer
+from aws.parsers import Item, ItemAttributes, OfferFull, SalesRank, parse_item_records
+from aws.parsers.money import Money
+from aws.store import ItemStore, StoredRecord, encode_record
+
+
+class StoreItem(Item, ItemAttributes, OfferFull, SalesRank):
+    pass
+
+
+RECORD = {
+    'asin': 'B00FRIQEDW',
+    'sales_rank': 1234,
+    'rating': 4.5,
+    'is_adult_product': False,
+    'is_eligible_for_prime': True,
+    'parent_asin': None,
+    'item_attributes': {
+        'title': u'Caf\xe9 set',
+        'list_price': Money(2999, 'USD'),
+        'trade_in_value': Money(150, None),
+        'features': ['one', 'two'],
+    },
+    'offers': [{'merchant_name': 'Merchant 1', 'price': Money(-5, 'JPY')}, {}],
+}
+
+
+class EncodeRecordTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        buf = encode_record(RECORD)
+        record = StoredRecord(buf, 1)
+        expected = dict(RECORD, item_attributes=dict(RECORD['item_attributes'], title='Caf\xc3\xa9 set'))
+        self.assertEqual(record.to_dict(), expected)
+        self.assertEqual(record.keys(), sorted(RECORD))
+        self.assertEqual(record['offers'][-1].to_dict(), {})
+        self.assertEqual(record['item_attributes']['features'][1], 'two')
+
+    def test_money_without_currency_code(self):
+        money = StoredRecord(encode_record({'price': Money(150, None)}), 1)['price']
+        self.assertEqual((money.amount, money.currency_code), (150, None))
+
+    def test_unsupported_type(self):
+        self.assertRaises(TypeError, encode_record, {'asin': object()})
+
+
+class ItemStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'items.bin')
+        self.store = ItemStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self):
+        self.store.close()
+        self.store = ItemStore(self.path)
+
+    def test_reopen(self):
+        self.store.append(RECORD)
+        self.store.append({'asin': 'B2', 'sales_rank': 1})
+        self.reopen()
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store['B00FRIQEDW']['item_attributes']['list_price'], Money(2999, 'USD'))
+        self.assertEqual(self.store['B2'].to_dict(), {'asin': 'B2', 'sales_rank': 1})
+        self.assertIsNone(self.store.get('B3'))
+        self.assertRaises(KeyError, self.store.__getitem__, 'B3')
+
+    def test_latest_record_wins(self):
+        self.store.append({'asin': 'B1', 'sales_rank': 1})
+        record = self.store['B1']
+        self.store.append({'asin': 'B1', 'sales_rank': 2})
+        self.assertEqual(self.store['B1']['sales_rank'], 2)
+        # records which were already read still point into the previous mapping.
+        self.assertEqual(record['sales_rank'], 1)
+        self.reopen()
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store['B1']['sales_rank'], 2)
+
+    def test_records_can_not_be_used_once_closed(self):
+        self.store.append(RECORD)
+        record = self.store['B00FRIQEDW']
+        offers = record['offers']
+        item = record.to_dict()
+        # record now points into a previous mapping, which isn't the one unmapped by close.
+        self.store.append({'asin': 'B2', 'sales_rank': 1})
+        other = self.store['B2']
+        self.store.close()
+        self.assertRaisesRegexp(ValueError, 'is closed', record.__getitem__, 'sales_rank')
+        self.assertRaisesRegexp(ValueError, 'is closed', record.to_dict)
+        self.assertRaisesRegexp(ValueError, 'is closed', list, offers)
+        self.assertRaisesRegexp(ValueError, 'is closed', other.get, 'sales_rank')
+        self.assertEqual(item['item_attributes']['list_price'], Money(2999, 'USD'))
+
+    def test_index_entry_without_record_is_skipped(self):
+        self.store.append({'asin': 'B1', 'sales_rank': 1})
+        self.store.close()
+        with open(self.path + '.idx', 'ab') as f:
+            f.write('B2'.ljust(10, '\0') + '\xff' * 8)
+        self.store = ItemStore(self.path)
+        self.assertEqual(self.store.asins(), ['B1'])
+
+    def test_append_response(self):
+        content = MockServer().item_lookup({'ItemId': 'B000000001,B000000002',
+                                            'ResponseGroup': 'ItemAttributes,OfferFull,SalesRank'})
+        records = parse_item_records(content, StoreItem)
+        self.assertEqual(self.store.append_response(content, StoreItem), ['B000000001', 'B000000002'])
+        self.reopen()
+        for record in records:
+            self.assertEqual(self.store[record['asin']].to_dict(), record)
+
+
+if __name__ == '__main__':
+    unittest.main()
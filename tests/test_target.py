@@ -0,0 +1,152 @@
+import unittest
+
+from lxml import etree
+
+from aws.mockserver import MockServer, error_response
+from aws.parsers import (BrowseNodes, Item, ItemAttributes, ItemLookupResponse, OfferFull, SalesRank,
+                         parse_item_records)
+from aws.parsers.lookup.base import AWSError, THROTTLED_ERROR_CODE
+from aws.parsers.lookup.target import ListField, MoneyField, Record, RecordList, record_fields_for
+from aws.parsers.money import Money
+
+
+class TargetItem(Item, ItemAttributes, OfferFull, SalesRank, BrowseNodes):
+    pass
+
+
+NAMESPACE = 'http://webservices.amazon.com/AWSECommerceService/2011-08-01'
+
+# Lists nested in wrapper elements, blank list elements, items without most of their elements and prices
+# without an amount or a currency code, which the mock server never returns.
+RESPONSE = '''<?xml version="1.0" ?>
+<ItemLookupResponse xmlns="{}">
+<OperationRequest><RequestId>1</RequestId></OperationRequest>
+<Items><Request><IsValid>True</IsValid><ItemLookupRequest>
+<ItemId>B000000001</ItemId><ItemId>B000000002</ItemId><ItemId>B000000003</ItemId></ItemLookupRequest></Request>
+<Item><ASIN>B000000001</ASIN><SalesRank>12</SalesRank>
+<ItemAttributes>
+<Title>First</Title>
+<Feature>one</Feature><Feature>  </Feature><Feature> two </Feature>
+<UPCList><UPCListElement>012345678905</UPCListElement><UPCListElement> </UPCListElement>
+<UPCListElement>012345678912</UPCListElement></UPCList>
+<CatalogNumberList><Wrapper><CatalogNumberListElement>C-1</CatalogNumberListElement></Wrapper>
+<CatalogNumberListElement>C-2</CatalogNumberListElement></CatalogNumberList>
+<ListPrice><Amount>1999</Amount><CurrencyCode>USD</CurrencyCode><FormattedPrice>$19.99</FormattedPrice></ListPrice>
+<ItemDimensions><Height Units="inches">3</Height></ItemDimensions>
+</ItemAttributes>
+<OfferSummary>
+<LowestNewPrice><Amount>1500</Amount><CurrencyCode>JPY</CurrencyCode></LowestNewPrice>
+<LowestUsedPrice><Amount></Amount><CurrencyCode>USD</CurrencyCode></LowestUsedPrice>
+<LowestCollectiblePrice><Amount>500</Amount></LowestCollectiblePrice>
+<TotalNew>1</TotalNew>
+</OfferSummary>
+<Offers><TotalOffers>2</TotalOffers>
+<Offer><Merchant><Name>Merchant 1</Name></Merchant><OfferListing><OfferListingId>L1</OfferListingId>
+<Price><Amount>1500</Amount><CurrencyCode>JPY</CurrencyCode></Price></OfferListing></Offer>
+<Offer><OfferAttributes><Condition>Used</Condition></OfferAttributes></Offer>
+</Offers>
+<BrowseNodes><BrowseNode><BrowseNodeId>1</BrowseNodeId><Ancestors><BrowseNode><BrowseNodeId>2</BrowseNodeId>
+<Ancestors><BrowseNode><BrowseNodeId>3</BrowseNodeId></BrowseNode></Ancestors></BrowseNode></Ancestors>
+</BrowseNode></BrowseNodes>
+</Item>
+<Item><ASIN>B000000002</ASIN><ItemAttributes><UPCList></UPCList></ItemAttributes><OfferSummary></OfferSummary></Item>
+<Item><ASIN>B000000003</ASIN></Item>
+</Items></ItemLookupResponse>'''.format(NAMESPACE)
+
+
+def tree_record(wrapper):
+    """
+    Build the record the tree-less parser is expected to return from the properties of a parsed element.
+    Records mirror the properties of the parser class, prices mirror their `*_money` properties.
+    """
+    record = {}
+    for field in record_fields_for(type(wrapper)):
+        if isinstance(field, MoneyField):
+            value = getattr(wrapper, field.name + '_money')
+        elif isinstance(field, RecordList):
+            value = [tree_record(x) for x in getattr(wrapper, field.name)]
+        elif isinstance(field, Record):
+            value = getattr(wrapper, field.name)
+            if value is not None:
+                value = None if value.element is None else tree_record(value)
+        elif field.name == 'browse_node_ids':
+            # the ids of every BrowseNode, ancestors included.
+            value = [str(x) for x in wrapper.xpath('./a:BrowseNodes//a:BrowseNodeId/text()')]
+        else:
+            value = getattr(wrapper, field.name)
+        # missing elements are left out of records, missing lists are empty.
+        if value is not None and (value or not isinstance(field, (ListField, RecordList))):
+            record[field.name] = value
+    return record
+
+
+def without_none(record):
+    """
+    Drop the fields whose value is None. (ex. a price element without an amount)
+    The tree parser returns None for them just like it does for missing elements.
+    """
+    if isinstance(record, list):
+        return [without_none(x) for x in record]
+    if isinstance(record, dict):
+        return dict((key, without_none(value)) for key, value in record.items() if value is not None)
+    return record
+
+
+class ParseItemRecordsTest(unittest.TestCase):
+
+    def assertSameItems(self, content, psr_cls=TargetItem):
+        records = parse_item_records(content, psr_cls)
+        items = ItemLookupResponse(etree.fromstring(content), psr_cls).items
+        self.assertEqual(without_none(records), [tree_record(item) for item in items.item_list()])
+        self.assertEqual([(error['code'], error['message']) for error in records.errors],
+                         [(error.code, error.message) for error in items.request.errors])
+        return records
+
+    def test_mock_server_response(self):
+        item_ids = ['B{:09d}'.format(i) for i in range(10)]
+        content = MockServer(invalid_ids=item_ids[:2]).item_lookup(
+            {'ItemId': ','.join(item_ids), 'ResponseGroup': 'ItemAttributes,OfferFull,SalesRank,BrowseNodes'})
+        records = self.assertSameItems(content)
+        self.assertEqual(len(records), 8)
+        self.assertEqual(len(records.errors), 2)
+        self.assertIsInstance(records[0]['item_attributes']['list_price'], Money)
+
+    def test_nested_lists(self):
+        record = self.assertSameItems(RESPONSE)[0]
+        attributes = record['item_attributes']
+        self.assertEqual(attributes['features'], ['one', 'two'])
+        self.assertEqual(attributes['upc_list'], ['012345678905', '012345678912'])
+        self.assertEqual(attributes['catalog_number_list'], ['C-1', 'C-2'])
+        self.assertEqual(record['browse_node_ids'], ['1', '2', '3'])
+
+    def test_missing_elements(self):
+        records = self.assertSameItems(RESPONSE)
+        self.assertEqual(records[1], {'asin': 'B000000002', 'item_attributes': {}, 'offer_summary': {}})
+        self.assertEqual(records[2], {'asin': 'B000000003'})
+        offers = records[0]['offers']
+        self.assertEqual(offers[1], {'condition': 'Used'})
+
+    def test_money_fields(self):
+        record = self.assertSameItems(RESPONSE)[0]
+        self.assertEqual(record['item_attributes']['list_price'], Money(1999, 'USD'))
+        summary = record['offer_summary']
+        self.assertEqual(summary['lowest_new_price'], Money(1500, 'JPY'))
+        # a price without an amount is missing, one without a currency code is kept.
+        self.assertIsNone(summary.get('lowest_used_price'))
+        self.assertEqual((summary['lowest_collectible_price'].amount,
+                          summary['lowest_collectible_price'].currency_code), (500, None))
+        self.assertEqual(record['offers'][0]['offer_listing']['price'], Money(1500, 'JPY'))
+
+    def test_error_response(self):
+        content = error_response('ItemLookup', THROTTLED_ERROR_CODE, 'You are submitting requests too quickly.')
+        with self.assertRaises(AWSError) as tree_error:
+            ItemLookupResponse(etree.fromstring(content), TargetItem)
+        with self.assertRaises(AWSError) as target_error:
+            parse_item_records(content, TargetItem)
+        self.assertEqual((target_error.exception.code, target_error.exception.msg),
+                         (tree_error.exception.code, tree_error.exception.msg))
+        self.assertEqual(target_error.exception.code, THROTTLED_ERROR_CODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from aws import Lookup, config
+from aws.mockserver import MockServer, error_response
+from aws.parsers import Item
+from aws.parsers.lookup.base import THROTTLED_ERROR_CODE
+from aws.throttle import AdaptiveRateLimiter, is_throttled
+
+THROTTLED = error_response('ItemLookup', THROTTLED_ERROR_CODE, 'You are submitting requests too quickly.')
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code=200, content='<ItemLookupResponse/>'):
+        self.status_code = status_code
+        self.content = content
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+
+    def limiter(self, **kwargs):
+        return AdaptiveRateLimiter(**dict(dict(rate=1.0, min_rate=0.25, max_rate=2.0, increase=0.5), **kwargs))
+
+    def allow_throttle(self, limiter):
+        # throttle errors within 1 / rate seconds of the last cut only count once.
+        limiter.last_throttle -= 1 / limiter.rate
+
+    def test_additive_increase(self):
+        limiter = self.limiter()
+        limiter.record(FakeResponse())
+        self.assertAlmostEqual(limiter.rate, 1.5)
+        limiter.record(FakeResponse())
+        self.assertAlmostEqual(limiter.rate, 1.5 + 0.5 / 1.5)
+        for _ in range(10):
+            limiter.record(FakeResponse())
+        self.assertEqual(limiter.rate, 2.0)
+        # errors which aren't throttle errors don't change the rate.
+        limiter.record(FakeResponse(400, error_response('ItemLookup', 'AWS.InvalidParameterValue', 'invalid')))
+        self.assertEqual((limiter.rate, limiter.successes, limiter.throttles), (2.0, 12, 0))
+
+    def test_multiplicative_decrease(self):
+        limiter = self.limiter(rate=2.0)
+        limiter.record(FakeResponse(503, THROTTLED))
+        self.assertEqual(limiter.rate, 1.0)
+        # a RequestThrottled error is a throttle whatever its status code.
+        self.allow_throttle(limiter)
+        limiter.record(FakeResponse(200, THROTTLED))
+        self.assertEqual(limiter.rate, 0.5)
+        self.allow_throttle(limiter)
+        limiter.record(FakeResponse(503, ''))
+        self.assertEqual(limiter.rate, 0.25)
+
+    def test_burst_of_throttles_cuts_once(self):
+        limiter = self.limiter()
+        for _ in range(5):
+            limiter.record(FakeResponse(503, THROTTLED))
+        self.assertEqual((limiter.rate, limiter.throttles), (0.5, 5))
+
+    def test_min_rate(self):
+        limiter = self.limiter(rate=0.3)
+        for _ in range(3):
+            limiter.record_throttle()
+            self.allow_throttle(limiter)
+        self.assertEqual(limiter.rate, 0.25)
+
+    def test_state(self):
+        limiter = self.limiter()
+        self.assertEqual(limiter.state(), dict(rate=1.0, min_rate=0.25, max_rate=2.0, successes=0, throttles=0,
+                                               last_throttle=None))
+        limiter.record_success()
+        limiter.record_throttle()
+        state = limiter.state()
+        self.assertEqual((state['rate'], state['successes'], state['throttles']), (0.75, 1, 1))
+        self.assertIsNotNone(state['last_throttle'])
+
+    def test_lookup_records_every_response(self):
+        config.configure(write_responses=False)
+        limiter = self.limiter(rate=100.0, min_rate=1.0, max_rate=200.0)
+        credentials = {'KEY': 'secret', 'THROTTLED': 'secret'}
+        with MockServer(credentials=credentials, throttled_keys=['THROTTLED']) as server:
+            lookup = Lookup('tag', 'KEY', 'secret', marketplace=server.marketplace, limiter=limiter)
+            lookup.item_lookup(['B000000001'], parser=Item)
+            self.assertEqual((limiter.successes, limiter.throttles), (1, 0))
+            throttled = Lookup('tag', 'THROTTLED', 'secret', marketplace=server.marketplace, limiter=limiter)
+            self.assertTrue(is_throttled(throttled.item_lookup(['B000000001'], parser=Item)))
+        self.assertEqual(limiter.throttles, 1)
+        self.assertLess(limiter.rate, 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()